@@ -0,0 +1,178 @@
+"""Add content fingerprints to entries and the entry_duplicates table.
+
+Revision ID: 0a6e2b9c4f31
+Revises: 5f0c3a9e8d17
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+from lxml import etree, html
+import sqlalchemy as sa
+import zstandard
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0a6e2b9c4f31"
+down_revision: Union[str, Sequence[str], None] = "5f0c3a9e8d17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_BATCH_SIZE = 500
+_SIMHASH_BITS = 64
+_SHINGLE_SIZE = 3
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _decompress_text(value: str | bytes) -> str:
+    """Decompress an entry body, as stored with its compression marker byte."""
+    if isinstance(value, str):
+        return value
+    marker, data = value[:1], value[1:]
+    if marker == b"\x01":
+        data = zlib.decompress(data)
+    elif marker == b"\x02":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif marker != b"\x00":
+        raise ValueError(f"Unknown compression marker: {marker!r}")
+    return data.decode()
+
+
+def _html_to_text(body: str) -> str:
+    """Return the visible text of an HTML body with whitespace collapsed."""
+    if not body.strip():
+        return ""
+    try:
+        document = html.fromstring(body)
+        for element in document.xpath("//head|//style|//script"):
+            element.drop_tree()
+        text = document.text_content()
+    except (etree.ParserError, ValueError):
+        text = body
+    return " ".join(text.split())
+
+
+def _content_hash(content: str) -> str:
+    """Hash content, ignoring case and whitespace."""
+    normalized = " ".join(content.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _simhash(text: str) -> int | None:
+    """Compute the signed 64-bit SimHash of a text from its word shingles."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words:
+        return None
+    shingles = [
+        " ".join(words[i : i + _SHINGLE_SIZE])
+        for i in range(max(1, len(words) - _SHINGLE_SIZE + 1))
+    ]
+    weights = [0] * _SIMHASH_BITS
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        for bit in range(_SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    value = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return value - (1 << _SIMHASH_BITS) if value >> (_SIMHASH_BITS - 1) else value
+
+
+def upgrade() -> None:
+    """Add the fingerprint columns, backfill them and add the duplicates table."""
+    with op.batch_alter_table("entries") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(), nullable=True))
+        batch_op.add_column(
+            sa.Column("content_simhash", sa.BigInteger(), nullable=True)
+        )
+
+    op.create_table(
+        "entry_duplicates",
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("entry_id", sa.String(), nullable=False),
+        sa.Column("received_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["entry_id"], ["entries.id"]),
+        sa.PrimaryKeyConstraint("message_id"),
+    )
+    op.create_index(
+        op.f("ix_entry_duplicates_entry_id"),
+        "entry_duplicates",
+        ["entry_id"],
+        unique=False,
+    )
+
+    # Existing copies of the same content are kept, but only the oldest one
+    # gets the hash, so the unique index can be created.
+    connection = op.get_bind()
+    select_batch = sa.text(
+        """
+        SELECT rowid, id, newsletter_id, subject, body FROM entries
+        WHERE rowid > :last_rowid ORDER BY rowid LIMIT :limit
+        """
+    )
+    update = sa.text(
+        "UPDATE entries SET content_hash = :content_hash, "
+        "content_simhash = :content_simhash WHERE id = :id"
+    )
+    seen: set[tuple[str, str]] = set()
+    last_rowid = 0
+    while True:
+        rows = connection.execute(
+            select_batch, {"last_rowid": last_rowid, "limit": _BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        values = []
+        for _, entry_id, newsletter_id, subject, body in rows:
+            body = _decompress_text(body) if body else ""
+            text = _html_to_text(body)
+            hash_ = _content_hash(f"{subject}\n{text or body}")
+            if (newsletter_id, hash_) in seen:
+                hash_ = None
+            else:
+                seen.add((newsletter_id, hash_))
+            values.append(
+                {
+                    "id": entry_id,
+                    "content_hash": hash_,
+                    "content_simhash": _simhash(f"{subject}\n{text}"),
+                }
+            )
+        connection.execute(update, values)
+        last_rowid = rows[-1][0]
+
+    op.create_index(
+        "ix_entries_newsletter_id_content_hash",
+        "entries",
+        ["newsletter_id", "content_hash"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Drop the fingerprint columns and the duplicates table."""
+    op.drop_index("ix_entries_newsletter_id_content_hash", table_name="entries")
+    op.drop_index(op.f("ix_entry_duplicates_entry_id"), table_name="entry_duplicates")
+    op.drop_table("entry_duplicates")
+    # The entries table is recreated, which the search index triggers would
+    # not survive. Rowids of entries after deleted ones may change, in which
+    # case the search index has to be rebuilt.
+    op.execute("DROP TRIGGER IF EXISTS entries_fts_rename")
+    op.execute("DROP TRIGGER IF EXISTS entries_fts_delete")
+    with op.batch_alter_table("entries") as batch_op:
+        batch_op.drop_column("content_simhash")
+        batch_op.drop_column("content_hash")
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries "
+        "BEGIN DELETE FROM entries_fts WHERE rowid = old.rowid; END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS entries_fts_rename "
+        "AFTER UPDATE OF name ON newsletters BEGIN "
+        "UPDATE entries_fts SET newsletter_name = new.name WHERE rowid IN "
+        "(SELECT rowid FROM entries WHERE newsletter_id = new.id); END"
+    )
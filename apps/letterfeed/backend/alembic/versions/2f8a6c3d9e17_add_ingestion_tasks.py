@@ -0,0 +1,66 @@
+"""Add the ingestion_tasks table.
+
+Revision ID: 2f8a6c3d9e17
+Revises: 7c1d5e9a2b40
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2f8a6c3d9e17"
+down_revision: Union[str, Sequence[str], None] = "7c1d5e9a2b40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the queue of emails waiting to be stored."""
+    op.create_table(
+        "ingestion_tasks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("imap_username", sa.String(), nullable=False),
+        sa.Column("folder", sa.String(), nullable=False),
+        sa.Column("uidvalidity", sa.Integer(), nullable=False),
+        sa.Column("uid", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("sender", sa.String(), nullable=False),
+        sa.Column("stage", sa.String(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("raw_email", sa.LargeBinary(), nullable=True),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("imap_username", "folder", "uidvalidity", "uid"),
+    )
+    op.create_index(
+        op.f("ix_ingestion_tasks_message_id"),
+        "ingestion_tasks",
+        ["message_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Drop the queue of emails waiting to be stored."""
+    op.drop_index(op.f("ix_ingestion_tasks_message_id"), table_name="ingestion_tasks")
+    op.drop_table("ingestion_tasks")
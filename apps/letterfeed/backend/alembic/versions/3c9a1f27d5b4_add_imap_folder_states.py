@@ -0,0 +1,49 @@
+"""Add imap_folder_states table.
+
+Revision ID: 3c9a1f27d5b4
+Revises: 75ed3dbf1e16, add_gmail_oauth2
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9a1f27d5b4"
+# Also merges the two branches created from ce35472309a4.
+down_revision: Union[str, Sequence[str], None] = ("75ed3dbf1e16", "add_gmail_oauth2")
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create imap_folder_states table."""
+    op.create_table(
+        "imap_folder_states",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("imap_username", sa.String(), nullable=False),
+        sa.Column("folder", sa.String(), nullable=False),
+        sa.Column("uidvalidity", sa.Integer(), nullable=False),
+        sa.Column("last_uid", sa.Integer(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("imap_username", "folder"),
+    )
+    op.create_index(
+        op.f("ix_imap_folder_states_id"), "imap_folder_states", ["id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Drop imap_folder_states table."""
+    op.drop_index(op.f("ix_imap_folder_states_id"), table_name="imap_folder_states")
+    op.drop_table("imap_folder_states")
@@ -0,0 +1,113 @@
+"""Add the entries full-text search index.
+
+Revision ID: 5f0c3a9e8d17
+Revises: e4a1d7c93b52
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+from lxml import etree, html
+import sqlalchemy as sa
+import zstandard
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5f0c3a9e8d17"
+down_revision: Union[str, Sequence[str], None] = "e4a1d7c93b52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_BATCH_SIZE = 500
+
+
+def _decompress_text(value: str | bytes) -> str:
+    """Decompress an entry body, as stored with its compression marker byte."""
+    if isinstance(value, str):
+        return value
+    marker, data = value[:1], value[1:]
+    if marker == b"\x01":
+        data = zlib.decompress(data)
+    elif marker == b"\x02":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif marker != b"\x00":
+        raise ValueError(f"Unknown compression marker: {marker!r}")
+    return data.decode()
+
+
+def _html_to_text(body: str) -> str:
+    """Return the visible text of an HTML body with whitespace collapsed."""
+    if not body.strip():
+        return ""
+    try:
+        document = html.fromstring(body)
+        for element in document.xpath("//head|//style|//script"):
+            element.drop_tree()
+        text = document.text_content()
+    except (etree.ParserError, ValueError):
+        text = body
+    return " ".join(text.split())
+
+
+def upgrade() -> None:
+    """Create the search index and fill it with the existing entries."""
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+        "subject, body, newsletter_name, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries "
+        "BEGIN DELETE FROM entries_fts WHERE rowid = old.rowid; END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS entries_fts_rename "
+        "AFTER UPDATE OF name ON newsletters BEGIN "
+        "UPDATE entries_fts SET newsletter_name = new.name WHERE rowid IN "
+        "(SELECT rowid FROM entries WHERE newsletter_id = new.id); END"
+    )
+
+    connection = op.get_bind()
+    select_batch = sa.text(
+        """
+        SELECT entries.rowid, entries.subject, entries.body, newsletters.name
+        FROM entries JOIN newsletters ON newsletters.id = entries.newsletter_id
+        WHERE entries.rowid > :last_rowid
+            AND entries.rowid NOT IN (SELECT rowid FROM entries_fts)
+        ORDER BY entries.rowid
+        LIMIT :limit
+        """
+    )
+    insert = sa.text(
+        "INSERT INTO entries_fts (rowid, subject, body, newsletter_name) "
+        "VALUES (:rowid, :subject, :body, :newsletter_name)"
+    )
+    last_rowid = 0
+    while True:
+        rows = connection.execute(
+            select_batch, {"last_rowid": last_rowid, "limit": _BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            insert,
+            [
+                {
+                    "rowid": rowid,
+                    "subject": subject,
+                    "body": _html_to_text(_decompress_text(body) if body else ""),
+                    "newsletter_name": name,
+                }
+                for rowid, subject, body, name in rows
+            ],
+        )
+        last_rowid = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Drop the search index."""
+    op.execute("DROP TRIGGER IF EXISTS entries_fts_rename")
+    op.execute("DROP TRIGGER IF EXISTS entries_fts_delete")
+    op.execute("DROP TABLE IF EXISTS entries_fts")
@@ -0,0 +1,45 @@
+"""Add the leader_locks and cache_invalidations tables.
+
+Revision ID: 7c1d5e9a2b40
+Revises: 0a6e2b9c4f31
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1d5e9a2b40"
+down_revision: Union[str, Sequence[str], None] = "0a6e2b9c4f31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the tables processes coordinate through."""
+    op.create_table(
+        "leader_locks",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("holder", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_table(
+        "cache_invalidations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("origin", sa.String(), nullable=False),
+        sa.Column("created_at", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Drop the tables processes coordinate through."""
+    op.drop_table("cache_invalidations")
+    op.drop_table("leader_locks")
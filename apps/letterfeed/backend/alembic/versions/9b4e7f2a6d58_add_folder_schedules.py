@@ -0,0 +1,43 @@
+"""Add the folder_schedules table.
+
+Revision ID: 9b4e7f2a6d58
+Revises: 2f8a6c3d9e17
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b4e7f2a6d58"
+down_revision: Union[str, Sequence[str], None] = "2f8a6c3d9e17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add when adaptively polled folders are checked next."""
+    op.create_table(
+        "folder_schedules",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("imap_username", sa.String(), nullable=False),
+        sa.Column("folder", sa.String(), nullable=False),
+        sa.Column("interval", sa.Integer(), nullable=False),
+        sa.Column("last_checked_at", sa.DateTime(), nullable=False),
+        sa.Column("next_check_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("imap_username", "folder"),
+    )
+    op.create_index(
+        op.f("ix_folder_schedules_id"), "folder_schedules", ["id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Drop when adaptively polled folders are checked next."""
+    op.drop_index(op.f("ix_folder_schedules_id"), table_name="folder_schedules")
+    op.drop_table("folder_schedules")
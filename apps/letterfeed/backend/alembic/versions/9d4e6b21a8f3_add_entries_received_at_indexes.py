@@ -0,0 +1,39 @@
+"""Add indexes for newest-first entry listings.
+
+Revision ID: 9d4e6b21a8f3
+Revises: 3c9a1f27d5b4
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4e6b21a8f3"
+down_revision: Union[str, Sequence[str], None] = "3c9a1f27d5b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create indexes on entries ordered by received date."""
+    op.create_index(
+        "ix_entries_newsletter_id_received_at",
+        "entries",
+        ["newsletter_id", sa.text("received_at DESC"), sa.text("id DESC")],
+    )
+    op.create_index(
+        "ix_entries_received_at",
+        "entries",
+        [sa.text("received_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    """Drop the received date indexes on entries."""
+    op.drop_index("ix_entries_received_at", table_name="entries")
+    op.drop_index("ix_entries_newsletter_id_received_at", table_name="entries")
@@ -0,0 +1,52 @@
+"""Add entries_count and latest_received_at to newsletters.
+
+Revision ID: b7f2c8e41d06
+Revises: 9d4e6b21a8f3
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7f2c8e41d06"
+down_revision: Union[str, Sequence[str], None] = "9d4e6b21a8f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the entry counters to newsletters and backfill them."""
+    with op.batch_alter_table("newsletters") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "entries_count", sa.Integer(), nullable=False, server_default="0"
+            )
+        )
+        batch_op.add_column(
+            sa.Column("latest_received_at", sa.DateTime(timezone=True), nullable=True)
+        )
+    op.execute(
+        """
+        UPDATE newsletters SET
+            entries_count = (
+                SELECT count(*) FROM entries
+                WHERE entries.newsletter_id = newsletters.id
+            ),
+            latest_received_at = (
+                SELECT max(received_at) FROM entries
+                WHERE entries.newsletter_id = newsletters.id
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Drop the entry counters from newsletters."""
+    with op.batch_alter_table("newsletters") as batch_op:
+        batch_op.drop_column("latest_received_at")
+        batch_op.drop_column("entries_count")
@@ -0,0 +1,77 @@
+"""Add snippet to entries.
+
+Revision ID: e4a1d7c93b52
+Revises: b7f2c8e41d06
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+from lxml import etree, html
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a1d7c93b52"
+down_revision: Union[str, Sequence[str], None] = "b7f2c8e41d06"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_BATCH_SIZE = 500
+_SNIPPET_LENGTH = 200
+
+
+def _make_snippet(body: str | None) -> str:
+    """Return the beginning of the visible text of an HTML body."""
+    if not body or not body.strip():
+        return ""
+    try:
+        document = html.fromstring(body)
+        for element in document.xpath("//head|//style|//script"):
+            element.drop_tree()
+        text = document.text_content()
+    except (etree.ParserError, ValueError):
+        text = body
+    text = " ".join(text.split())
+    if len(text) <= _SNIPPET_LENGTH:
+        return text
+    cut = text[: _SNIPPET_LENGTH - 1]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return f"{cut.rstrip()}…"
+
+
+def upgrade() -> None:
+    """Add the snippet column and backfill it from the entry bodies."""
+    with op.batch_alter_table("entries") as batch_op:
+        batch_op.add_column(
+            sa.Column("snippet", sa.String(), nullable=False, server_default="")
+        )
+
+    connection = op.get_bind()
+    entries = sa.table(
+        "entries", sa.column("id", sa.String), sa.column("body", sa.Text)
+    )
+    update = sa.text("UPDATE entries SET snippet = :snippet WHERE id = :id")
+    last_id = ""
+    while True:
+        rows = connection.execute(
+            sa.select(entries.c.id, entries.c.body)
+            .where(entries.c.id > last_id)
+            .order_by(entries.c.id)
+            .limit(_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            update, [{"id": id, "snippet": _make_snippet(body)} for id, body in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Drop the snippet column from entries."""
+    with op.batch_alter_table("entries") as batch_op:
+        batch_op.drop_column("snippet")
@@ -0,0 +1,89 @@
+"""Compress the bodies of existing entries.
+
+Usage: python -m app.commands.compress_bodies [--batch-size N] [--pause SECONDS]
+
+Rewrites the entries whose bodies are not stored with the algorithm configured
+in LETTERFEED_ENTRY_BODY_COMPRESSION, one small transaction at a time, so it
+can run while the application is serving feeds. Run ``VACUUM`` afterwards to
+give the freed pages back to the file system.
+"""
+
+import argparse
+import time
+
+from sqlalchemy import Text, bindparam, select, type_coerce, update
+from sqlalchemy.orm import Session
+
+from app.core.compression import decompress_text, get_compression
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logging import get_logger, setup_logging
+from app.models import newsletters  # noqa: F401, registers the Newsletter mapper
+from app.models.entries import Entry
+
+# Not __name__, which is "__main__" when run with python -m
+logger = get_logger("app.commands.compress_bodies")
+
+
+def compress_bodies(db: Session, batch_size: int = 500, pause: float = 0.0) -> int:
+    """Rewrite the entry bodies not stored with the configured algorithm.
+
+    Returns:
+        The number of rewritten entries.
+    """
+    algorithm = settings.entry_body_compression
+    # Read the stored values as they are, without decompressing them.
+    stored_body = type_coerce(Entry.body, Text)
+    statement = (
+        update(Entry)
+        .where(Entry.id == bindparam("entry_id"))
+        .values(body=bindparam("body"))
+        .execution_options(synchronize_session=False)
+    )
+    rewritten = 0
+    last_id = ""
+    while True:
+        rows = db.execute(
+            select(Entry.id, stored_body)
+            .where(Entry.id > last_id)
+            .order_by(Entry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        stale = [
+            {"entry_id": entry_id, "body": decompress_text(body)}
+            for entry_id, body in rows
+            if body is not None and get_compression(body) != algorithm
+        ]
+        if stale:
+            db.connection().execute(statement, stale)
+            db.commit()
+            rewritten += len(stale)
+            logger.info(f"Rewrote {rewritten} entry bodies with {algorithm}")
+        if pause:
+            time.sleep(pause)
+    return rewritten
+
+
+def main() -> None:
+    """Run the command."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.0,
+        help="Seconds to wait between batches, to leave room for other writers",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    with SessionLocal() as db:
+        rewritten = compress_bodies(db, args.batch_size, args.pause)
+    logger.info(f"Done, rewrote {rewritten} entry bodies")
+
+
+if __name__ == "__main__":
+    main()
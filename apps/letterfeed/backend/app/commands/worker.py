@@ -0,0 +1,59 @@
+"""Check for new emails in a process of its own.
+
+Usage: python -m app.commands.worker
+
+Runs the scheduled email checks without serving the API, so the API can run
+with any number of workers and LETTERFEED_INGESTION_MODE=worker. Several
+worker processes may run for redundancy: only the one holding the ingestion
+lease checks emails, another one takes over once it stops.
+"""
+
+import argparse
+import signal
+import threading
+
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+from app.core.logging import get_logger, setup_logging
+from app.core.scheduler import (
+    release_leadership,
+    scheduler,
+    start_scheduler_with_interval,
+)
+from app.crud.settings import create_initial_settings
+from app.services.email_processor import shutdown_extraction_executor
+from app.services.imap_idle import idle_manager
+
+# Not __name__, which is "__main__" when run with python -m
+logger = get_logger("app.commands.worker")
+
+
+def main() -> None:
+    """Run the command."""
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+
+    setup_logging()
+    logger.info(f"DATABASE_URL used: {settings.database_url}")
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        create_initial_settings(db)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+
+    start_scheduler_with_interval()
+    logger.info("Letterfeed worker started")
+    stop.wait()
+
+    logger.info("Shutting down Letterfeed worker...")
+    if scheduler.running:
+        scheduler.shutdown()
+    release_leadership()
+    idle_manager.stop()
+    shutdown_extraction_executor()
+    logger.info("...Letterfeed worker shut down.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import UTC, datetime, timedelta
 from functools import lru_cache
 
@@ -10,11 +13,16 @@ from sqlalchemy.orm import Session
 from app.core.config import settings as env_settings
 from app.core.database import get_db
 from app.core.hashing import get_password_hash
-from app.models.settings import Settings as SettingsModel
+from app.core.settings_cache import get_settings_snapshot
 from app.schemas.auth import TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
+_MAX_VERIFIED_TOKENS = 256
+_verified_tokens_lock = threading.Lock()
+# (token, secret key) -> (username, expiry timestamp) of tokens already verified
+_verified_tokens: OrderedDict[tuple[str, str], tuple[str, float]] = OrderedDict()
+
 
 @lru_cache(maxsize=1)
 def _get_env_password_hash():
@@ -34,11 +42,12 @@ def _get_auth_credentials(db: Session) -> dict:
         }
 
     # Then check DB
-    db_settings = db.query(SettingsModel).first()
-    if db_settings and db_settings.auth_username and db_settings.auth_password_hash:
+    snapshot = get_settings_snapshot(db)
+    db_settings = snapshot.values if snapshot else {}
+    if db_settings.get("auth_username") and db_settings.get("auth_password_hash"):
         return {
-            "username": db_settings.auth_username,
-            "password_hash": db_settings.auth_password_hash,
+            "username": db_settings["auth_username"],
+            "password_hash": db_settings["auth_password_hash"],
         }
 
     return {}
@@ -60,6 +69,38 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
+def _verify_token(token: str) -> str | None:
+    """Return the username of a valid token.
+
+    Verified tokens are remembered until they expire, so repeated requests
+    with the same token skip the signature check.
+
+    Raises:
+        JWTError: If the token is invalid or expired.
+    """
+    key = (token, env_settings.secret_key)
+    now = time.time()
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(key)
+        if cached is not None:
+            if cached[1] > now:
+                _verified_tokens.move_to_end(key)
+                return cached[0]
+            del _verified_tokens[key]
+
+    payload = jwt.decode(
+        token, env_settings.secret_key, algorithms=[env_settings.algorithm]
+    )
+    username: str | None = payload.get("sub")
+    expiry = payload.get("exp")
+    if username is not None and isinstance(expiry, (int, float)):
+        with _verified_tokens_lock:
+            _verified_tokens[key] = (username, expiry)
+            if len(_verified_tokens) > _MAX_VERIFIED_TOKENS:
+                _verified_tokens.popitem(last=False)
+    return username
+
+
 def protected_route(
     token: str | None = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
@@ -92,10 +133,7 @@ def protected_route(
         )
 
     try:
-        payload = jwt.decode(
-            token, env_settings.secret_key, algorithms=[env_settings.algorithm]
-        )
-        username: str | None = payload.get("sub")
+        username = _verify_token(token)
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
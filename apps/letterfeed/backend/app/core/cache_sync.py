@@ -0,0 +1,145 @@
+"""Keeps the in-memory caches of several processes coherent.
+
+The feed, sender routing, settings and token caches are dropped by the process
+that changes the underlying data. With several API workers, or ingestion
+running in a separate worker, the other processes would keep serving stale
+data. Each invalidation is therefore also recorded in the
+``cache_invalidations`` table, and every process applies the invalidations of
+the others before it reads from a cache, at most once per
+``LETTERFEED_CACHE_SYNC_INTERVAL`` seconds.
+
+A process that may have missed invalidations, because it just started or the
+rows were pruned before it caught up, drops its caches completely.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import engine
+from app.core.leader import INSTANCE_ID
+from app.core.logging import get_logger
+from app.models.coordination import CacheInvalidation
+
+logger = get_logger(__name__)
+
+# Seconds invalidations are kept for processes that have not caught up yet
+_RETENTION = 3600
+
+_lock = threading.Lock()
+# cache kind -> drops the given key, or everything for None
+_handlers: dict[str, Callable[[str | None], None]] = {}
+# Id of the last invalidation applied, None before the first poll
+_last_id: int | None = None
+_next_poll = 0.0
+
+
+def register(kind: str, handler: Callable[[str | None], None]) -> None:
+    """Register how invalidations of a cache made by other processes are applied."""
+    _handlers[kind] = handler
+
+
+def publish(kind: str, key: str = "") -> None:
+    """Tell the other processes to drop an item, or a whole cache without key.
+
+    The calling process is expected to have updated its own cache already.
+    """
+    try:
+        with engine.begin() as connection:
+            connection.execute(
+                insert(CacheInvalidation).values(
+                    kind=kind, key=key, origin=INSTANCE_ID, created_at=time.time()
+                )
+            )
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not publish invalidation of {kind} cache: {e}")
+
+
+def _apply(kind: str, key: str | None) -> None:
+    """Run the handler of a cache, if one is registered."""
+    handler = _handlers.get(kind)
+    if handler is None:
+        return
+    try:
+        handler(key)
+    except Exception as e:
+        logger.error(f"Failed to invalidate {kind} cache: {e}", exc_info=True)
+
+
+def poll_due() -> bool:
+    """Whether poll would query the database now."""
+    return time.monotonic() >= _next_poll
+
+
+def poll() -> None:
+    """Apply the invalidations other processes published since the last poll."""
+    global _last_id, _next_poll
+    with _lock:
+        if not poll_due():
+            return
+        _next_poll = time.monotonic() + settings.cache_sync_interval
+        last_id = _last_id
+
+    try:
+        with engine.connect() as connection:
+            if last_id is None:
+                rows = []
+                newest = connection.scalar(select(func.max(CacheInvalidation.id)))
+            else:
+                rows = connection.execute(
+                    select(
+                        CacheInvalidation.id,
+                        CacheInvalidation.kind,
+                        CacheInvalidation.key,
+                        CacheInvalidation.origin,
+                    )
+                    .where(CacheInvalidation.id > last_id)
+                    .order_by(CacheInvalidation.id)
+                ).all()
+                newest = rows[-1].id if rows else last_id
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not poll cache invalidations: {e}")
+        return
+
+    with _lock:
+        _last_id = newest or 0
+
+    if last_id is None or (rows and rows[0].id != last_id + 1):
+        # Anything cached so far may have missed an invalidation.
+        logger.debug("Dropping all caches to catch up with other processes")
+        for kind in list(_handlers):
+            _apply(kind, None)
+        return
+    for row in rows:
+        if row.origin != INSTANCE_ID:
+            _apply(row.kind, row.key or None)
+
+
+async def poll_async() -> None:
+    """Poll from async code, without leaving the event loop when not due."""
+    if poll_due():
+        await run_in_threadpool(poll)
+
+
+def prune() -> int:
+    """Delete old invalidations, keeping the newest so ids keep increasing.
+
+    Returns:
+        The number of deleted invalidations.
+    """
+    with engine.begin() as connection:
+        newest = connection.scalar(select(func.max(CacheInvalidation.id)))
+        if newest is None:
+            return 0
+        result = connection.execute(
+            delete(CacheInvalidation).where(
+                CacheInvalidation.created_at < time.time() - _RETENTION,
+                CacheInvalidation.id < newest,
+            )
+        )
+    return result.rowcount
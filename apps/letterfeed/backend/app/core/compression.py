@@ -0,0 +1,92 @@
+"""Transparent compression of large text columns such as entry bodies.
+
+Compressed values are stored as bytes that start with a marker byte naming the
+algorithm. Values stored as text are read back unchanged, so rows written
+before compression was enabled keep working.
+"""
+
+import zlib
+from typing import Literal
+
+import zstandard
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+Algorithm = Literal["none", "zlib", "zstd"]
+
+_MARKERS: dict[bytes, Algorithm] = {b"\x00": "none", b"\x01": "zlib", b"\x02": "zstd"}
+_ALGORITHM_MARKERS = {algorithm: marker for marker, algorithm in _MARKERS.items()}
+# Shorter values are stored as text, they would barely shrink
+_MIN_COMPRESSED_LENGTH = 256
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 6
+
+
+def compress_text(value: str, algorithm: Algorithm) -> str | bytes:
+    """Compress a string with the given algorithm.
+
+    Returns:
+        The compressed value prefixed with its marker byte, or the string
+        itself if compression is disabled or the string is short.
+    """
+    if algorithm == "none" or len(value) < _MIN_COMPRESSED_LENGTH:
+        return value
+    data = value.encode()
+    if algorithm == "zlib":
+        compressed = zlib.compress(data, _ZLIB_LEVEL)
+    elif algorithm == "zstd":
+        compressed = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    else:
+        raise ValueError(f"Unknown compression algorithm: {algorithm!r}")
+    return _ALGORITHM_MARKERS[algorithm] + compressed
+
+
+def decompress_text(value: str | bytes) -> str:
+    """Decompress a value written by compress_text.
+
+    Raises:
+        ValueError: If the value starts with an unknown marker byte.
+    """
+    if isinstance(value, str):
+        return value
+    algorithm = get_compression(value)
+    data = value[1:]
+    if algorithm == "zlib":
+        data = zlib.decompress(data)
+    elif algorithm == "zstd":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode()
+
+
+def get_compression(value: str | bytes) -> Algorithm:
+    """Return the algorithm a stored value was compressed with."""
+    if isinstance(value, str):
+        return "none"
+    marker = value[:1]
+    if marker not in _MARKERS:
+        raise ValueError(f"Unknown compression marker: {marker!r}")
+    return _MARKERS[marker]
+
+
+class CompressedText(TypeDecorator):
+    """Text column compressed with the configured algorithm when written.
+
+    Values are decompressed as rows are loaded.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        """Compress a value before it is written."""
+        if value is None:
+            return None
+        return compress_text(value, settings.entry_body_compression)
+
+    def process_result_value(self, value, dialect):
+        """Decompress a value after it is read."""
+        if value is None:
+            return None
+        return decompress_text(value)
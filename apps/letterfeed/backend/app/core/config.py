@@ -1,9 +1,10 @@
-from pydantic import AliasChoices, Field
-from pydantic_settings import BaseSettings, SettingsConfigDict
-
 """Configuration settings for the Letterfeed application."""
 
+from typing import Literal
+
 from cryptography.fernet import Fernet
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -26,6 +27,18 @@ class Settings(BaseSettings):
         "http://backend:8000",
         validation_alias=AliasChoices("APP_BASE_URL", "LETTERFEED_APP_BASE_URL"),
     )
+    # Use WAL journaling with synchronous=NORMAL for SQLite databases
+    sqlite_wal: bool = True
+    # SQLite page cache size, negative values are in KiB
+    sqlite_cache_size: int = -64000
+    # Bytes of the SQLite database file that are memory-mapped
+    sqlite_mmap_size: int = 268435456
+    # Milliseconds a SQLite connection waits for a lock before failing
+    sqlite_busy_timeout: int = 5000
+    # Serve feed and listing routes from a separate read-only connection pool
+    separate_read_engine: bool = False
+    # Compression of entry bodies written from now on: none, zlib or zstd
+    entry_body_compression: Literal["none", "zlib", "zstd"] = "none"
     imap_server: str = ""
     imap_username: str = ""
     imap_password: str = ""
@@ -34,6 +47,71 @@ class Settings(BaseSettings):
     mark_as_read: bool = False
     email_check_interval: int = 15
     auto_add_new_senders: bool = False
+    # Number of messages fetched from the IMAP server per round-trip
+    imap_fetch_batch_size: int = 50
+    # Keep a connection per folder open and react to new emails with IMAP IDLE
+    imap_idle_enabled: bool = False
+    # Seconds before IDLE is re-issued, servers drop it after 30 minutes
+    imap_idle_timeout: int = 1500
+    # Seconds between NOOP checks for servers without IDLE support
+    imap_noop_interval: int = 60
+    # Upper bound in seconds for the delay between reconnection attempts
+    imap_reconnect_max_backoff: int = 300
+    # Link entries whose SimHash differs in at most this many bits to the
+    # existing entry, 0 only links entries with identical content
+    dedup_simhash_distance: int = 0
+    # Number of recent entries of a newsletter compared for near-duplicates
+    dedup_simhash_window: int = 50
+    # IMAP connections used to check folders concurrently
+    imap_folder_workers: int = 4
+    # Threads running blocking IMAP operations for API requests
+    imap_executor_workers: int = 4
+    # Seconds an IMAP connect, login or command may take before it is aborted
+    imap_timeout: float = 30.0
+    # Seconds before expiry at which Gmail access tokens are refreshed in the
+    # background, while the current token is still used
+    gmail_token_refresh_margin: int = 300
+    # Seconds the settings are cached in memory, bounds how long changes made
+    # by another process take to show up
+    settings_cache_ttl: int = 30
+    # Attempts at downloading, extracting and storing an email before it is
+    # given up on
+    ingestion_max_attempts: int = 5
+    # Seconds before the first retry of a failed email, doubled for every
+    # further attempt up to ingestion_retry_max_delay
+    ingestion_retry_delay: int = 60
+    ingestion_retry_max_delay: int = 21600
+    # Where emails are checked: "embedded" in the API processes, of which the
+    # one holding the ingestion lease runs the checks, or "worker" only in a
+    # separate ``python -m app.commands.worker`` process
+    ingestion_mode: Literal["embedded", "worker"] = "embedded"
+    # Seconds the ingestion lease is valid without renewal before another
+    # process takes over checking emails
+    leader_lease_seconds: int = 60
+    # Seconds between checks for caches invalidated by another process
+    cache_sync_interval: float = 1.0
+    # Check each folder as often as its newsletters arrive instead of every
+    # email_check_interval minutes
+    adaptive_polling: bool = False
+    # Bounds in minutes of the interval between adaptive checks of a folder
+    polling_min_interval: int = 5
+    polling_max_interval: int = 360
+    # Adaptive checks of a folder per typical gap between its newsletters
+    polling_checks_per_gap: int = 24
+    # Fraction by which the time of an adaptive check is randomly shifted
+    polling_jitter: float = 0.1
+    # Processes extracting newsletter content, 0 extracts inline in the scheduler job
+    extraction_workers: int = 0
+    # Number of entries per page of an Atom feed (RFC 5005 paged feeds)
+    feed_page_size: int = 50
+    # Optional directory in which rendered feeds are cached across restarts
+    feed_cache_dir: str | None = None
+    # Maximum number of rendered feed entries kept in memory
+    feed_fragment_cache_size: int = 5000
+    # Stream feeds entry by entry instead of rendering and caching whole pages
+    feed_streaming: bool = False
+    # Gzip-compress streamed feeds for clients that accept it
+    feed_gzip: bool = False
     auth_username: str | None = None
     auth_password: str | None = None
     secret_key: str | None = Field(
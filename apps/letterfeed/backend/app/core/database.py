@@ -1,4 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.core.config import settings
@@ -8,9 +14,67 @@ from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
-engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+
+def _apply_sqlite_pragmas(engine: Engine, read_only: bool = False) -> None:
+    """Tune every new SQLite connection of an engine.
+
+    WAL lets feed readers run concurrently with the scheduler's writes, and
+    synchronous=NORMAL is safe in WAL mode while avoiding an fsync per commit.
+    """
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout}")
+        if settings.sqlite_wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size={settings.sqlite_cache_size}")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _create_engine(read_only: bool = False) -> Engine:
+    """Create an engine for the configured database."""
+    if not settings.database_url.startswith("sqlite"):
+        return create_engine(settings.database_url)
+    engine = create_engine(
+        settings.database_url, connect_args={"check_same_thread": False}
+    )
+    _apply_sqlite_pragmas(engine, read_only=read_only)
+    return engine
+
+
+def _create_async_engine(read_only: bool = False) -> AsyncEngine:
+    """Create an asyncio engine for the configured database.
+
+    SQLite databases are accessed through aiosqlite, with the same profile
+    as the synchronous engine.
+    """
+    url = make_url(settings.database_url)
+    if url.drivername != "sqlite":
+        return create_async_engine(url)
+    engine = create_async_engine(url.set(drivername="sqlite+aiosqlite"))
+    _apply_sqlite_pragmas(engine.sync_engine, read_only=read_only)
+    return engine
+
+
+engine = _create_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Feed and listing routes can read through a separate connection pool, so
+# they never wait for connections held by email processing.
+read_engine = (
+    _create_engine(read_only=True) if settings.separate_read_engine else engine
+)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async feed routes use their own engine, so they never block on a worker thread.
+async_read_engine = _create_async_engine(read_only=settings.separate_read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -23,3 +87,25 @@ def get_db():
     finally:
         logger.debug("Closing database session")
         db.close()
+
+
+def get_read_db():
+    """Dependency that provides a read-only database session."""
+    logger.debug("Creating new read-only database session")
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        logger.debug("Closing read-only database session")
+        db.close()
+
+
+async def get_async_read_db():
+    """Dependency that provides a read-only asyncio database session.
+
+    Use ``AsyncSession.run_sync`` to call the synchronous CRUD functions.
+    """
+    logger.debug("Creating new read-only async database session")
+    async with AsyncReadSessionLocal() as db:
+        yield db
+    logger.debug("Closed read-only async database session")
@@ -0,0 +1,294 @@
+"""In-process cache of rendered Atom feeds and entry fragments.
+
+Rendered feed pages are kept per feed key (a newsletter id or the master feed)
+and are dropped explicitly by the CRUD layer whenever the entries or metadata
+of a newsletter change. Rendered ``<entry>`` fragments are memoized separately,
+so re-rendering a feed after a new email only serializes the new entry.
+
+Each page is stored with its version. Callers that know the current version
+pass its ETag when looking a page up, so a page rendered for an older version
+is never reused, e.g. one left on disk by another process.
+
+If ``LETTERFEED_FEED_CACHE_DIR`` is set, rendered feed pages and the slugs
+they are served under are also written to that directory so they survive
+restarts.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+
+from app.core import cache_sync
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+MASTER_FEED_KEY = "all"
+CACHE_KIND = "feed"
+_FEED_CACHE_SIZE = 256
+# Feed keys and slugs that are safe to use in file names
+_DISK_KEY = re.compile(r"[A-Za-z0-9-]+")
+
+
+class FeedVersion(NamedTuple):
+    """Identifies the current content of one page of a feed."""
+
+    etag: str
+    last_modified: datetime | None
+    page: int
+    last_page: int
+
+
+class CachedFeed(NamedTuple):
+    """A rendered feed page together with its version."""
+
+    version: FeedVersion
+    xml: bytes
+
+
+_lock = threading.Lock()
+# (feed key, page) -> rendered feed page
+_feeds: OrderedDict[tuple[str, int], CachedFeed] = OrderedDict()
+# newsletter id or slug -> feed key
+_aliases: dict[str, str] = {MASTER_FEED_KEY: MASTER_FEED_KEY}
+# (entry id, entry title) -> rendered <entry> element
+_fragments: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+
+def _disk_path(feed_key: str, page: int, suffix: str) -> str | None:
+    """Return the on-disk location of a cached feed page, if enabled."""
+    if not settings.feed_cache_dir or not _DISK_KEY.fullmatch(feed_key):
+        return None
+    return os.path.join(settings.feed_cache_dir, f"{feed_key}-{page}.{suffix}")
+
+
+def _alias_path(alias: str) -> str | None:
+    """Return the on-disk location of a feed alias, if enabled."""
+    if not settings.feed_cache_dir or not _DISK_KEY.fullmatch(alias):
+        return None
+    return os.path.join(settings.feed_cache_dir, f"alias-{alias}.json")
+
+
+def _read_alias_from_disk(alias: str) -> str | None:
+    """Look up the feed key of an alias on disk."""
+    path = _alias_path(alias)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)["feed_key"]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Failed to read cached feed alias {alias} from disk: {e}")
+        return None
+
+
+def _write_aliases_to_disk(feed_key: str, aliases: tuple[str, ...]) -> None:
+    """Persist the aliases of a feed to disk."""
+    for alias in aliases:
+        path = _alias_path(alias)
+        if not path:
+            continue
+        try:
+            os.makedirs(settings.feed_cache_dir, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump({"feed_key": feed_key}, f)
+        except OSError as e:
+            logger.warning(f"Failed to write cached feed alias {alias} to disk: {e}")
+
+
+def _read_from_disk(feed_key: str, page: int) -> CachedFeed | None:
+    """Load a cached feed page from disk."""
+    xml_path = _disk_path(feed_key, page, "xml")
+    meta_path = _disk_path(feed_key, page, "json")
+    if not xml_path or not meta_path or not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(xml_path, "rb") as f:
+            xml = f.read()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read cached feed {feed_key}-{page} from disk: {e}")
+        return None
+    last_modified = meta["last_modified"]
+    version = FeedVersion(
+        etag=meta["etag"],
+        last_modified=datetime.fromisoformat(last_modified) if last_modified else None,
+        page=meta["page"],
+        last_page=meta["last_page"],
+    )
+    return CachedFeed(version, xml)
+
+
+def _write_to_disk(feed_key: str, cached: CachedFeed) -> None:
+    """Persist a rendered feed page to disk."""
+    page = cached.version.page
+    xml_path = _disk_path(feed_key, page, "xml")
+    meta_path = _disk_path(feed_key, page, "json")
+    if not xml_path or not meta_path:
+        return
+    version = cached.version
+    meta = {
+        "etag": version.etag,
+        "last_modified": (
+            version.last_modified.isoformat() if version.last_modified else None
+        ),
+        "page": version.page,
+        "last_page": version.last_page,
+    }
+    try:
+        os.makedirs(settings.feed_cache_dir, exist_ok=True)
+        with open(xml_path, "wb") as f:
+            f.write(cached.xml)
+        # The metadata is written last, it marks the entry as complete.
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+    except OSError as e:
+        logger.warning(f"Failed to write cached feed {feed_key}-{page} to disk: {e}")
+
+
+def _remove_from_disk(feed_key: str) -> None:
+    """Remove all cached pages of a feed from disk."""
+    if not settings.feed_cache_dir or not os.path.isdir(settings.feed_cache_dir):
+        return
+    prefix = f"{feed_key}-"
+    for name in os.listdir(settings.feed_cache_dir):
+        if name.startswith(prefix) or (
+            name.startswith("alias-")
+            and _read_alias_from_disk(name[len("alias-") : -len(".json")]) == feed_key
+        ):
+            try:
+                os.remove(os.path.join(settings.feed_cache_dir, name))
+            except OSError:
+                pass
+
+
+def get_feed(identifier: str, page: int, etag: str | None = None) -> CachedFeed | None:
+    """Return a cached feed page by newsletter id, slug or the master feed key.
+
+    If ``etag`` is given, a page cached for another version is not returned.
+    """
+    with _lock:
+        feed_key = _aliases.get(identifier)
+        if feed_key is not None:
+            cached = _feeds.get((feed_key, page))
+            if cached is not None and etag in (None, cached.version.etag):
+                _feeds.move_to_end((feed_key, page))
+                return cached
+
+    if feed_key is None:
+        feed_key = _read_alias_from_disk(identifier) or identifier
+    cached = _read_from_disk(feed_key, page)
+    if cached is None or etag not in (None, cached.version.etag):
+        return None
+    with _lock:
+        _store(feed_key, cached)
+        _aliases[feed_key] = feed_key
+        _aliases[identifier] = feed_key
+    return cached
+
+
+def _store(feed_key: str, cached: CachedFeed) -> None:
+    """Store a feed page in memory, evicting the least recently used."""
+    _feeds[(feed_key, cached.version.page)] = cached
+    _feeds.move_to_end((feed_key, cached.version.page))
+    while len(_feeds) > _FEED_CACHE_SIZE:
+        _feeds.popitem(last=False)
+
+
+def set_feed(
+    feed_key: str, version: FeedVersion, xml: bytes, aliases: tuple[str, ...] = ()
+) -> None:
+    """Cache a rendered feed page under its feed key and any aliases."""
+    cached = CachedFeed(version, xml)
+    with _lock:
+        _store(feed_key, cached)
+        _aliases[feed_key] = feed_key
+        for alias in aliases:
+            if alias:
+                _aliases[alias] = feed_key
+    _write_to_disk(feed_key, cached)
+    _write_aliases_to_disk(feed_key, tuple(alias for alias in aliases if alias))
+
+
+def _drop(feed_key: str) -> None:
+    """Drop all cached pages of a feed. Must be called with the lock held."""
+    for key in [key for key in _feeds if key[0] == feed_key]:
+        del _feeds[key]
+
+
+def invalidate_newsletter(newsletter_id: str) -> None:
+    """Drop the cached feed of a newsletter and the master feed in all processes."""
+    _invalidate_newsletter(newsletter_id)
+    cache_sync.publish(CACHE_KIND, newsletter_id)
+
+
+def _invalidate_newsletter(newsletter_id: str) -> None:
+    """Drop the cached feed of a newsletter and the master feed."""
+    logger.debug(f"Invalidating cached feeds for newsletter_id={newsletter_id}")
+    with _lock:
+        _drop(newsletter_id)
+        _drop(MASTER_FEED_KEY)
+        for alias in [a for a, key in _aliases.items() if key == newsletter_id]:
+            del _aliases[alias]
+    _remove_from_disk(newsletter_id)
+    _remove_from_disk(MASTER_FEED_KEY)
+
+
+def get_fragment(entry_id: str, title: str) -> bytes | None:
+    """Return the memoized ``<entry>`` element of an entry."""
+    with _lock:
+        fragment = _fragments.get((entry_id, title))
+        if fragment is not None:
+            _fragments.move_to_end((entry_id, title))
+        return fragment
+
+
+def set_fragment(entry_id: str, title: str, fragment: bytes) -> None:
+    """Memoize the rendered ``<entry>`` element of an entry."""
+    with _lock:
+        _fragments[(entry_id, title)] = fragment
+        _fragments.move_to_end((entry_id, title))
+        while len(_fragments) > settings.feed_fragment_cache_size:
+            _fragments.popitem(last=False)
+
+
+def _clear_memory() -> None:
+    """Drop all feeds and fragments cached in memory."""
+    with _lock:
+        _feeds.clear()
+        _fragments.clear()
+        _aliases.clear()
+        _aliases[MASTER_FEED_KEY] = MASTER_FEED_KEY
+
+
+def clear() -> None:
+    """Drop all cached feeds and fragments."""
+    _clear_memory()
+    if settings.feed_cache_dir and os.path.isdir(settings.feed_cache_dir):
+        for name in os.listdir(settings.feed_cache_dir):
+            if name.endswith((".xml", ".json")):
+                try:
+                    os.remove(os.path.join(settings.feed_cache_dir, name))
+                except OSError:
+                    pass
+
+
+def _on_remote_invalidation(newsletter_id: str | None) -> None:
+    """Apply an invalidation made by another process.
+
+    Without a newsletter id only the memory is cleared, the files on disk are
+    kept current by the processes that change the feeds.
+    """
+    if newsletter_id is None:
+        _clear_memory()
+    else:
+        _invalidate_newsletter(newsletter_id)
+
+
+cache_sync.register(CACHE_KIND, _on_remote_invalidation)
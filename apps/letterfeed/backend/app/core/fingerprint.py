@@ -0,0 +1,47 @@
+"""Fingerprints of entry content, to recognize newsletters that were resent.
+
+The content hash identifies entries with the same normalized content. The
+SimHash of the text identifies near-duplicates: texts that differ in a few
+words have hashes that differ in a few bits.
+"""
+
+import hashlib
+import re
+
+_SIMHASH_BITS = 64
+_SHINGLE_SIZE = 3
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def content_hash(content: str) -> str:
+    """Hash content, ignoring case and whitespace."""
+    normalized = " ".join(content.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def simhash(text: str) -> int | None:
+    """Compute the 64-bit SimHash of a text from its word shingles.
+
+    Returns a signed integer, so it fits an SQLite INTEGER, or None if the text
+    has no words.
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words:
+        return None
+    shingles = [
+        " ".join(words[i : i + _SHINGLE_SIZE])
+        for i in range(max(1, len(words) - _SHINGLE_SIZE + 1))
+    ]
+    weights = [0] * _SIMHASH_BITS
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        for bit in range(_SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    value = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return value - (1 << _SIMHASH_BITS) if value >> (_SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Return the number of bits in which two SimHashes differ."""
+    return ((a ^ b) & ((1 << _SIMHASH_BITS) - 1)).bit_count()
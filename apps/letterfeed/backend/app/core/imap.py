@@ -1,52 +1,47 @@
 """IMAP utility functions for connecting to mail servers and fetching folders."""
 
-import base64
-import imaplib
-from typing import Literal
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Literal
 
+from app.core.config import settings
+from app.core.imap_client import (
+    ImapCredentials,
+    ImapSessionPool,
+    open_session,
+)
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Slow mail servers must not exhaust the thread pool shared by all sync routes.
+_imap_executor = ThreadPoolExecutor(
+    max_workers=settings.imap_executor_workers, thread_name_prefix="imap"
+)
+# Authenticated sessions shared by API requests
+imap_sessions = ImapSessionPool()
 
-def _create_oauth2_auth_string(email: str, access_token: str) -> str:
-    """Create IMAP XOAUTH2 authentication string.
-    
-    Args:
-        email: Gmail email address.
-        access_token: OAuth2 access token.
-        
-    Returns:
-        XOAUTH2 authentication string.
-    """
-    auth_string = f"user={email}\x01auth=Bearer {access_token}\x01\x01"
-    return base64.b64encode(auth_string.encode()).decode()
+
+async def run_in_imap_executor[T](func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking IMAP operation on the dedicated IMAP thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _imap_executor, functools.partial(func, *args, **kwargs)
+    )
 
 
-def _test_imap_connection(
-    server: str,
-    username: str,
-    password: str | None = None,
-    oauth2_email: str | None = None,
-    oauth2_token: str | None = None,
-) -> tuple[bool, str]:
+async def _test_imap_connection(credentials: ImapCredentials) -> tuple[bool, str]:
     """Test the IMAP connection with the given credentials.
-    
-    Supports both password-based and OAuth2 authentication.
+
+    Always opens a new session, so a pooled session cannot hide a failure.
     """
-    logger.info(f"Testing IMAP connection to {server} for user {username}")
+    logger.info(
+        f"Testing IMAP connection to {credentials.server} for user {credentials.username}"
+    )
     try:
-        mail = imaplib.IMAP4_SSL(server)
-        
-        if oauth2_email and oauth2_token:
-            # OAuth2 authentication
-            auth_string = _create_oauth2_auth_string(oauth2_email, oauth2_token)
-            mail.authenticate("XOAUTH2", lambda x: auth_string)
-        else:
-            # Password authentication
-            mail.login(username, password)
-        
-        mail.logout()
+        client = await open_session(credentials)
+        await client.logout()
         logger.info("IMAP connection successful")
         return True, "Connection successful"
     except Exception as e:
@@ -54,39 +49,16 @@ def _test_imap_connection(
         return False, str(e)
 
 
-def get_folders(
-    server: str,
-    username: str,
-    password: str | None = None,
-    oauth2_email: str | None = None,
-    oauth2_token: str | None = None,
-) -> list[str]:
-    """Fetch a list of IMAP folders from the mail server.
-    
-    Supports both password-based and OAuth2 authentication.
-    """
-    logger.info(f"Fetching IMAP folders from {server} for user {username}")
+async def get_folders(credentials: ImapCredentials) -> list[str]:
+    """Fetch a list of IMAP folders from the mail server."""
+    logger.info(
+        f"Fetching IMAP folders from {credentials.server} for user {credentials.username}"
+    )
     try:
-        mail = imaplib.IMAP4_SSL(server)
-        
-        if oauth2_email and oauth2_token:
-            # OAuth2 authentication
-            auth_string = _create_oauth2_auth_string(oauth2_email, oauth2_token)
-            mail.authenticate("XOAUTH2", lambda x: auth_string)
-        else:
-            # Password authentication
-            mail.login(username, password)
-        
-        status, folders = mail.list()
-        mail.logout()
-        if status == "OK":
-            folder_list = [
-                folder.decode().split(' "/" ')[1].strip('"') for folder in folders
-            ]
-            logger.info(f"Found {len(folder_list)} folders")
-            return folder_list
-        logger.warning(f"Failed to list IMAP folders, status: {status}")
-        return []
+        async with imap_sessions.session(credentials) as client:
+            folders = await client.list_folders()
+        logger.info(f"Found {len(folders)} folders")
+        return folders
     except Exception as e:
         logger.error(f"Error fetching IMAP folders: {e}")
         return []
@@ -0,0 +1,420 @@
+"""Asyncio IMAP client with per-operation timeouts and shared sessions.
+
+Every network operation is bounded by ``LETTERFEED_IMAP_TIMEOUT``, so a hung
+server fails a request instead of blocking it forever. Authenticated sessions
+are kept in an ``ImapSessionPool`` and reused across requests.
+"""
+
+import asyncio
+import base64
+import hashlib
+import re
+import ssl
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import Any, NamedTuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+IMAP_SSL_PORT = 993
+_LITERAL_PATTERN = re.compile(rb"\{(\d+)\}\r\n$")
+_LIST_PATTERN = re.compile(
+    rb'^\* LIST \((?P<flags>[^)]*)\) (?P<delimiter>"(?:[^"\\]|\\.)*"|NIL) (?P<name>.+)$',
+    re.DOTALL,
+)
+# Pooled sessions idle for longer are checked with NOOP before being reused
+_MAX_UNCHECKED_IDLE = 60.0
+# Pooled sessions older than this are closed instead of reused
+_MAX_SESSION_AGE = 1800.0
+
+
+class ImapError(Exception):
+    """An IMAP command failed or the server sent an invalid response."""
+
+
+class ImapTimeout(ImapError, TimeoutError):
+    """An IMAP operation did not complete in time."""
+
+
+class ImapCredentials(NamedTuple):
+    """Where and how to log in to an IMAP server.
+
+    If ``oauth2_token`` is set, the session authenticates with XOAUTH2,
+    otherwise with the password.
+    """
+
+    server: str
+    username: str
+    password: str | None = None
+    oauth2_token: str | None = None
+    port: int = IMAP_SSL_PORT
+    use_ssl: bool = True
+
+
+class ImapResponse(NamedTuple):
+    """The completion of a command and the untagged responses it received.
+
+    Literals are inlined into the untagged response they belong to.
+    """
+
+    status: str
+    text: str
+    untagged: list[bytes]
+
+
+def xoauth2_string(username: str, access_token: str) -> bytes:
+    """Build the initial client response of the XOAUTH2 mechanism."""
+    return f"user={username}\x01auth=Bearer {access_token}\x01\x01".encode()
+
+
+def authenticate(session: Any, credentials: ImapCredentials) -> Any:
+    """Log in with OAuth2 if a token is given, otherwise with the password.
+
+    The only place deciding how to authenticate, for ``AsyncImapClient`` as
+    well as ``imaplib.IMAP4`` sessions, which share ``authenticate`` and
+    ``login``. The result of an ``AsyncImapClient`` must be awaited.
+    """
+    if credentials.oauth2_token:
+        auth_string = xoauth2_string(credentials.username, credentials.oauth2_token)
+        return session.authenticate("XOAUTH2", lambda _: auth_string)
+    return session.login(credentials.username, credentials.password or "")
+
+
+def _quote(value: str) -> str:
+    """Quote a string argument of an IMAP command."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _unquote(value: bytes) -> str:
+    """Decode a quoted string or atom of an IMAP response."""
+    if value.startswith(b'"') and value.endswith(b'"'):
+        value = re.sub(rb"\\(.)", rb"\1", value[1:-1])
+    return value.decode()
+
+
+class AsyncImapClient:
+    """A single IMAP connection.
+
+    Commands are serialized, so a client can be shared between tasks.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = IMAP_SSL_PORT,
+        use_ssl: bool = True,
+        timeout: float | None = None,
+    ):
+        """Initialize a client for a server, without connecting yet."""
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout if timeout is not None else settings.imap_timeout
+        self.capabilities: set[str] = set()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+        self._tag_counter = 0
+
+    async def _with_timeout[T](self, awaitable, operation: str) -> T:
+        """Await an operation, failing with ImapTimeout after the timeout."""
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except TimeoutError:
+            self.abort()
+            raise ImapTimeout(
+                f"IMAP {operation} on {self.host} timed out after {self.timeout}s"
+            ) from None
+
+    async def connect(self) -> None:
+        """Open the connection and read the server greeting."""
+        self.loop = asyncio.get_running_loop()
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await self._with_timeout(
+            asyncio.open_connection(self.host, self.port, ssl=context),
+            "connect",
+        )
+        greeting = await self._with_timeout(self._read_response(), "greeting")
+        if not greeting.startswith((b"* OK", b"* PREAUTH")):
+            self.abort()
+            raise ImapError(f"Unexpected IMAP greeting: {greeting!r}")
+        await self.capability()
+
+    def abort(self) -> None:
+        """Close the connection without logging out."""
+        if self._writer is not None:
+            # A transport cannot outlive its event loop, so there is nothing
+            # left to close once the loop is.
+            if not self.loop.is_closed():
+                self._writer.transport.abort()
+            self._writer = None
+            self._reader = None
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether the connection is open."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _read_response(self) -> bytes:
+        """Read one response line, inlining any literals it contains."""
+        if self._reader is None:
+            raise ImapError("Not connected")
+        parts = []
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            match = _LITERAL_PATTERN.search(line)
+            if match is None:
+                parts.append(line[:-2])
+                return b"".join(parts)
+            parts.append(line[: match.start()])
+            parts.append(await self._reader.readexactly(int(match.group(1))))
+
+    def _next_tag(self) -> bytes:
+        """Return a new command tag."""
+        self._tag_counter += 1
+        return f"LF{self._tag_counter}".encode()
+
+    async def _send(self, command: str) -> ImapResponse:
+        """Send a command and collect its response, whatever its status."""
+        async with self._lock:
+            if self._writer is None:
+                raise ImapError("Not connected")
+            tag = self._next_tag()
+            self._writer.write(tag + b" " + command.encode() + b"\r\n")
+            return await self._with_timeout(
+                self._read_completion(tag), command.split(" ", 1)[0]
+            )
+
+    async def _read_completion(self, tag: bytes) -> ImapResponse:
+        """Read responses until the tagged command has completed."""
+        await self._writer.drain()
+        untagged: list[bytes] = []
+        while True:
+            line = await self._read_response()
+            if line.startswith(b"* "):
+                untagged.append(line)
+                continue
+            line_tag, _, rest = line.partition(b" ")
+            if line_tag != tag:
+                raise ImapError(f"Unexpected IMAP response: {line!r}")
+            status, _, text = rest.partition(b" ")
+            return ImapResponse(status.decode(), text.decode(), untagged)
+
+    async def command(self, command: str) -> ImapResponse:
+        """Send a command and return its response, raising ImapError unless OK."""
+        response = await self._send(command)
+        if response.status != "OK":
+            raise ImapError(f"{command.split(' ', 1)[0]} failed: {response.text}")
+        return response
+
+    async def capability(self) -> set[str]:
+        """Fetch the capabilities of the server."""
+        response = await self.command("CAPABILITY")
+        self.capabilities = {
+            word.upper()
+            for line in response.untagged
+            if line.startswith(b"* CAPABILITY ")
+            for word in line[len(b"* CAPABILITY ") :].decode().split()
+        }
+        return self.capabilities
+
+    async def login(self, username: str, password: str) -> None:
+        """Log in with a password."""
+        await self.command(f"LOGIN {_quote(username)} {_quote(password)}")
+
+    async def authenticate(
+        self, mechanism: str, authobject: Callable[[bytes], bytes]
+    ) -> None:
+        """Authenticate with a SASL mechanism, like ``imaplib.IMAP4.authenticate``.
+
+        ``authobject`` answers the server's first challenge, later challenges
+        carry an error and are answered empty.
+        """
+        async with self._lock:
+            if self._writer is None:
+                raise ImapError("Not connected")
+            tag = self._next_tag()
+            self._writer.write(tag + f" AUTHENTICATE {mechanism}\r\n".encode())
+            response = await self._with_timeout(
+                self._read_authentication(tag, authobject), "AUTHENTICATE"
+            )
+        if response.status != "OK":
+            raise ImapError(f"AUTHENTICATE failed: {response.text}")
+
+    async def _read_authentication(
+        self, tag: bytes, authobject: Callable[[bytes], bytes] | None
+    ) -> ImapResponse:
+        """Answer the server's challenges until authentication completes."""
+        await self._writer.drain()
+        while True:
+            line = await self._read_response()
+            if line.startswith(b"+"):
+                answer = b""
+                if authobject is not None:
+                    answer = base64.b64encode(
+                        authobject(base64.b64decode(line[1:].strip()))
+                    )
+                    authobject = None
+                self._writer.write(answer + b"\r\n")
+                await self._writer.drain()
+            elif line.startswith(tag + b" "):
+                status, _, text = line[len(tag) + 1 :].partition(b" ")
+                return ImapResponse(status.decode(), text.decode(), [])
+
+    async def list_folders(self) -> list[str]:
+        """List the names of all folders."""
+        response = await self.command('LIST "" "*"')
+        folders = []
+        for line in response.untagged:
+            match = _LIST_PATTERN.match(line)
+            if match:
+                folders.append(_unquote(match.group("name")))
+        return folders
+
+    async def select(self, folder: str) -> int:
+        """Select a folder and return its number of messages."""
+        response = await self.command(f"SELECT {_quote(folder)}")
+        for line in response.untagged:
+            words = line.split()
+            if len(words) == 3 and words[2] == b"EXISTS":
+                return int(words[1])
+        return 0
+
+    async def noop(self) -> None:
+        """Send a NOOP, e.g. to check that the session is alive."""
+        await self.command("NOOP")
+
+    async def logout(self) -> None:
+        """Log out and close the connection."""
+        try:
+            if self.is_connected:
+                await self._send("LOGOUT")
+        except (ImapError, OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.abort()
+
+
+async def open_session(credentials: ImapCredentials) -> AsyncImapClient:
+    """Connect to a server and authenticate."""
+    client = AsyncImapClient(
+        credentials.server, credentials.port, use_ssl=credentials.use_ssl
+    )
+    await client.connect()
+    try:
+        await authenticate(client, credentials)
+    except BaseException:
+        await client.logout()
+        raise
+    return client
+
+
+def _secret_digest(credentials: ImapCredentials) -> bytes:
+    """Fingerprint the password or token a session authenticated with."""
+    secret = credentials.oauth2_token or credentials.password or ""
+    return hashlib.sha256(secret.encode()).digest()
+
+
+class _PooledSession(NamedTuple):
+    """An idle session and what is needed to decide whether to reuse it."""
+
+    client: AsyncImapClient
+    secret: bytes
+    opened_at: float
+    last_used: float
+
+
+class ImapSessionPool:
+    """Keeps authenticated sessions for reuse, per server and user.
+
+    Sessions authenticated with another password or token than the current
+    one, e.g. an OAuth2 token that was refreshed since, are closed instead of
+    reused, as are sessions older than ``_MAX_SESSION_AGE``.
+    """
+
+    def __init__(self, max_idle_sessions: int = 2):
+        """Initialize an empty pool."""
+        self.max_idle_sessions = max_idle_sessions
+        # (server, port, username) -> idle sessions
+        self._idle: dict[tuple[str, int, str], list[_PooledSession]] = {}
+
+    @staticmethod
+    def _key(credentials: ImapCredentials) -> tuple[str, int, str]:
+        """Identify the sessions that credentials can share, without secrets."""
+        return credentials.server, credentials.port, credentials.username
+
+    async def _take(
+        self, credentials: ImapCredentials
+    ) -> tuple[AsyncImapClient, float] | None:
+        """Take a live idle session for the credentials out of the pool.
+
+        Returns:
+            The session and when it was opened.
+        """
+        loop = asyncio.get_running_loop()
+        secret = _secret_digest(credentials)
+        idle = self._idle.get(self._key(credentials), [])
+        while idle:
+            client, session_secret, opened_at, last_used = idle.pop()
+            now = time.monotonic()
+            if (
+                client.loop is not loop
+                or not client.is_connected
+                or session_secret != secret
+                or now - opened_at >= _MAX_SESSION_AGE
+            ):
+                client.abort()
+                continue
+            if now - last_used < _MAX_UNCHECKED_IDLE:
+                return client, opened_at
+            try:
+                await client.noop()
+                return client, opened_at
+            except (ImapError, OSError, asyncio.IncompleteReadError):
+                client.abort()
+        return None
+
+    @asynccontextmanager
+    async def session(
+        self, credentials: ImapCredentials
+    ) -> AsyncIterator[AsyncImapClient]:
+        """Provide an authenticated session, reusing an idle one if possible.
+
+        A session that raised an error is closed instead of returned to the pool.
+        """
+        taken = await self._take(credentials)
+        if taken is None:
+            logger.debug(f"Opening IMAP session to {credentials.server}")
+            client, opened_at = await open_session(credentials), time.monotonic()
+        else:
+            client, opened_at = taken
+        try:
+            yield client
+        except BaseException:
+            client.abort()
+            raise
+        idle = self._idle.setdefault(self._key(credentials), [])
+        if client.is_connected and len(idle) < self.max_idle_sessions:
+            idle.append(
+                _PooledSession(
+                    client, _secret_digest(credentials), opened_at, time.monotonic()
+                )
+            )
+        else:
+            await client.logout()
+
+    async def close_all(self) -> None:
+        """Log out of all idle sessions."""
+        idle, self._idle = self._idle, {}
+        for sessions in idle.values():
+            for client, *_ in sessions:
+                if client.loop is asyncio.get_running_loop():
+                    await client.logout()
+                else:
+                    client.abort()
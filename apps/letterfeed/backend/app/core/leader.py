@@ -0,0 +1,84 @@
+"""Leader election between processes sharing the database.
+
+When the API runs with several workers, or next to a separate ingestion
+worker, exactly one process may poll IMAP. Processes compete for a named
+lease row in the database: the holder renews it periodically, and once it
+stops renewing, e.g. because it crashed, another process takes over after
+``LETTERFEED_LEADER_LEASE_SECONDS``.
+"""
+
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.coordination import LeaderLock
+
+logger = get_logger(__name__)
+
+# Identifies this process in leases and cache invalidations
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+INGESTION_LEASE = "ingestion"
+
+
+class LeaderLease:
+    """A named lease this process may hold."""
+
+    def __init__(self, name: str, holder: str = INSTANCE_ID):
+        """Initialize a lease that is not held yet."""
+        self.name = name
+        self.holder = holder
+        self._expires_at = 0.0
+
+    @property
+    def is_held(self) -> bool:
+        """Whether this process holds the lease and it has not expired."""
+        return time.time() < self._expires_at
+
+    def acquire(self, db: Session) -> bool:
+        """Take or renew the lease, unless another process holds it.
+
+        Returns:
+            Whether this process holds the lease now.
+        """
+        now = time.time()
+        expires_at = now + settings.leader_lease_seconds
+        statement = insert(LeaderLock).values(
+            name=self.name, holder=self.holder, expires_at=expires_at
+        )
+        # Take the row over only if it is ours or its holder stopped renewing.
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[LeaderLock.name],
+                set_={"holder": self.holder, "expires_at": expires_at},
+                where=(LeaderLock.holder == self.holder)
+                | (LeaderLock.expires_at < now),
+            )
+        )
+        holder = db.scalar(select(LeaderLock.holder).filter_by(name=self.name))
+        db.commit()
+
+        was_held = self.is_held
+        self._expires_at = expires_at if holder == self.holder else 0.0
+        if self.is_held and not was_held:
+            logger.info(f"Became leader of '{self.name}' as {self.holder}")
+        elif was_held and not self.is_held:
+            logger.warning(f"Lost leadership of '{self.name}' to {holder}")
+        return self.is_held
+
+    def release(self, db: Session) -> None:
+        """Give the lease up, so another process can take over immediately."""
+        db.execute(delete(LeaderLock).filter_by(name=self.name, holder=self.holder))
+        db.commit()
+        if self.is_held:
+            logger.info(f"Released leadership of '{self.name}'")
+        self._expires_at = 0.0
+
+
+ingestion_lease = LeaderLease(INGESTION_LEASE)
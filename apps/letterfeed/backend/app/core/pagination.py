@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import NamedTuple
+
+
+class Cursor(NamedTuple):
+    """Position of an entry in the newest-first ordering of entries.
+
+    Serialized as ``<received_at>,<id>`` in ``?before=`` query parameters.
+    """
+
+    received_at: datetime
+    id: str
+
+    def __str__(self) -> str:
+        """Serialize the cursor for use in a URL."""
+        return f"{self.received_at.isoformat()},{self.id}"
+
+
+def parse_cursor(value: str) -> Cursor:
+    """Parse a serialized cursor, raising ValueError if it is malformed."""
+    received_at, separator, entry_id = value.partition(",")
+    if not separator or not entry_id:
+        raise ValueError(f"Invalid cursor: {value!r}")
+    return Cursor(datetime.fromisoformat(received_at), entry_id)
+
+
+class SearchCursor(NamedTuple):
+    """Position of an entry in the ranked results of a search.
+
+    Serialized as ``<score>,<id>`` in ``?after=`` query parameters.
+    """
+
+    score: float
+    id: str
+
+    def __str__(self) -> str:
+        """Serialize the cursor for use in a URL."""
+        return f"{self.score!r},{self.id}"
+
+
+def parse_search_cursor(value: str) -> SearchCursor:
+    """Parse a serialized search cursor, raising ValueError if it is malformed."""
+    score, separator, entry_id = value.partition(",")
+    if not separator or not entry_id:
+        raise ValueError(f"Invalid cursor: {value!r}")
+    return SearchCursor(float(score), entry_id)
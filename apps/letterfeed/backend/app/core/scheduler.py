@@ -2,22 +2,50 @@ from datetime import datetime
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from app.core import cache_sync
+from app.core.config import settings as app_settings
 from app.core.database import SessionLocal
+from app.core.leader import ingestion_lease
 from app.core.logging import get_logger
 from app.crud.settings import get_settings
 from app.services.email_processor import process_emails
+from app.services.imap_idle import idle_manager
+from app.services.polling import process_due_folders
 
 """Scheduler for background tasks like email processing."""
 
 logger = get_logger(__name__)
 
+# Cache sync kind used to ask the leader for an immediate check
+CHECK_REQUEST_KIND = "email_check"
 
-def job():
-    """Process emails as a scheduled job."""
+
+def job(all_folders: bool = False):
+    """Process emails as a scheduled job, if this process holds the ingestion lease.
+
+    Args:
+        all_folders: Check every folder right away, as requested by a user,
+            instead of only those that are due and not watched with IDLE.
+    """
+    if not ingestion_lease.is_held:
+        logger.debug("Skipping scheduled email check, another process is the leader")
+        return
     logger.info("Scheduler job starting: process_emails")
     db = SessionLocal()
     try:
-        process_emails(db)
+        if all_folders:
+            process_emails(db)
+            logger.info("Scheduler job finished: process_emails")
+            return
+        # Folders watched with IDLE are checked by their watchers, the
+        # scheduled check remains a safety net while a watcher reconnects.
+        watched = idle_manager.connected_folders
+        if watched:
+            logger.info(f"Skipping folders watched with IDLE: {sorted(watched)}")
+        if app_settings.adaptive_polling:
+            process_due_folders(db, skip=watched)
+        else:
+            process_emails(db, skip=watched)
         logger.info("Scheduler job finished: process_emails")
     except Exception as e:
         logger.error(f"Error in scheduled job process_emails: {e}", exc_info=True)
@@ -25,7 +53,92 @@ def job():
         db.close()
 
 
+def _schedule_initial_check():
+    """Check for new emails right away."""
+    scheduler.add_job(
+        job,
+        "date",
+        run_date=datetime.now(),
+        id="initial_email_check",
+        replace_existing=True,
+    )
+
+
+def _schedule_requested_check():
+    """Check all folders for new emails right away."""
+    scheduler.add_job(
+        job,
+        "date",
+        run_date=datetime.now(),
+        kwargs={"all_folders": True},
+        id="requested_email_check",
+        replace_existing=True,
+    )
+
+
+def request_check() -> None:
+    """Have the process holding the ingestion lease check for new emails now.
+
+    Other processes ask the leader through the cache sync table, it picks the
+    request up with its next heartbeat.
+    """
+    if ingestion_lease.is_held:
+        _schedule_requested_check()
+    else:
+        cache_sync.publish(CHECK_REQUEST_KIND, "requested")
+
+
+def _on_check_requested(key: str | None) -> None:
+    """Apply a check requested by another process, if this process is the leader.
+
+    Without a key all caches are being dropped, no check was requested.
+    """
+    if key is not None and ingestion_lease.is_held:
+        logger.info("Another process requested an email check")
+        _schedule_requested_check()
+
+
+def heartbeat():
+    """Renew the ingestion lease, or take over from a leader that stopped.
+
+    The leader also starts and stops IDLE watchers to match the folders.
+    """
+    db = SessionLocal()
+    try:
+        was_leader = ingestion_lease.is_held
+        if ingestion_lease.acquire(db):
+            if not was_leader:
+                _schedule_initial_check()
+            if app_settings.imap_idle_enabled:
+                # Start watching right away and follow changed folders.
+                idle_manager.sync(db)
+            # Picks up checks requested by other processes.
+            cache_sync.poll()
+            pruned = cache_sync.prune()
+            if pruned:
+                logger.debug(f"Pruned {pruned} cache invalidations")
+        elif was_leader:
+            idle_manager.stop()
+    except Exception as e:
+        logger.error(f"Error renewing the ingestion lease: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+def release_leadership():
+    """Stop checking emails and let another process take over right away."""
+    idle_manager.stop()
+    db = SessionLocal()
+    try:
+        ingestion_lease.release(db)
+    except Exception as e:
+        logger.error(f"Error releasing the ingestion lease: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
 scheduler = BackgroundScheduler()
+cache_sync.register(CHECK_REQUEST_KIND, _on_check_requested)
 
 
 def start_scheduler_with_interval():
@@ -33,24 +146,34 @@ def start_scheduler_with_interval():
     logger.info("Attempting to start scheduler...")
     db = SessionLocal()
     try:
-        settings = get_settings(db)
-        interval = settings.email_check_interval if settings else 15
-        logger.info(f"Setting scheduler interval to {interval} minutes")
+        if app_settings.adaptive_polling:
+            # Each run only checks the folders that are due.
+            logger.info(
+                "Checking folders adaptively, looking for due ones every minute"
+            )
+            trigger = {"minutes": 1}
+        else:
+            settings = get_settings(db)
+            interval = settings.email_check_interval if settings else 15
+            logger.info(f"Setting scheduler interval to {interval} minutes")
+            trigger = {"minutes": interval}
         scheduler.add_job(
             job,
             "interval",
-            minutes=interval,
+            **trigger,
             id="email_check_job",
             replace_existing=True,
         )
+        scheduler.add_job(
+            heartbeat,
+            "interval",
+            seconds=max(app_settings.leader_lease_seconds / 3, 1),
+            id="leader_heartbeat",
+            replace_existing=True,
+        )
         if not scheduler.running:
-            scheduler.add_job(
-                job,
-                "date",
-                run_date=datetime.now(),
-                id="initial_email_check",
-                replace_existing=True,
-            )
+            # Schedules the initial check if this process becomes the leader.
+            heartbeat()
             scheduler.start()
             logger.info("Scheduler started.")
         else:
@@ -0,0 +1,192 @@
+"""In-process index routing sender addresses to newsletters.
+
+Every email check needs to know which folders to search and which newsletter
+each sender belongs to. The index loads all newsletters and senders with one
+query and keeps the result until the CRUD layer changes a newsletter or its
+senders, so a check costs no queries however many senders there are.
+
+Besides exact addresses, a sender can be a domain wildcard such as
+``*@example.com``, which matches every address at that domain and its
+subdomains. The most specific match wins: an exact address before a
+subdomain before its parent domain.
+"""
+
+import threading
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.core import cache_sync
+from app.core.logging import get_logger
+from app.models.newsletters import Newsletter, Sender
+
+logger = get_logger(__name__)
+
+WILDCARD_PREFIX = "*@"
+CACHE_KIND = "senders"
+
+
+class NewsletterRoute(NamedTuple):
+    """What email processing needs to know about a newsletter."""
+
+    id: str
+    name: str
+    search_folder: str | None
+    move_to_folder: str | None
+    extract_content: bool
+
+    @classmethod
+    def from_newsletter(cls, newsletter: Newsletter) -> "NewsletterRoute":
+        """Build the route of a newsletter model."""
+        return cls(
+            newsletter.id,
+            newsletter.name,
+            newsletter.search_folder,
+            newsletter.move_to_folder,
+            bool(newsletter.extract_content),
+        )
+
+
+class _SenderTable(NamedTuple):
+    # address -> newsletter
+    exact: dict[str, NewsletterRoute]
+    # domain of a wildcard sender -> newsletter
+    domains: dict[str, NewsletterRoute]
+
+
+class SenderMap:
+    """Looks up the newsletter of a sender address within one folder.
+
+    Senders added during a check are kept in the map only, the shared index
+    is not modified.
+    """
+
+    def __init__(self, tables: list[_SenderTable]):
+        """Initialize a map looking up senders in the given tables."""
+        self._tables = tables
+        self._added: dict[str, NewsletterRoute] = {}
+
+    def get(
+        self, address: str, default: NewsletterRoute | None = None
+    ) -> NewsletterRoute | None:
+        """Return the newsletter of a sender address."""
+        route = self._added.get(address)
+        if route is not None:
+            return route
+        for table in self._tables:
+            route = table.exact.get(address)
+            if route is not None:
+                return route
+        if not any(table.domains for table in self._tables):
+            return default
+
+        labels = address.rpartition("@")[2].lower().split(".")
+        for start in range(len(labels)):
+            domain = ".".join(labels[start:])
+            for table in self._tables:
+                route = table.domains.get(domain)
+                if route is not None:
+                    return route
+        return default
+
+    def __contains__(self, address: str) -> bool:
+        """Check whether a sender address belongs to a newsletter."""
+        return self.get(address) is not None
+
+    def __setitem__(self, address: str, route: NewsletterRoute) -> None:
+        """Route a sender address to a newsletter for the rest of the check."""
+        self._added[address] = route
+
+
+class _RoutingTable(NamedTuple):
+    # search folder of the newsletters (None for the default folder) -> newsletters
+    newsletters: dict[str | None, list[NewsletterRoute]]
+    senders: dict[str | None, _SenderTable]
+
+
+def _load(db: Session) -> _RoutingTable:
+    """Load all newsletters and their senders with a single query."""
+    rows = db.query(
+        Newsletter.id,
+        Newsletter.name,
+        Newsletter.search_folder,
+        Newsletter.move_to_folder,
+        Newsletter.extract_content,
+        Sender.email,
+    ).outerjoin(Sender, Sender.newsletter_id == Newsletter.id)
+
+    newsletters: dict[str | None, list[NewsletterRoute]] = {}
+    senders: dict[str | None, _SenderTable] = {}
+    seen: dict[str, NewsletterRoute] = {}
+    for newsletter_id, name, search_folder, move_to_folder, extract, email in rows:
+        search_folder = search_folder or None
+        route = seen.get(newsletter_id)
+        if route is None:
+            route = NewsletterRoute(
+                newsletter_id, name, search_folder, move_to_folder, bool(extract)
+            )
+            seen[newsletter_id] = route
+            newsletters.setdefault(search_folder, []).append(route)
+        if email is None:
+            continue
+        table = senders.setdefault(search_folder, _SenderTable({}, {}))
+        if email.startswith(WILDCARD_PREFIX):
+            table.domains[email.removeprefix(WILDCARD_PREFIX).lower()] = route
+        else:
+            table.exact[email] = route
+    logger.debug(f"Loaded sender routes of {len(seen)} newsletters")
+    return _RoutingTable(newsletters, senders)
+
+
+class SenderRoutingIndex:
+    """Caches the routes of all newsletters until they change."""
+
+    def __init__(self):
+        """Initialize an empty index, loaded on first use."""
+        self._lock = threading.Lock()
+        self._table: _RoutingTable | None = None
+        # Incremented on invalidation, so a load that raced with it is not kept
+        self._generation = 0
+
+    def _get_table(self, db: Session) -> _RoutingTable:
+        """Return the routing table, loading it if necessary."""
+        cache_sync.poll()
+        with self._lock:
+            table, generation = self._table, self._generation
+        if table is not None:
+            return table
+        table = _load(db)
+        with self._lock:
+            if generation == self._generation:
+                self._table = table
+        return table
+
+    def folder_groups(
+        self, db: Session, default_folder: str
+    ) -> dict[str, list[NewsletterRoute]]:
+        """Group all newsletters by the folder their emails are searched in."""
+        groups: dict[str, list[NewsletterRoute]] = {}
+        for folder, routes in self._get_table(db).newsletters.items():
+            groups.setdefault(folder or default_folder, []).extend(routes)
+        return groups
+
+    def sender_map(self, db: Session, folder: str, default_folder: str) -> SenderMap:
+        """Return the sender map of the newsletters searched in a folder."""
+        senders = self._get_table(db).senders
+        keys = [folder, None] if folder == default_folder else [folder]
+        return SenderMap([senders[key] for key in keys if key in senders])
+
+    def invalidate(self) -> None:
+        """Drop the index in all processes after a newsletter or its senders changed."""
+        self.invalidate_local()
+        cache_sync.publish(CACHE_KIND)
+
+    def invalidate_local(self, key: str | None = None) -> None:
+        """Drop the index of this process only."""
+        with self._lock:
+            self._table = None
+            self._generation += 1
+
+
+sender_routing = SenderRoutingIndex()
+cache_sync.register(CACHE_KIND, sender_routing.invalidate_local)
@@ -0,0 +1,78 @@
+"""In-process snapshot of the settings row.
+
+Authentication and email processing read the settings on every request and
+every check. The row is loaded once and kept in memory until the CRUD layer
+changes it, in this or another process, or for at most
+``LETTERFEED_SETTINGS_CACHE_TTL`` seconds. Every snapshot has its own
+version, so derived values can be cached per version.
+"""
+
+import itertools
+import threading
+import time
+from typing import Any, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.core import cache_sync
+from app.core.config import settings
+from app.models.settings import Settings as SettingsModel
+
+CACHE_KIND = "settings"
+
+
+class SettingsSnapshot(NamedTuple):
+    """The column values of the settings row at one point in time."""
+
+    version: int
+    loaded_at: float
+    values: dict[str, Any]
+
+
+_lock = threading.Lock()
+_versions = itertools.count(1)
+_snapshot: SettingsSnapshot | None = None
+# Incremented on invalidation, so a load that raced with it is not kept
+_generation = 0
+
+
+def get_settings_snapshot(db: Session) -> SettingsSnapshot | None:
+    """Return the current settings, or None if the row does not exist yet."""
+    global _snapshot
+    cache_sync.poll()
+    with _lock:
+        snapshot, generation = _snapshot, _generation
+    if (
+        snapshot is not None
+        and time.monotonic() - snapshot.loaded_at < settings.settings_cache_ttl
+    ):
+        return snapshot
+
+    row = db.query(SettingsModel).first()
+    if row is None:
+        return None
+    values = {
+        column.name: getattr(row, column.name) for column in row.__table__.columns
+    }
+    with _lock:
+        snapshot = SettingsSnapshot(next(_versions), time.monotonic(), values)
+        if generation == _generation:
+            _snapshot = snapshot
+    return snapshot
+
+
+def invalidate() -> None:
+    """Drop the snapshot in all processes after the settings row was changed."""
+    invalidate_local()
+    cache_sync.publish(CACHE_KIND)
+
+
+def invalidate_local(key: str | None = None) -> None:
+    """Drop the snapshot of this process only."""
+    global _snapshot, _generation
+    with _lock:
+        _snapshot = None
+        _generation += 1
+
+
+cache_sync.register(CACHE_KIND, invalidate_local)
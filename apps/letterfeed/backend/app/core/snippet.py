@@ -0,0 +1,32 @@
+from lxml import etree, html
+
+SNIPPET_LENGTH = 200
+
+
+def html_to_text(body: str | None) -> str:
+    """Return the visible text of an HTML body with whitespace collapsed."""
+    if not body or not body.strip():
+        return ""
+    try:
+        document = html.fromstring(body)
+        for element in document.xpath("//head|//style|//script"):
+            element.drop_tree()
+        text = document.text_content()
+    except (etree.ParserError, ValueError):
+        text = body
+    return " ".join(text.split())
+
+
+def truncate_text(text: str, length: int = SNIPPET_LENGTH) -> str:
+    """Cut text longer than ``length`` at a word boundary and add an ellipsis."""
+    if len(text) <= length:
+        return text
+    cut = text[: length - 1]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return f"{cut.rstrip()}…"
+
+
+def make_snippet(body: str | None, length: int = SNIPPET_LENGTH) -> str:
+    """Return the beginning of the visible text of an HTML body."""
+    return truncate_text(html_to_text(body), length)
@@ -1,61 +1,469 @@
+from datetime import datetime
+
 from nanoid import generate
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import case, func, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, defer, joinedload, load_only
 
+from app.core import feed_cache
+from app.core.config import settings
+from app.core.fingerprint import content_hash, hamming_distance, simhash
 from app.core.logging import get_logger
-from app.models.entries import Entry
+from app.core.pagination import Cursor
+from app.core.snippet import html_to_text, truncate_text
+from app.crud.search import index_entries
+from app.models.entries import Entry, EntryDuplicate
+from app.models.newsletters import Newsletter
 from app.schemas.entries import EntryCreate
 
 logger = get_logger(__name__)
 
 
-def get_all_entries(db: Session, skip: int = 0, limit: int | None = None):
-    """Retrieve all entries from all newsletters, sorted by received date."""
-    logger.debug(f"Querying all entries with skip={skip}, limit={limit}")
-    query = (
-        db.query(Entry)
-        .options(joinedload(Entry.newsletter))
-        .order_by(Entry.received_at.desc())
-        .offset(skip)
+def _newest_first(query, before: Cursor | None):
+    """Order a query of entries newest first, starting after a cursor."""
+    if before is not None:
+        query = query.filter(
+            tuple_(Entry.received_at, Entry.id) < (before.received_at, before.id)
+        )
+    return query.order_by(Entry.received_at.desc(), Entry.id.desc())
+
+
+def _fetch(query, batch_size: int | None):
+    """Load all results of a query, or stream them in batches."""
+    if batch_size is not None:
+        return query.yield_per(batch_size)
+    return query.all()
+
+
+def get_all_entries(
+    db: Session,
+    skip: int = 0,
+    limit: int | None = None,
+    before: Cursor | None = None,
+    batch_size: int | None = None,
+):
+    """Retrieve all entries from all newsletters, sorted by received date.
+
+    Pass ``before`` instead of ``skip`` to page through the entries with a
+    keyset cursor, which stays fast for deep pages. Pass ``batch_size`` to get
+    an iterator that fetches the entries from the cursor in batches instead of
+    loading them all at once.
+    """
+    logger.debug(
+        f"Querying all entries with skip={skip}, limit={limit}, before={before}"
     )
+    query = _newest_first(
+        db.query(Entry).options(joinedload(Entry.newsletter)), before
+    ).offset(skip)
     if limit is not None:
         query = query.limit(limit)
-    return query.all()
+    return _fetch(query, batch_size)
 
 
 def get_entries_by_newsletter(
-    db: Session, newsletter_id: str, skip: int = 0, limit: int | None = None
+    db: Session,
+    newsletter_id: str,
+    skip: int = 0,
+    limit: int | None = None,
+    before: Cursor | None = None,
+    batch_size: int | None = None,
 ):
-    """Retrieve entries for a specific newsletter."""
+    """Retrieve entries for a specific newsletter.
+
+    Pass ``before`` instead of ``skip`` to page through the entries with a
+    keyset cursor, which stays fast for deep pages. Pass ``batch_size`` to get
+    an iterator that fetches the entries from the cursor in batches instead of
+    loading them all at once.
+    """
     logger.debug(
-        f"Querying entries for newsletter_id={newsletter_id}, skip={skip}, limit={limit}"
-    )
-    query = (
-        db.query(Entry)
-        .order_by(Entry.received_at.desc())
-        .filter(Entry.newsletter_id == newsletter_id)
-        .offset(skip)
+        f"Querying entries for newsletter_id={newsletter_id}, skip={skip}, limit={limit}, before={before}"
     )
+    query = _newest_first(
+        db.query(Entry).filter(Entry.newsletter_id == newsletter_id), before
+    ).offset(skip)
 
     if limit is not None:
         query = query.limit(limit)
 
+    return _fetch(query, batch_size)
+
+
+def get_entry_summaries(
+    db: Session,
+    newsletter_id: str,
+    skip: int = 0,
+    limit: int | None = None,
+    before: Cursor | None = None,
+):
+    """Retrieve entries of a newsletter for listing, without their bodies."""
+    logger.debug(
+        f"Querying entry summaries for newsletter_id={newsletter_id}, skip={skip}, limit={limit}, before={before}"
+    )
+    query = _newest_first(
+        db.query(Entry)
+        .options(
+            load_only(
+                Entry.id,
+                Entry.newsletter_id,
+                Entry.subject,
+                Entry.snippet,
+                Entry.received_at,
+            )
+        )
+        .filter(Entry.newsletter_id == newsletter_id),
+        before,
+    ).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
     return query.all()
 
 
+def get_entry_cursors(
+    db: Session,
+    newsletter_id: str | None = None,
+    skip: int = 0,
+    limit: int | None = None,
+    before: Cursor | None = None,
+) -> list[Cursor]:
+    """Retrieve the keyset cursors of entries without loading the entries."""
+    query = db.query(Entry.received_at, Entry.id)
+    if newsletter_id is not None:
+        query = query.filter(Entry.newsletter_id == newsletter_id)
+    query = _newest_first(query, before).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [Cursor(received_at, entry_id) for received_at, entry_id in query]
+
+
+def get_entries_stats(
+    db: Session, newsletter_id: str | None = None
+) -> tuple[int, datetime | None]:
+    """Return the number of entries and the newest received date.
+
+    Counts all entries, or only those of a single newsletter if
+    ``newsletter_id`` is given. Reads the counters kept on the newsletters
+    instead of scanning the entries.
+    """
+    logger.debug(f"Querying entry stats for newsletter_id={newsletter_id}")
+    query = db.query(
+        func.coalesce(func.sum(Newsletter.entries_count), 0),
+        func.max(Newsletter.latest_received_at),
+    )
+    if newsletter_id is not None:
+        query = query.filter(Newsletter.id == newsletter_id)
+    count, latest = query.one()
+    return count, latest
+
+
+def _add_to_entry_stats(
+    db: Session, newsletter_id: str, count: int, latest: datetime
+) -> None:
+    """Account for new entries in a newsletter's counters.
+
+    Must be called in the transaction that creates the entries.
+    """
+    db.query(Newsletter).filter(Newsletter.id == newsletter_id).update(
+        {
+            Newsletter.entries_count: Newsletter.entries_count + count,
+            Newsletter.latest_received_at: case(
+                (
+                    Newsletter.latest_received_at.is_(None)
+                    | (Newsletter.latest_received_at < latest),
+                    latest,
+                ),
+                else_=Newsletter.latest_received_at,
+            ),
+        },
+        synchronize_session=False,
+    )
+
+
+def _recount_entry_stats(db: Session, newsletter_id: str) -> None:
+    """Recompute a newsletter's counters from its entries.
+
+    Must be called in the transaction that deletes the entries.
+    """
+    count, latest = (
+        db.query(func.count(Entry.id), func.max(Entry.received_at))
+        .filter(Entry.newsletter_id == newsletter_id)
+        .one()
+    )
+    db.query(Newsletter).filter(Newsletter.id == newsletter_id).update(
+        {Newsletter.entries_count: count, Newsletter.latest_received_at: latest},
+        synchronize_session=False,
+    )
+
+
 def get_entry_by_message_id(db: Session, message_id: str):
     """Retrieve an entry by its message_id."""
     logger.debug(f"Querying for entry with message_id={message_id}")
-    return db.query(Entry).filter(Entry.message_id == message_id).first()
+    return (
+        db.query(Entry)
+        .options(defer(Entry.body))
+        .filter(Entry.message_id == message_id)
+        .first()
+    )
+
+
+def get_existing_message_ids(db: Session, message_ids: list[str]) -> set[str]:
+    """Return the subset of the given message_ids that were already stored.
+
+    This includes emails linked to an existing entry as duplicates.
+    """
+    if not message_ids:
+        return set()
+    logger.debug(f"Querying for entries with {len(message_ids)} message_ids")
+    entries = db.query(Entry.message_id).filter(Entry.message_id.in_(message_ids))
+    duplicates = db.query(EntryDuplicate.message_id).filter(
+        EntryDuplicate.message_id.in_(message_ids)
+    )
+    return {message_id for (message_id,) in entries.union(duplicates)}
+
+
+def _entry_row(entry: EntryCreate, newsletter_id: str) -> tuple[dict, str]:
+    """Build the column values of a new entry.
+
+    Returns the values and the visible text of the body, which the snippet,
+    the fingerprints and the search index are derived from.
+    """
+    text = html_to_text(entry.body)
+    row = {
+        "id": generate(),
+        **entry.model_dump(),
+        "snippet": truncate_text(text),
+        "content_hash": content_hash(f"{entry.subject}\n{text or entry.body}"),
+        "content_simhash": simhash(f"{entry.subject}\n{text}"),
+        "received_at": entry.received_at or datetime.now(),
+        "newsletter_id": newsletter_id,
+    }
+    return row, text
+
+
+def _find_near_duplicates(db: Session, rows: list[dict]) -> dict[str, str]:
+    """Find existing entries that new entries are near-duplicates of.
+
+    Compares the SimHash of each new entry with the most recent entries of its
+    newsletter, if near-duplicate detection is enabled. Emails that were
+    already stored are skipped, and an entry is never a near-duplicate of
+    itself.
+
+    Returns:
+        The id of the existing entry by message_id of the new entry.
+    """
+    distance = settings.dedup_simhash_distance
+    if distance <= 0:
+        return {}
+    stored = get_existing_message_ids(db, [row["message_id"] for row in rows])
+    recent: dict[str, list[tuple[str, str, int]]] = {}
+    matches: dict[str, str] = {}
+    for row in rows:
+        if row["content_simhash"] is None or row["message_id"] in stored:
+            continue
+        newsletter_id = row["newsletter_id"]
+        if newsletter_id not in recent:
+            recent[newsletter_id] = (
+                db.query(Entry.id, Entry.message_id, Entry.content_simhash)
+                .filter(
+                    Entry.newsletter_id == newsletter_id,
+                    Entry.content_simhash.is_not(None),
+                )
+                .order_by(Entry.received_at.desc(), Entry.id.desc())
+                .limit(settings.dedup_simhash_window)
+                .all()
+            )
+        for entry_id, message_id, other in recent[newsletter_id]:
+            if entry_id == row["id"] or message_id == row["message_id"]:
+                continue
+            if hamming_distance(row["content_simhash"], other) <= distance:
+                matches[row["message_id"]] = entry_id
+                break
+    return matches
+
+
+def _link_duplicates(db: Session, rows: list[dict], known: set[str]) -> set[str]:
+    """Link emails that were not inserted to the entry with the same content.
+
+    Emails whose message_id is in ``known`` were already stored and are not
+    linked again.
+
+    Returns:
+        The message_ids of the linked emails.
+    """
+    rows = [row for row in rows if row["message_id"] not in known]
+    if not rows:
+        return set()
+    existing = {
+        (newsletter_id, hash_): entry_id
+        for newsletter_id, hash_, entry_id in db.query(
+            Entry.newsletter_id, Entry.content_hash, Entry.id
+        ).filter(
+            Entry.newsletter_id.in_({row["newsletter_id"] for row in rows}),
+            Entry.content_hash.in_({row["content_hash"] for row in rows}),
+        )
+    }
+    links = [
+        {
+            "message_id": row["message_id"],
+            "entry_id": existing[(row["newsletter_id"], row["content_hash"])],
+            "received_at": row["received_at"],
+        }
+        for row in rows
+        if (row["newsletter_id"], row["content_hash"]) in existing
+    ]
+    return _insert_duplicates(db, links)
+
+
+def _insert_duplicates(db: Session, links: list[dict]) -> set[str]:
+    """Record emails as duplicates of existing entries."""
+    if not links:
+        return set()
+    statement = (
+        insert(EntryDuplicate)
+        .values(links)
+        .on_conflict_do_nothing()
+        .returning(EntryDuplicate.message_id)
+    )
+    return set(db.scalars(statement))
 
 
 def create_entry(db: Session, entry: EntryCreate, newsletter_id: str):
-    """Create a new entry for a newsletter."""
+    """Create a new entry for a newsletter.
+
+    If the newsletter already has an entry with the same content, the email
+    is linked to that entry instead, and the existing entry is returned.
+    """
     logger.info(
         f"Creating new entry for newsletter_id={newsletter_id} with subject '{entry.subject}'"
     )
-    db_entry = Entry(id=generate(), **entry.model_dump(), newsletter_id=newsletter_id)
+    row, text = _entry_row(entry, newsletter_id)
+    duplicate_of = _find_near_duplicates(db, [row]).get(entry.message_id)
+    if duplicate_of is None:
+        duplicate_of = (
+            db.query(Entry.id)
+            .filter(
+                Entry.newsletter_id == newsletter_id,
+                Entry.content_hash == row["content_hash"],
+                Entry.message_id != entry.message_id,
+            )
+            .scalar()
+        )
+    if duplicate_of is not None:
+        _insert_duplicates(
+            db,
+            [
+                {
+                    "message_id": entry.message_id,
+                    "entry_id": duplicate_of,
+                    "received_at": row["received_at"],
+                }
+            ],
+        )
+        db.commit()
+        logger.info(f"Linked email as a duplicate of entry with id={duplicate_of}")
+        return db.get(Entry, duplicate_of)
+
+    db_entry = Entry(**row)
     db.add(db_entry)
+    db.flush()
+    index_entries(db, [(db_entry.id, entry.subject, text)])
+    _add_to_entry_stats(db, newsletter_id, 1, db_entry.received_at)
     db.commit()
     db.refresh(db_entry)
+    feed_cache.invalidate_newsletter(newsletter_id)
     logger.info(f"Successfully created entry with id={db_entry.id}")
     return db_entry
+
+
+def create_entries(db: Session, entries: list[tuple[EntryCreate, str]]) -> set[str]:
+    """Create a batch of entries in a single transaction.
+
+    Entries are given as ``(entry, newsletter_id)`` pairs. Entries whose
+    message_id already exists are skipped. Entries with the same content as an
+    existing entry of their newsletter are linked to it as duplicates instead
+    of being stored again.
+
+    Returns:
+        The message_ids of the entries that were created or linked.
+    """
+    if not entries:
+        return set()
+    logger.info(f"Creating {len(entries)} new entries")
+    rows: list[dict] = []
+    texts: dict[str, str] = {}
+    for entry, newsletter_id in entries:
+        row, text = _entry_row(entry, newsletter_id)
+        rows.append(row)
+        texts[row["id"]] = text
+
+    near_duplicates = _find_near_duplicates(db, rows)
+    linked = _insert_duplicates(
+        db,
+        [
+            {
+                "message_id": row["message_id"],
+                "entry_id": near_duplicates[row["message_id"]],
+                "received_at": row["received_at"],
+            }
+            for row in rows
+            if row["message_id"] in near_duplicates
+        ],
+    )
+    rows_by_id = {
+        row["id"]: row for row in rows if row["message_id"] not in near_duplicates
+    }
+
+    created: set[str] = set()
+    indexed: list[tuple[str, str, str]] = []
+    stats: dict[str, tuple[int, datetime]] = {}
+    if rows_by_id:
+        statement = (
+            insert(Entry)
+            .values(list(rows_by_id.values()))
+            # Skips entries with an existing message_id or content hash.
+            .on_conflict_do_nothing()
+            .returning(Entry.id, Entry.newsletter_id, Entry.received_at)
+        )
+        for entry_id, newsletter_id, received_at in db.execute(statement):
+            row = rows_by_id.pop(entry_id)
+            created.add(row["message_id"])
+            indexed.append((entry_id, row["subject"], texts[entry_id]))
+            count, latest = stats.get(newsletter_id, (0, received_at))
+            stats[newsletter_id] = (count + 1, max(latest, received_at))
+
+    skipped = list(rows_by_id.values())
+    known = get_existing_message_ids(db, [row["message_id"] for row in skipped])
+    linked |= _link_duplicates(db, skipped, known)
+    index_entries(db, indexed)
+    for newsletter_id, (count, latest) in stats.items():
+        _add_to_entry_stats(db, newsletter_id, count, latest)
+    db.commit()
+
+    for newsletter_id in stats:
+        feed_cache.invalidate_newsletter(newsletter_id)
+    logger.info(
+        f"Created {len(created)} entries, linked {len(linked)} duplicates, "
+        f"skipped {len(entries) - len(created) - len(linked)} already processed"
+    )
+    return created | linked
+
+
+def delete_entry(db: Session, entry_id: str):
+    """Delete an entry by its ID."""
+    logger.info(f"Deleting entry with id={entry_id}")
+    db_entry = (
+        db.query(Entry)
+        .options(load_only(Entry.id, Entry.newsletter_id))
+        .filter(Entry.id == entry_id)
+        .first()
+    )
+    if not db_entry:
+        return None
+
+    newsletter_id = db_entry.newsletter_id
+    db.delete(db_entry)
+    db.flush()
+    _recount_entry_stats(db, newsletter_id)
+    db.commit()
+    feed_cache.invalidate_newsletter(newsletter_id)
+    logger.info(f"Successfully deleted entry with id={entry_id}")
+    return db_entry
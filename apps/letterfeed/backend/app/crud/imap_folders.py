@@ -0,0 +1,87 @@
+"""CRUD operations for the processing state of IMAP folders."""
+
+from collections.abc import Collection
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.models.imap_folders import FolderSchedule, ImapFolderState
+
+logger = get_logger(__name__)
+
+
+def get_folder_state(
+    db: Session, imap_username: str, folder: str
+) -> ImapFolderState | None:
+    """Retrieve the processing state of a folder."""
+    logger.debug(f"Querying state of folder '{folder}' for {imap_username}")
+    return (
+        db.query(ImapFolderState)
+        .filter_by(imap_username=imap_username, folder=folder)
+        .first()
+    )
+
+
+def update_folder_state(
+    db: Session, imap_username: str, folder: str, uidvalidity: int, last_uid: int
+) -> ImapFolderState:
+    """Record the UIDVALIDITY and the last processed UID of a folder."""
+    state = get_folder_state(db, imap_username, folder)
+    if state is None:
+        state = ImapFolderState(imap_username=imap_username, folder=folder)
+        db.add(state)
+    state.uidvalidity = uidvalidity
+    state.last_uid = last_uid
+    db.commit()
+    db.refresh(state)
+    logger.debug(f"Folder '{folder}' processed up to uid={last_uid}")
+    return state
+
+
+def reset_folder_states(db: Session, folders: Collection[str]) -> None:
+    """Forget the processing state of folders, forcing a full scan of them.
+
+    Adaptively polled folders are due right away as well, their polling
+    schedule is kept otherwise.
+    """
+    if not folders:
+        return
+    logger.info(f"Resetting the state of IMAP folders {sorted(folders)}")
+    db.query(ImapFolderState).filter(ImapFolderState.folder.in_(folders)).delete()
+    db.query(FolderSchedule).filter(FolderSchedule.folder.in_(folders)).update(
+        {FolderSchedule.next_check_at: datetime.now()}
+    )
+    db.commit()
+
+
+def get_folder_schedules(db: Session, imap_username: str) -> dict[str, FolderSchedule]:
+    """Retrieve the polling schedules of all folders, keyed by folder."""
+    schedules = db.query(FolderSchedule).filter_by(imap_username=imap_username)
+    return {schedule.folder: schedule for schedule in schedules}
+
+
+def record_folder_check(
+    db: Session,
+    imap_username: str,
+    folder: str,
+    checked_at: datetime,
+    interval: int,
+    next_check_at: datetime,
+) -> FolderSchedule:
+    """Record that a folder was checked and when it is checked next."""
+    schedule = (
+        db.query(FolderSchedule)
+        .filter_by(imap_username=imap_username, folder=folder)
+        .first()
+    )
+    if schedule is None:
+        schedule = FolderSchedule(imap_username=imap_username, folder=folder)
+        db.add(schedule)
+    schedule.interval = interval
+    schedule.last_checked_at = checked_at
+    schedule.next_check_at = next_check_at
+    db.commit()
+    db.refresh(schedule)
+    logger.debug(f"Folder '{folder}' is checked next at {next_check_at}")
+    return schedule
@@ -0,0 +1,207 @@
+"""CRUD operations for the queue of emails waiting to be stored as entries."""
+
+from datetime import UTC, datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.ingestion import IngestionTask, Stage, TaskState
+
+logger = get_logger(__name__)
+
+
+class TaskFailure(NamedTuple):
+    """A failed attempt at a stage of a task, with what it had produced so far."""
+
+    task: IngestionTask
+    stage: Stage
+    error: str
+    raw_email: bytes | None = None
+    content: str | None = None
+
+
+def _utcnow() -> datetime:
+    """Return the current time as stored in the database."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Return the backoff before the next attempt after a number of failed ones."""
+    seconds = settings.ingestion_retry_delay * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.ingestion_retry_max_delay))
+
+
+def enqueue_tasks(
+    db: Session,
+    imap_username: str,
+    folder: str,
+    uidvalidity: int,
+    emails: dict[int, tuple[str, str]],
+) -> list[IngestionTask]:
+    """Queue the emails of a folder, given as ``uid -> (sender, message_id)``.
+
+    Emails that are queued already are not queued again.
+
+    Returns:
+        The tasks of the given emails, ordered by UID.
+    """
+    if not emails:
+        return []
+    db.execute(
+        insert(IngestionTask)
+        .values(
+            [
+                {
+                    "imap_username": imap_username,
+                    "folder": folder,
+                    "uidvalidity": uidvalidity,
+                    "uid": uid,
+                    "sender": sender,
+                    "message_id": message_id,
+                    "stage": "fetch",
+                    "state": "pending",
+                    "attempts": 0,
+                }
+                for uid, (sender, message_id) in emails.items()
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    db.commit()
+    logger.debug(f"Queued {len(emails)} emails of folder '{folder}'")
+    return (
+        db.query(IngestionTask)
+        .filter_by(imap_username=imap_username, folder=folder, uidvalidity=uidvalidity)
+        .filter(IngestionTask.uid.in_(emails), IngestionTask.state == "pending")
+        .order_by(IngestionTask.uid)
+        .all()
+    )
+
+
+def get_due_tasks(
+    db: Session, imap_username: str, folder: str, uidvalidity: int
+) -> list[IngestionTask]:
+    """Retrieve the tasks of a folder that are not waiting for their backoff."""
+    return (
+        db.query(IngestionTask)
+        .filter_by(imap_username=imap_username, folder=folder, uidvalidity=uidvalidity)
+        .filter(
+            IngestionTask.state.in_(("pending", "retrying")),
+            or_(
+                IngestionTask.next_attempt_at.is_(None),
+                IngestionTask.next_attempt_at <= _utcnow(),
+            ),
+        )
+        .order_by(IngestionTask.uid)
+        .all()
+    )
+
+
+def delete_stale_tasks(
+    db: Session, imap_username: str, folder: str, uidvalidity: int
+) -> int:
+    """Delete the tasks whose UIDs became invalid, the folder is rescanned anyway.
+
+    Dead tasks are kept, so their emails are not queued again.
+    """
+    deleted = (
+        db.query(IngestionTask)
+        .filter_by(imap_username=imap_username, folder=folder)
+        .filter(IngestionTask.uidvalidity != uidvalidity, IngestionTask.state != "dead")
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    if deleted:
+        logger.info(f"Deleted {deleted} tasks with outdated UIDs of folder '{folder}'")
+    return deleted
+
+
+def get_queued_message_ids(
+    db: Session, imap_username: str, message_ids: list[str]
+) -> set[str]:
+    """Return which of the given message_ids belong to queued emails."""
+    if not message_ids:
+        return set()
+    rows = (
+        db.query(IngestionTask.message_id)
+        .filter(
+            IngestionTask.imap_username == imap_username,
+            IngestionTask.message_id.in_(message_ids),
+        )
+        .all()
+    )
+    return {message_id for (message_id,) in rows}
+
+
+def complete_tasks(db: Session, tasks: list[IngestionTask]) -> None:
+    """Remove tasks from the queue after their emails were stored or skipped."""
+    if not tasks:
+        return
+    db.query(IngestionTask).filter(
+        IngestionTask.id.in_([task.id for task in tasks])
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def fail_tasks(db: Session, failures: list[TaskFailure]) -> None:
+    """Record failed attempts, scheduling retries with exponential backoff.
+
+    Tasks that failed ``LETTERFEED_INGESTION_MAX_ATTEMPTS`` times are dead.
+    """
+    if not failures:
+        return
+    now = _utcnow()
+    for task, stage, error, raw_email, content in failures:
+        task.stage = stage
+        task.attempts += 1
+        task.last_error = error
+        if raw_email is not None:
+            task.raw_email = raw_email
+        if content is not None:
+            task.content = content
+        if task.attempts >= settings.ingestion_max_attempts:
+            task.state = "dead"
+            task.next_attempt_at = None
+            logger.error(
+                f"Giving up on email with uid={task.uid} in folder '{task.folder}' "
+                f"after {task.attempts} attempts, last {stage} failed: {error}"
+            )
+        else:
+            task.state = "retrying"
+            task.next_attempt_at = now + retry_delay(task.attempts)
+            logger.warning(
+                f"Failed to {stage} email with uid={task.uid} in folder "
+                f"'{task.folder}' (attempt {task.attempts}), retrying after "
+                f"{task.next_attempt_at:%Y-%m-%d %H:%M:%S} UTC: {error}"
+            )
+    db.commit()
+
+
+def get_ingestion_tasks(
+    db: Session, states: tuple[TaskState, ...] = ("retrying", "dead")
+) -> list[IngestionTask]:
+    """Retrieve the tasks in the given states, oldest first."""
+    return (
+        db.query(IngestionTask)
+        .filter(IngestionTask.state.in_(states))
+        .order_by(IngestionTask.id)
+        .all()
+    )
+
+
+def retry_task(db: Session, task_id: int) -> IngestionTask | None:
+    """Queue a task for the next check of its folder, resetting its attempts."""
+    task = db.get(IngestionTask, task_id)
+    if task is None:
+        return None
+    task.state = "pending"
+    task.attempts = 0
+    task.next_attempt_at = None
+    db.commit()
+    db.refresh(task)
+    logger.info(f"Queued task with id={task_id} for another attempt")
+    return task
@@ -1,9 +1,12 @@
 from nanoid import generate
-from sqlalchemy import func, or_
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
+from app.core import feed_cache
 from app.core.logging import get_logger
-from app.models.entries import Entry
+from app.core.sender_routing import sender_routing
+from app.crud.imap_folders import reset_folder_states
+from app.crud.settings import get_settings
 from app.models.newsletters import Newsletter, Sender
 from app.schemas.newsletters import NewsletterCreate, NewsletterUpdate
 
@@ -13,18 +16,11 @@ logger = get_logger(__name__)
 def get_newsletter_by_identifier(db: Session, identifier: str):
     """Retrieve a single newsletter by its ID or slug."""
     logger.debug(f"Querying for newsletter with identifier={identifier}")
-    result = (
-        db.query(Newsletter, func.count(Entry.id))
-        .outerjoin(Entry, Newsletter.id == Entry.newsletter_id)
+    return (
+        db.query(Newsletter)
         .filter(or_(Newsletter.id == identifier, Newsletter.slug == identifier))
-        .group_by(Newsletter.id)
         .first()
     )
-    if result:
-        newsletter, count = result
-        newsletter.entries_count = count
-        return newsletter
-    return None
 
 
 def get_newsletter_by_slug(db: Session, slug: str):
@@ -32,29 +28,42 @@ def get_newsletter_by_slug(db: Session, slug: str):
     return db.query(Newsletter).filter(Newsletter.slug == slug).first()
 
 
+def get_newsletter_names(db: Session) -> list[tuple[str, str]]:
+    """Retrieve the id and name of all newsletters, ordered by id."""
+    return [
+        (newsletter_id, name)
+        for newsletter_id, name in db.query(Newsletter.id, Newsletter.name)
+        .order_by(Newsletter.id)
+        .all()
+    ]
+
+
 def get_newsletters(db: Session, skip: int = 0, limit: int = 100):
     """Retrieve a list of newsletters."""
     logger.debug(f"Querying for newsletters with skip={skip}, limit={limit}")
-    results = (
-        db.query(Newsletter, func.count(Entry.id))
-        .outerjoin(Entry, Newsletter.id == Entry.newsletter_id)
-        .group_by(Newsletter.id)
-        .order_by(Newsletter.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    return db.query(Newsletter).order_by(Newsletter.id).offset(skip).limit(limit).all()
+
 
-    newsletters_with_count = []
-    for newsletter, count in results:
-        newsletter.entries_count = count
-        newsletters_with_count.append(newsletter)
+def _search_folder(db: Session, search_folder: str | None) -> str | None:
+    """Return the folder a newsletter's emails are searched in.
+
+    Returns None if no settings exist yet, so no folder was checked either.
+    """
+    if search_folder:
+        return search_folder
+    try:
+        return get_settings(db).search_folder
+    except RuntimeError:
+        return None
 
-    return newsletters_with_count
 
+def create_newsletter(db: Session, newsletter: NewsletterCreate, rescan: bool = True):
+    """Create a new newsletter.
 
-def create_newsletter(db: Session, newsletter: NewsletterCreate):
-    """Create a new newsletter."""
+    Unless ``rescan`` is False, its folder is scanned fully on the next check,
+    to pick up already seen emails of its senders. Newsletters added while
+    processing emails pass False, their folder accepts all senders anyway.
+    """
     logger.info(f"Creating new newsletter with name '{newsletter.name}'")
 
     if newsletter.slug and get_newsletter_by_slug(db, newsletter.slug):
@@ -78,9 +87,12 @@ def create_newsletter(db: Session, newsletter: NewsletterCreate):
 
     db.commit()
     db.refresh(db_newsletter)
+    sender_routing.invalidate()
+    if rescan:
+        folder = _search_folder(db, db_newsletter.search_folder)
+        reset_folder_states(db, {folder} if folder else set())
 
     logger.info(f"Successfully created newsletter with id={db_newsletter.id}")
-    db_newsletter.entries_count = 0
     return db_newsletter
 
 
@@ -98,6 +110,7 @@ def update_newsletter(
         if existing_newsletter and existing_newsletter.id != newsletter_id:
             return "conflict"  # Indicates a conflict
 
+    old_folder = _search_folder(db, db_newsletter.search_folder)
     update_data = newsletter_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         if key == "sender_emails":
@@ -123,6 +136,13 @@ def update_newsletter(
 
     db.commit()
     db.refresh(db_newsletter)
+    feed_cache.invalidate_newsletter(newsletter_id)
+    sender_routing.invalidate()
+    # Already seen emails of added senders, or in a new folder, are picked up
+    # by a full scan of the folder.
+    folder = _search_folder(db, db_newsletter.search_folder)
+    if folder and (new_emails - existing_emails or folder != old_folder):
+        reset_folder_states(db, {folder})
 
     logger.info(f"Successfully updated newsletter with id={db_newsletter.id}")
     return get_newsletter_by_identifier(db, newsletter_id)
@@ -137,5 +157,7 @@ def delete_newsletter(db: Session, newsletter_id: str):
 
     db.delete(db_newsletter)
     db.commit()
+    feed_cache.invalidate_newsletter(db_newsletter.id)
+    sender_routing.invalidate()
     logger.info(f"Successfully deleted newsletter with id={newsletter_id}")
     return db_newsletter
@@ -0,0 +1,114 @@
+import re
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.core.pagination import SearchCursor
+from app.models import search  # noqa: F401, registers the search index DDL
+
+logger = get_logger(__name__)
+
+_TERM_PATTERN = re.compile(r"\w+")
+# Matches in the subject and newsletter name weigh more than in the body.
+_SCORE = "bm25(entries_fts, 10.0, 1.0, 5.0)"
+_SNIPPET_TOKENS = 24
+
+_ADD_KEY = text("INSERT INTO entries_fts_keys (entry_id) VALUES (:entry_id)")
+_INDEX_ENTRY = text(
+    """
+    INSERT INTO entries_fts (rowid, subject, body, newsletter_name)
+    SELECT entries_fts_keys.id, :subject, :body, newsletters.name
+    FROM entries_fts_keys
+    JOIN entries ON entries.id = entries_fts_keys.entry_id
+    JOIN newsletters ON newsletters.id = entries.newsletter_id
+    WHERE entries_fts_keys.entry_id = :entry_id
+    """
+)
+
+_SEARCH = f"""
+    SELECT entries.id, entries.newsletter_id, newsletters.name AS newsletter_name,
+        entries.subject, entries.received_at, entries_fts.rowid AS fts_rowid,
+        {_SCORE} AS score
+    FROM entries_fts
+    JOIN entries_fts_keys ON entries_fts_keys.id = entries_fts.rowid
+    JOIN entries ON entries.id = entries_fts_keys.entry_id
+    JOIN newsletters ON newsletters.id = entries.newsletter_id
+    WHERE entries_fts MATCH :query {{after}}
+    ORDER BY score, entries.id
+    LIMIT :limit
+"""
+
+_SNIPPETS = text(
+    f"""
+    SELECT rowid, snippet(entries_fts, -1, '', '', '…', {_SNIPPET_TOKENS})
+    FROM entries_fts
+    WHERE entries_fts MATCH :query AND rowid IN :rowids
+    """
+).bindparams(bindparam("rowids", expanding=True))
+
+
+def index_entries(db: Session, entries: list[tuple[str, str, str]]) -> None:
+    """Add entries to the search index.
+
+    Entries are given as ``(entry_id, subject, text)`` tuples, where ``text``
+    is the visible text of the body. Must be called in the transaction that
+    creates the entries.
+    """
+    if not entries:
+        return
+    db.execute(_ADD_KEY, [{"entry_id": entry_id} for entry_id, _, _ in entries])
+    db.execute(
+        _INDEX_ENTRY,
+        [
+            {"entry_id": entry_id, "subject": subject, "body": text}
+            for entry_id, subject, text in entries
+        ],
+    )
+
+
+def to_match_query(query: str) -> str | None:
+    """Turn a user's search into an FTS5 query matching all of its words.
+
+    The last word also matches as a prefix. Returns None if there are no words.
+    """
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def search_entries(
+    db: Session, query: str, limit: int = 20, after: SearchCursor | None = None
+) -> list[dict]:
+    """Search entries by subject, body and newsletter name, best matches first.
+
+    Pass the cursor of the last result as ``after`` to fetch the next results.
+
+    Returns:
+        The matching entries with their score and a snippet of the matching text.
+    """
+    match_query = to_match_query(query)
+    if match_query is None:
+        return []
+    logger.debug(f"Searching entries for {match_query!r}, limit={limit}, after={after}")
+    params = {"query": match_query, "limit": limit}
+    after_clause = ""
+    if after is not None:
+        after_clause = f"AND ({_SCORE}, entries.id) > (:after_score, :after_id)"
+        params.update(after_score=after.score, after_id=after.id)
+    statement = text(_SEARCH.format(after=after_clause)).columns(
+        received_at=DateTime(timezone=True)
+    )
+    rows = db.execute(statement, params).mappings().all()
+    if not rows:
+        return []
+
+    # Snippets are only built for the returned page, not for every match.
+    snippets = dict(
+        db.execute(
+            _SNIPPETS,
+            {"query": match_query, "rowids": [row["fts_rowid"] for row in rows]},
+        ).all()
+    )
+    return [{**row, "snippet": snippets.get(row["fts_rowid"], "")} for row in rows]
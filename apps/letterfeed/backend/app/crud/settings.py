@@ -1,5 +1,8 @@
+import threading
+
 from sqlalchemy.orm import Session
 
+from app.core import settings_cache
 from app.core.config import settings as env_settings
 from app.core.hashing import get_password_hash
 from app.core.logging import get_logger
@@ -9,6 +12,10 @@ from app.schemas.settings import SettingsCreate
 
 logger = get_logger(__name__)
 
+_schemas_lock = threading.Lock()
+# with_password -> (snapshot version, merged settings)
+_schemas: dict[bool, tuple[int, SettingsSchema]] = {}
+
 
 def create_initial_settings(db: Session):
     """Create initial settings in the database if they don't exist."""
@@ -36,29 +43,48 @@ def create_initial_settings(db: Session):
         db.add(db_settings)
         db.commit()
         db.refresh(db_settings)
+        settings_cache.invalidate()
         logger.info("Default settings created from environment variables.")
 
 
 def get_settings(db: Session, with_password: bool = False) -> SettingsSchema:
-    """Retrieve application settings, prioritizing environment variables over database."""
-    logger.debug("Querying for settings")
-    db_settings = db.query(SettingsModel).first()
+    """Retrieve application settings, prioritizing environment variables over database.
 
-    if not db_settings:
+    The merged settings are cached per snapshot of the settings row, so
+    repeated calls neither query the database nor re-validate.
+    """
+    snapshot = settings_cache.get_settings_snapshot(db)
+    if snapshot is None:
         # This should not happen if create_initial_settings is called at startup.
         raise RuntimeError("Settings not initialized.")
 
+    with _schemas_lock:
+        cached = _schemas.get(with_password)
+    if cached is not None:
+        version, settings_schema = cached
+        if version == snapshot.version:
+            return settings_schema.model_copy()
+
+    settings_schema = _merge_settings(snapshot.values, with_password)
+    with _schemas_lock:
+        _schemas[with_password] = (snapshot.version, settings_schema)
+    return settings_schema.model_copy()
+
+
+def _merge_settings(db_values: dict, with_password: bool) -> SettingsSchema:
+    """Merge the settings row with the settings locked by environment variables."""
+    logger.debug("Merging settings")
     # Build dictionary from DB model attributes, handling possible None values
     db_data = {
-        "id": db_settings.id,
-        "imap_server": db_settings.imap_server or "",
-        "imap_username": db_settings.imap_username or "",
-        "search_folder": db_settings.search_folder,
-        "move_to_folder": db_settings.move_to_folder,
-        "mark_as_read": db_settings.mark_as_read,
-        "email_check_interval": db_settings.email_check_interval,
-        "auto_add_new_senders": db_settings.auto_add_new_senders,
-        "auth_username": db_settings.auth_username,
+        "id": db_values["id"],
+        "imap_server": db_values["imap_server"] or "",
+        "imap_username": db_values["imap_username"] or "",
+        "search_folder": db_values["search_folder"],
+        "move_to_folder": db_values["move_to_folder"],
+        "mark_as_read": db_values["mark_as_read"],
+        "email_check_interval": db_values["email_check_interval"],
+        "auto_add_new_senders": db_values["auto_add_new_senders"],
+        "auth_username": db_values["auth_username"],
     }
 
     # Get all environment settings that were explicitly set.
@@ -77,7 +103,7 @@ def get_settings(db: Session, with_password: bool = False) -> SettingsSchema:
         if "imap_password" in locked_fields:
             merged_data["imap_password"] = env_settings.imap_password
         else:
-            merged_data["imap_password"] = db_settings.imap_password
+            merged_data["imap_password"] = db_values["imap_password"]
     elif "imap_password" in merged_data:
         # Ensure password is not in the data if not requested
         del merged_data["imap_password"]
@@ -121,6 +147,7 @@ def create_or_update_settings(db: Session, settings: SettingsCreate):
 
     db.commit()
     db.refresh(db_settings)
+    settings_cache.invalidate()
     logger.info("Successfully updated settings.")
 
     # Return the updated settings including locked fields for a complete view
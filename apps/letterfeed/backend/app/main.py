@@ -6,10 +6,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.core.auth import protected_route
 from app.core.config import settings
 from app.core.database import Base, SessionLocal, engine
+from app.core.imap import imap_sessions
 from app.core.logging import get_logger, setup_logging
-from app.core.scheduler import scheduler, start_scheduler_with_interval
+from app.core.scheduler import (
+    release_leadership,
+    scheduler,
+    start_scheduler_with_interval,
+)
 from app.crud.settings import create_initial_settings
-from app.routers import auth, feeds, health, imap, newsletters, oauth2
+from app.routers import auth, entries, feeds, health, imap, newsletters, oauth2
+from app.services.email_processor import shutdown_extraction_executor
+from app.services.imap_idle import idle_manager
 
 
 @asynccontextmanager
@@ -25,11 +32,18 @@ async def lifespan(app: FastAPI):
     with SessionLocal() as db:
         create_initial_settings(db)
 
-    start_scheduler_with_interval()
+    if settings.ingestion_mode == "embedded":
+        start_scheduler_with_interval()
+    else:
+        logger.info("Emails are checked by a separate worker process")
     yield
     if scheduler.running:
         logger.info("Shutting down scheduler...")
         scheduler.shutdown()
+        release_leadership()
+    idle_manager.stop()
+    await imap_sessions.close_all()
+    shutdown_extraction_executor()
     logger.info("...Letterfeed backend shut down.")
 
 
@@ -58,4 +72,5 @@ app.include_router(auth.router)
 app.include_router(oauth2.router)
 app.include_router(imap.router, dependencies=[Depends(protected_route)])
 app.include_router(newsletters.router, dependencies=[Depends(protected_route)])
+app.include_router(entries.router, dependencies=[Depends(protected_route)])
 app.include_router(feeds.router)
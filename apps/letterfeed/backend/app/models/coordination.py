@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Float, Integer, String
+
+from app.core.database import Base
+
+
+class LeaderLock(Base):
+    """A lease that at most one process holds at a time, e.g. to run ingestion."""
+
+    __tablename__ = "leader_locks"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    # Unix timestamp after which another process may take over the lease
+    expires_at = Column(Float, nullable=False)
+
+
+class CacheInvalidation(Base):
+    """Records that data cached in memory changed, for the other processes."""
+
+    __tablename__ = "cache_invalidations"
+
+    id = Column(Integer, primary_key=True)
+    # Which cache is affected, e.g. "feed"
+    kind = Column(String, nullable=False)
+    # The affected item, e.g. a newsletter id, empty for the whole cache
+    key = Column(String, nullable=False, default="")
+    # The process that made the change and already updated its own cache
+    origin = Column(String, nullable=False)
+    created_at = Column(Float, nullable=False)
@@ -1,8 +1,9 @@
 import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, String
 from sqlalchemy.orm import relationship
 
+from app.core.compression import CompressedText
 from app.core.database import Base
 
 
@@ -14,8 +15,49 @@ class Entry(Base):
     id = Column(String, primary_key=True, index=True)
     newsletter_id = Column(String, ForeignKey("newsletters.id"))
     subject = Column(String)
-    body = Column(Text)
+    body = Column(CompressedText)
+    # Plain-text beginning of the body, for listings that do not load bodies
+    snippet = Column(String, nullable=False, server_default="")
     received_at = Column(DateTime(timezone=True), default=datetime.datetime.now)
     message_id = Column(String, unique=True, index=True, nullable=False)
+    # Hash of the normalized content, to recognize resent newsletters
+    content_hash = Column(String, nullable=True)
+    # SimHash of the text, to recognize near-duplicates
+    content_simhash = Column(BigInteger, nullable=True)
 
     newsletter = relationship("Newsletter", back_populates="entries")
+    duplicates = relationship(
+        "EntryDuplicate", back_populates="entry", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        # Serve newest-first listings and keyset pages without sorting.
+        Index(
+            "ix_entries_newsletter_id_received_at",
+            newsletter_id,
+            received_at.desc(),
+            id.desc(),
+        ),
+        Index("ix_entries_received_at", received_at.desc(), id.desc()),
+        Index(
+            "ix_entries_newsletter_id_content_hash",
+            newsletter_id,
+            content_hash,
+            unique=True,
+        ),
+    )
+
+
+class EntryDuplicate(Base):
+    """An email whose content was already stored as an entry.
+
+    Duplicates are linked to the existing entry instead of being stored again.
+    """
+
+    __tablename__ = "entry_duplicates"
+
+    message_id = Column(String, primary_key=True)
+    entry_id = Column(String, ForeignKey("entries.id"), nullable=False, index=True)
+    received_at = Column(DateTime(timezone=True), default=datetime.datetime.now)
+
+    entry = relationship("Entry", back_populates="duplicates")
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint, func
+
+from app.core.database import Base
+
+
+class ImapFolderState(Base):
+    """Tracks how far the emails of an IMAP folder have been processed."""
+
+    __tablename__ = "imap_folder_states"
+    __table_args__ = (UniqueConstraint("imap_username", "folder"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    imap_username = Column(String, nullable=False)
+    folder = Column(String, nullable=False)
+    # UIDs are only comparable as long as the folder's UIDVALIDITY is unchanged
+    uidvalidity = Column(Integer, nullable=False)
+    last_uid = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class FolderSchedule(Base):
+    """Tracks when a folder is checked next, if polling adapts to its newsletters."""
+
+    __tablename__ = "folder_schedules"
+    __table_args__ = (UniqueConstraint("imap_username", "folder"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    imap_username = Column(String, nullable=False)
+    folder = Column(String, nullable=False)
+    # Seconds between checks, as planned at the last check
+    interval = Column(Integer, nullable=False)
+    last_checked_at = Column(DateTime, nullable=False)
+    next_check_at = Column(DateTime, nullable=False)
@@ -0,0 +1,49 @@
+from typing import Literal
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+)
+
+from app.core.database import Base
+
+# The stage a task continues with: downloading the email, extracting its
+# content, or storing the entry and flagging the email
+Stage = Literal["fetch", "extract", "store"]
+# pending tasks run on the next check of their folder, retrying tasks once
+# their backoff expired, dead tasks gave up until they are retried manually
+TaskState = Literal["pending", "retrying", "dead"]
+
+
+class IngestionTask(Base):
+    """An email found in an IMAP folder that has not been stored yet."""
+
+    __tablename__ = "ingestion_tasks"
+    __table_args__ = (
+        UniqueConstraint("imap_username", "folder", "uidvalidity", "uid"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    imap_username = Column(String, nullable=False)
+    folder = Column(String, nullable=False)
+    # UIDs are only valid as long as the folder's UIDVALIDITY is unchanged
+    uidvalidity = Column(Integer, nullable=False)
+    uid = Column(Integer, nullable=False)
+    message_id = Column(String, nullable=False, index=True)
+    sender = Column(String, nullable=False)
+    stage = Column(String, nullable=False, default="fetch")
+    state = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    # Kept after a failed attempt, so a retry continues where it failed
+    raw_email = Column(LargeBinary, nullable=True)
+    content = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
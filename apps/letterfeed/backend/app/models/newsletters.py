@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -16,6 +16,9 @@ class Newsletter(Base):
     move_to_folder = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     extract_content = Column(Boolean, default=False)
+    # Maintained by the entry CRUD functions, so listings need no aggregation
+    entries_count = Column(Integer, nullable=False, default=0, server_default="0")
+    latest_received_at = Column(DateTime(timezone=True), nullable=True)
 
     senders = relationship(
         "Sender", back_populates="newsletter", cascade="all, delete-orphan"
@@ -0,0 +1,47 @@
+"""Full-text search index over entries (SQLite FTS5).
+
+The index holds the subject, the visible text of the body and the newsletter
+name of each entry. Entries have string ids, so each indexed entry gets an
+integer key in ``entries_fts_keys``, which is the rowid of its index row. Unlike
+the rowids of ``entries``, these keys survive VACUUM and table rebuilds. Rows
+are added by the entry CRUD functions, as bodies may be stored compressed.
+Triggers drop the rows of deleted entries and follow renamed newsletters.
+"""
+
+from sqlalchemy import DDL, event
+
+from app.core.database import Base
+
+CREATE_STATEMENTS = (
+    "CREATE TABLE IF NOT EXISTS entries_fts_keys ("
+    "id INTEGER PRIMARY KEY, entry_id VARCHAR NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+    "subject, body, newsletter_name, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries "
+    "BEGIN "
+    "DELETE FROM entries_fts WHERE rowid = "
+    "(SELECT id FROM entries_fts_keys WHERE entry_id = old.id); "
+    "DELETE FROM entries_fts_keys WHERE entry_id = old.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS entries_fts_rename "
+    "AFTER UPDATE OF name ON newsletters BEGIN "
+    "UPDATE entries_fts SET newsletter_name = new.name WHERE rowid IN "
+    "(SELECT entries_fts_keys.id FROM entries_fts_keys "
+    "JOIN entries ON entries.id = entries_fts_keys.entry_id "
+    "WHERE entries.newsletter_id = new.id); END",
+)
+DROP_STATEMENTS = (
+    "DROP TRIGGER IF EXISTS entries_fts_rename",
+    "DROP TRIGGER IF EXISTS entries_fts_delete",
+    "DROP TABLE IF EXISTS entries_fts",
+    "DROP TABLE IF EXISTS entries_fts_keys",
+)
+
+for statement in CREATE_STATEMENTS:
+    event.listen(
+        Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+for statement in DROP_STATEMENTS:
+    event.listen(
+        Base.metadata, "before_drop", DDL(statement).execute_if(dialect="sqlite")
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, func
 
 from app.core.database import Base
 
@@ -31,7 +31,5 @@ class GmailOAuth2Credential(Base):
     encrypted_access_token = Column(Text)  # Encrypted access token
     encrypted_refresh_token = Column(Text)  # Encrypted refresh token
     token_expiry = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, server_default="CURRENT_TIMESTAMP")
-    updated_at = Column(
-        DateTime, server_default="CURRENT_TIMESTAMP", onupdate="CURRENT_TIMESTAMP"
-    )
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.database import get_read_db
+from app.core.logging import get_logger
+from app.core.pagination import SearchCursor, parse_search_cursor
+from app.crud.search import search_entries, to_match_query
+from app.schemas.entries import EntrySearchResult, EntrySearchResults
+
+logger = get_logger(__name__)
+router = APIRouter()
+
+
+def _search(
+    db: Session, q: str, limit: int, after: SearchCursor | None
+) -> EntrySearchResults:
+    """Search entries and build the cursor of the next page."""
+    rows = search_entries(db, q, limit=limit + 1, after=after)
+    results = [EntrySearchResult.model_validate(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = str(SearchCursor(last.score, last.id))
+    return EntrySearchResults(results=results, next_cursor=next_cursor)
+
+
+@router.get("/entries/search", response_model=EntrySearchResults)
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    after: str | None = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """Search entries by subject, text and newsletter name, best matches first.
+
+    Pass the ``next_cursor`` of a page as ``after`` to fetch the next page.
+    """
+    logger.info(f"Request to search entries for q={q!r}, limit={limit}, after={after}")
+    if to_match_query(q) is None:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    try:
+        cursor = parse_search_cursor(after) if after is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _search(db, q, limit, cursor)
@@ -1,36 +1,255 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
+import zlib
+from datetime import UTC
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.core.database import get_db
+from app.core import cache_sync
+from app.core.config import settings
+from app.core.database import ReadSessionLocal, get_async_read_db
 from app.core.logging import get_logger
-from app.services.feed_generator import generate_feed, generate_master_feed
+from app.core.pagination import Cursor, parse_cursor
+from app.crud.newsletters import get_newsletter_by_identifier
+from app.services.feed_generator import (
+    MASTER_FEED_KEY,
+    FeedVersion,
+    get_cached_feed,
+    get_feed_version,
+    get_master_feed_version,
+    render_feed,
+    render_master_feed,
+    stream_feed,
+    stream_master_feed,
+)
 
 logger = get_logger(__name__)
 router = APIRouter()
 
 
-@router.get("/feeds/all")
-def get_master_feed(db: Session = Depends(get_db)):
-    """Generate a master Atom feed for all newsletters."""
-    logger.info("Generating master feed for all newsletters")
-    feed = generate_master_feed(db)
-    logger.info("Successfully generated master feed")
-    return Response(content=feed, media_type="application/atom+xml")
+def _cache_headers(version: FeedVersion) -> dict[str, str]:
+    """Build the validator headers for a feed response."""
+    headers = {"ETag": version.etag, "Cache-Control": "no-cache"}
+    if version.last_modified:
+        headers["Last-Modified"] = format_datetime(
+            version.last_modified.astimezone(UTC), usegmt=True
+        )
+    return headers
 
 
-@router.get("/feeds/{feed_identifier}")
-def get_newsletter_feed(feed_identifier: str, db: Session = Depends(get_db)):
-    """Generate an Atom feed for a specific newsletter."""
-    logger.info(f"Generating feed for newsletter with identifier={feed_identifier}")
-    feed = generate_feed(db, feed_identifier)
-    if not feed:
+def _is_not_modified(request: Request, version: FeedVersion) -> bool:
+    """Check the request's conditional headers against the feed version.
+
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in etags or version.etag in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and version.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return version.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _check_page(version: FeedVersion) -> None:
+    """Reject requests for pages beyond the end of the feed."""
+    if version.page > version.last_page:
+        raise HTTPException(status_code=404, detail="Feed page not found")
+
+
+def _parse_before(before: str | None) -> Cursor | None:
+    """Parse the ``before`` query parameter of a feed request."""
+    if before is None:
+        return None
+    try:
+        return parse_cursor(before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _feed_response(request: Request, version: FeedVersion, feed: bytes) -> Response:
+    """Build a feed response, or a 304 if the client's copy is current."""
+    if _is_not_modified(request, version):
+        return Response(status_code=304, headers=_cache_headers(version))
+    return Response(
+        content=feed,
+        media_type="application/atom+xml",
+        headers=_cache_headers(version),
+    )
+
+
+def _accepts_gzip(request: Request) -> bool:
+    """Check whether the client accepts gzip-encoded responses."""
+    accept_encoding = request.headers.get("accept-encoding", "")
+    return any(
+        coding.split(";")[0].strip() == "gzip" for coding in accept_encoding.split(",")
+    )
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Gzip-compress a stream of chunks."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _streaming_feed_response(
+    request: Request, version: FeedVersion, chunks: Iterator[bytes]
+) -> StreamingResponse:
+    """Build a feed response that is serialized while it is sent."""
+    headers = _cache_headers(version)
+    if settings.feed_gzip:
+        headers["Vary"] = "Accept-Encoding"
+        if _accepts_gzip(request):
+            headers["Content-Encoding"] = "gzip"
+            chunks = _gzip(chunks)
+    return StreamingResponse(chunks, media_type="application/atom+xml", headers=headers)
+
+
+def _master_feed_version(db: Session, page: int, cursor: Cursor | None) -> FeedVersion:
+    """Look up the version of a master feed page, a few cheap queries."""
+    version = get_master_feed_version(db, page, cursor)
+    _check_page(version)
+    return version
+
+
+def _newsletter_feed_version(
+    db: Session, feed_identifier: str, page: int, cursor: Cursor | None
+) -> tuple[str, FeedVersion]:
+    """Look up a newsletter and the version of a page of its feed.
+
+    Returns:
+        The id of the newsletter and the version.
+    """
+    newsletter = get_newsletter_by_identifier(db, feed_identifier)
+    if not newsletter:
         logger.warning(
             f"Newsletter with identifier={feed_identifier} not found, cannot generate feed."
         )
         raise HTTPException(status_code=404, detail="Newsletter not found")
+    version = get_feed_version(db, newsletter, page, cursor)
+    _check_page(version)
+    return newsletter.id, version
 
+
+def _render_master_feed(version: FeedVersion, cursor: Cursor | None) -> bytes:
+    """Render a master feed page on a worker thread, with its own session."""
+    with ReadSessionLocal() as db:
+        return render_master_feed(db, version, cursor)
+
+
+def _render_newsletter_feed(
+    newsletter_id: str, version: FeedVersion, cursor: Cursor | None
+) -> bytes:
+    """Render a newsletter feed page on a worker thread, with its own session."""
+    with ReadSessionLocal() as db:
+        newsletter = get_newsletter_by_identifier(db, newsletter_id)
+        if not newsletter:
+            raise HTTPException(status_code=404, detail="Newsletter not found")
+        return render_feed(db, newsletter, version, cursor)
+
+
+@router.get("/feeds/all")
+async def get_master_feed(
+    request: Request,
+    page: int = Query(1, ge=1),
+    before: str | None = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Generate a master Atom feed for all newsletters.
+
+    Older entries can be paged through by number (``page``) or with a keyset
+    cursor (``before=<received_at>,<id>``).
+    """
+    cursor = _parse_before(before)
+    if cursor is None:
+        await cache_sync.poll_async()
+        cached = get_cached_feed(MASTER_FEED_KEY, page)
+        if cached is not None:
+            logger.debug(f"Serving cached master feed, page={page}")
+            return _feed_response(request, cached.version, cached.xml)
+    else:
+        page = 1
+
+    logger.info(
+        f"Generating master feed for all newsletters, page={page}, before={before}"
+    )
+    version = await db.run_sync(_master_feed_version, page, cursor)
+    if _is_not_modified(request, version):
+        logger.info("Master feed not modified")
+        return Response(status_code=304, headers=_cache_headers(version))
+
+    if settings.feed_streaming:
+        logger.info("Streaming master feed")
+        return _streaming_feed_response(
+            request, version, stream_master_feed(version, cursor)
+        )
+
+    # Rendering is CPU-bound, it must not block the event loop.
+    feed = await run_in_threadpool(_render_master_feed, version, cursor)
+    logger.info("Successfully generated master feed")
+    return _feed_response(request, version, feed)
+
+
+@router.get("/feeds/{feed_identifier}")
+async def get_newsletter_feed(
+    request: Request,
+    feed_identifier: str,
+    page: int = Query(1, ge=1),
+    before: str | None = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Generate an Atom feed for a specific newsletter.
+
+    Older entries can be paged through by number (``page``) or with a keyset
+    cursor (``before=<received_at>,<id>``).
+    """
+    cursor = _parse_before(before)
+    if cursor is None:
+        await cache_sync.poll_async()
+        cached = get_cached_feed(feed_identifier, page)
+        if cached is not None:
+            logger.debug(
+                f"Serving cached feed for identifier={feed_identifier}, page={page}"
+            )
+            return _feed_response(request, cached.version, cached.xml)
+    else:
+        page = 1
+
+    logger.info(
+        f"Generating feed for newsletter with identifier={feed_identifier}, page={page}, before={before}"
+    )
+    newsletter_id, version = await db.run_sync(
+        _newsletter_feed_version, feed_identifier, page, cursor
+    )
+    if _is_not_modified(request, version):
+        logger.info(f"Feed for identifier={feed_identifier} not modified")
+        return Response(status_code=304, headers=_cache_headers(version))
+
+    if settings.feed_streaming:
+        logger.info(f"Streaming feed for identifier={feed_identifier}")
+        return _streaming_feed_response(
+            request, version, stream_feed(newsletter_id, version, cursor)
+        )
+
+    # Rendering is CPU-bound, it must not block the event loop.
+    feed = await run_in_threadpool(
+        _render_newsletter_feed, newsletter_id, version, cursor
+    )
     logger.info(
         f"Successfully generated feed for newsletter with identifier={feed_identifier}"
     )
-    return Response(content=feed, media_type="application/atom+xml")
+    return _feed_response(request, version, feed)
@@ -3,16 +3,18 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
-from app.core.imap import _test_imap_connection, get_folders
+from app.core.database import SessionLocal, get_db
+from app.core.imap import _test_imap_connection, get_folders, run_in_imap_executor
+from app.core.imap_client import ImapCredentials
 from app.core.logging import get_logger
+from app.core.scheduler import request_check
+from app.crud.ingestion_tasks import get_ingestion_tasks, retry_task
 from app.crud.settings import create_or_update_settings, get_settings
+from app.schemas.ingestion import IngestionTask
+from app.schemas.polling import FolderSchedule
 from app.schemas.settings import Settings, SettingsCreate
-from app.services.email_processor import process_emails
-from app.crud.oauth2 import get_oauth2_credential, get_decrypted_credential
-from app.services.oauth2 import is_token_expired, refresh_access_token
-from app.core.config import settings as app_settings
-import json as _json
+from app.services.imap_auth import ImapAuthError, get_imap_credentials
+from app.services.polling import plan_folders
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -36,43 +38,29 @@ def update_settings(settings: SettingsCreate, db: Session = Depends(get_db)):
     return create_or_update_settings(db=db, settings=settings)
 
 
+def _get_credentials() -> ImapCredentials:
+    """Resolve the credentials of the configured IMAP server, blocking.
+
+    Opens its own session, as it runs on an IMAP thread.
+    """
+    with SessionLocal() as db:
+        settings = get_settings(db, with_password=True)
+        if not settings:
+            logger.error("IMAP settings not found")
+            raise HTTPException(status_code=404, detail="IMAP settings not found")
+        try:
+            return get_imap_credentials(db, settings)
+        except ImapAuthError as e:
+            logger.error(f"Failed to resolve IMAP credentials: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/imap/test")
-def test_connection(db: Session = Depends(get_db)):
+async def test_connection():
     """Test the IMAP connection with current settings."""
     logger.info("Request to test IMAP connection")
-    settings = get_settings(db, with_password=True)
-    if not settings:
-        logger.error("IMAP settings not found, cannot test connection")
-        raise HTTPException(status_code=404, detail="IMAP settings not found")
-
-    # Prefer OAuth2 for Gmail when available
-    oauth2_email = None
-    oauth2_token = None
-    if settings.imap_server.strip().lower() == "imap.gmail.com":
-        cred = get_oauth2_credential(db, settings.imap_username)
-        if cred:
-            tokens = get_decrypted_credential(db, settings.imap_username)
-            if tokens:
-                access_token, refresh_token = tokens
-                if is_token_expired(cred.token_expiry):
-                    if not app_settings.google_client_secrets_json:
-                        raise HTTPException(
-                            status_code=500,
-                            detail="Google OAuth2 client secrets not configured.",
-                        )
-                    client_secrets = _json.loads(app_settings.google_client_secrets_json)
-                    new_access, _ = refresh_access_token(client_secrets, refresh_token)
-                    access_token = new_access
-                oauth2_email = settings.imap_username
-                oauth2_token = access_token
-
-    is_successful, message = _test_imap_connection(
-        server=settings.imap_server,
-        username=settings.imap_username,
-        password=settings.imap_password,
-        oauth2_email=oauth2_email,
-        oauth2_token=oauth2_token,
-    )
+    credentials = await run_in_imap_executor(_get_credentials)
+    is_successful, message = await _test_imap_connection(credentials)
 
     if not is_successful:
         logger.warning(f"IMAP connection test failed: {message}")
@@ -83,54 +71,54 @@ def test_connection(db: Session = Depends(get_db)):
 
 
 @router.get("/imap/folders", response_model=List[str])
-def read_folders(db: Session = Depends(get_db)):
+async def read_folders():
     """Retrieve a list of IMAP folders from the configured server."""
     logger.info("Request to fetch IMAP folders")
-    settings = get_settings(db, with_password=True)
-    if not settings:
-        logger.error("IMAP settings not found, cannot fetch folders")
-        raise HTTPException(status_code=404, detail="IMAP settings not found")
-
-    # Prefer OAuth2 for Gmail when available
-    oauth2_email = None
-    oauth2_token = None
-    if settings.imap_server.strip().lower() == "imap.gmail.com":
-        cred = get_oauth2_credential(db, settings.imap_username)
-        if cred:
-            tokens = get_decrypted_credential(db, settings.imap_username)
-            if tokens:
-                access_token, refresh_token = tokens
-                if is_token_expired(cred.token_expiry):
-                    if not app_settings.google_client_secrets_json:
-                        raise HTTPException(
-                            status_code=500,
-                            detail="Google OAuth2 client secrets not configured.",
-                        )
-                    client_secrets = _json.loads(app_settings.google_client_secrets_json)
-                    new_access, _ = refresh_access_token(client_secrets, refresh_token)
-                    access_token = new_access
-                oauth2_email = settings.imap_username
-                oauth2_token = access_token
-
-    folders = get_folders(
-        server=settings.imap_server,
-        username=settings.imap_username,
-        password=settings.imap_password,
-        oauth2_email=oauth2_email,
-        oauth2_token=oauth2_token,
-    )
-
+    credentials = await run_in_imap_executor(_get_credentials)
+    folders = await get_folders(credentials)
     logger.info(f"Found {len(folders)} IMAP folders")
     return folders
 
 
 @router.post("/imap/process")
-def trigger_email_processing(db: Session = Depends(get_db)):
-    """Trigger the email processing manually."""
+def trigger_email_processing():
+    """Trigger the email processing manually.
+
+    The emails are checked in the background by the process holding the
+    ingestion lease, so the request neither waits for nor competes with it.
+    """
     logger.info("Request to manually trigger email processing")
     try:
-        process_emails(db)
+        request_check()
         return {"message": "Email processing triggered successfully."}
     except Exception as e:
         logger.error(f"Error triggering email processing: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/imap/tasks", response_model=List[IngestionTask])
+def read_failed_tasks(db: Session = Depends(get_db)):
+    """Retrieve the emails that are waiting for a retry or were given up on."""
+    logger.info("Request to read failed ingestion tasks")
+    return get_ingestion_tasks(db)
+
+
+@router.post("/imap/tasks/{task_id}/retry", response_model=IngestionTask)
+def retry_failed_task(task_id: int, db: Session = Depends(get_db)):
+    """Retry an email on the next check of its folder."""
+    logger.info(f"Request to retry ingestion task with id={task_id}")
+    task = retry_task(db, task_id)
+    if task is None:
+        logger.warning(f"Ingestion task with id={task_id} not found")
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@router.get("/imap/schedule", response_model=List[FolderSchedule])
+def read_schedule(db: Session = Depends(get_db)):
+    """Retrieve how often each folder is checked and when it is checked next.
+
+    Folders are only checked at these times if adaptive polling is enabled.
+    """
+    logger.info("Request to read the folder schedule")
+    return plan_folders(db, get_settings(db))
@@ -1,11 +1,12 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.logging import get_logger
-from app.crud.entries import create_entry
+from app.core.pagination import parse_cursor
+from app.crud.entries import create_entry, get_entry_summaries
 from app.crud.newsletters import (
     create_newsletter,
     delete_newsletter,
@@ -13,7 +14,7 @@ from app.crud.newsletters import (
     get_newsletters,
     update_newsletter,
 )
-from app.schemas.entries import Entry, EntryCreate
+from app.schemas.entries import Entry, EntryCreate, EntrySummary
 from app.schemas.newsletters import Newsletter, NewsletterCreate, NewsletterUpdate
 
 logger = get_logger(__name__)
@@ -33,7 +34,9 @@ def create_new_newsletter(newsletter: NewsletterCreate, db: Session = Depends(ge
 
 
 @router.get("/newsletters", response_model=List[Newsletter])
-def read_newsletters(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_newsletters(
+    skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)
+):
     """Retrieve a list of newsletters."""
     logger.info(f"Request to read newsletters with skip={skip}, limit={limit}")
     newsletters = get_newsletters(db, skip=skip, limit=limit)
@@ -41,7 +44,7 @@ def read_newsletters(skip: int = 0, limit: int = 100, db: Session = Depends(get_
 
 
 @router.get("/newsletters/{newsletter_id}", response_model=Newsletter)
-def read_newsletter(newsletter_id: str, db: Session = Depends(get_db)):
+def read_newsletter(newsletter_id: str, db: Session = Depends(get_read_db)):
     """Retrieve a single newsletter by its ID."""
     logger.info(f"Request to read newsletter with id={newsletter_id}")
     db_newsletter = get_newsletter_by_identifier(db, identifier=newsletter_id)
@@ -92,3 +95,32 @@ def create_newsletter_entry(
         )
         raise HTTPException(status_code=404, detail="Newsletter not found")
     return create_entry(db=db, entry=entry, newsletter_id=newsletter_id)
+
+
+@router.get("/newsletters/{newsletter_id}/entries", response_model=List[EntrySummary])
+def read_newsletter_entries(
+    newsletter_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    before: str | None = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """List the entries of a newsletter, newest first, without their bodies.
+
+    Pass the ``<received_at>,<id>`` of the last listed entry as ``before`` to
+    fetch the next page.
+    """
+    logger.info(
+        f"Request to list entries of newsletter_id={newsletter_id}, skip={skip}, limit={limit}, before={before}"
+    )
+    try:
+        cursor = parse_cursor(before) if before is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    db_newsletter = get_newsletter_by_identifier(db, identifier=newsletter_id)
+    if db_newsletter is None:
+        logger.warning(f"Newsletter with id={newsletter_id} not found")
+        raise HTTPException(status_code=404, detail="Newsletter not found")
+    return get_entry_summaries(
+        db, db_newsletter.id, skip=skip, limit=limit, before=cursor
+    )
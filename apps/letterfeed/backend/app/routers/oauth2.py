@@ -20,6 +20,7 @@ from app.services.oauth2 import (
     get_authorization_url,
     get_gmail_user_info,
 )
+from app.services.gmail_tokens import gmail_tokens
 
 router = APIRouter(prefix="/auth/google", tags=["oauth2"])
 
@@ -125,6 +126,7 @@ async def handle_gmail_oauth2_callback(
         credential = create_or_update_oauth2_credential(
             db, email, access_token, refresh_token, expiry
         )
+        gmail_tokens.invalidate(email)
         
         return GmailOAuth2Credential.model_validate(credential)
     except Exception as e:
@@ -182,7 +184,7 @@ async def get_gmail_credential(
 async def disconnect_gmail(
     email: str,
     db: Session = Depends(get_db),
-    _: str = Depends(get_current_user),
+    _: str = Depends(protected_route),
 ) -> dict[str, str]:
     """Disconnect a Gmail account.
     
@@ -201,5 +203,6 @@ async def disconnect_gmail(
     """
     if not delete_oauth2_credential(db, email):
         raise HTTPException(status_code=404, detail="Gmail account not found")
+    gmail_tokens.invalidate(email)
     
     return {"message": f"Disconnected {email}"}
@@ -26,3 +26,37 @@ class Entry(EntryBase):
     received_at: datetime.datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class EntrySummary(BaseModel):
+    """Schema for listing an entry without its body."""
+
+    id: str
+    newsletter_id: str
+    subject: str
+    snippet: str
+    received_at: datetime.datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class EntrySearchResult(BaseModel):
+    """Schema for an entry found by a search."""
+
+    id: str
+    newsletter_id: str
+    newsletter_name: str
+    subject: str
+    snippet: str
+    received_at: datetime.datetime
+    score: float
+
+
+class EntrySearchResults(BaseModel):
+    """Schema for a page of search results.
+
+    Pass ``next_cursor`` as ``after`` to fetch the next page.
+    """
+
+    results: list[EntrySearchResult]
+    next_cursor: str | None = None
@@ -0,0 +1,20 @@
+import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class IngestionTask(BaseModel):
+    """Schema for a queued email that failed to be stored so far."""
+
+    id: int
+    folder: str
+    uid: int
+    message_id: str
+    sender: str
+    stage: str
+    state: str
+    attempts: int
+    next_attempt_at: datetime.datetime | None = None
+    last_error: str | None = None
+
+    model_config = ConfigDict(from_attributes=True)
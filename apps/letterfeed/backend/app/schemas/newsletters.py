@@ -1,14 +1,37 @@
-from typing import List
+import datetime
+from typing import Annotated, Any, List
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    ValidatorFunctionWrapHandler,
+    WrapValidator,
+    field_validator,
+)
+
+from app.core.sender_routing import WILDCARD_PREFIX
+from app.core.slug import sanitize_slug
 
-from pydantic import BaseModel, ConfigDict, EmailStr, field_validator
 
-from app.core.slug import sanitize_slug
+def _validate_sender_email(value: Any, handler: ValidatorFunctionWrapHandler) -> str:
+    """Validate an email address or a domain wildcard such as ``*@example.com``."""
+    if isinstance(value, str) and value.startswith(WILDCARD_PREFIX):
+        domain = value.removeprefix(WILDCARD_PREFIX)
+        # Validate the domain as part of an address at that domain.
+        handler(f"sender@{domain}")
+        return WILDCARD_PREFIX + domain.lower()
+    return handler(value)
+
+
+# An email address, or all addresses at a domain and its subdomains
+SenderEmail = Annotated[EmailStr, WrapValidator(_validate_sender_email)]
 
 
 class SenderBase(BaseModel):
     """Base schema for a sender."""
 
-    email: EmailStr
+    email: SenderEmail
 
 
 class SenderCreate(SenderBase):
@@ -44,13 +67,13 @@ class NewsletterBase(BaseModel):
 class NewsletterCreate(NewsletterBase):
     """Schema for creating a new newsletter."""
 
-    sender_emails: List[EmailStr]
+    sender_emails: List[SenderEmail]
 
 
 class NewsletterUpdate(NewsletterBase):
     """Schema for updating an existing newsletter."""
 
-    sender_emails: List[EmailStr]
+    sender_emails: List[SenderEmail]
 
 
 class Newsletter(NewsletterBase):
@@ -60,5 +83,6 @@ class Newsletter(NewsletterBase):
     is_active: bool
     senders: List[Sender] = []
     entries_count: int
+    latest_received_at: datetime.datetime | None = None
 
     model_config = ConfigDict(from_attributes=True)
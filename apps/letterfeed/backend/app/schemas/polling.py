@@ -0,0 +1,27 @@
+import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class NewsletterCadence(BaseModel):
+    """Schema for how often a newsletter arrives and is checked for."""
+
+    newsletter_id: str
+    name: str
+    typical_gap: datetime.timedelta | None = None
+    latest_received_at: datetime.datetime | None = None
+    interval: datetime.timedelta
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class FolderSchedule(BaseModel):
+    """Schema for how often a folder is checked and when it is checked next."""
+
+    folder: str
+    interval: datetime.timedelta
+    newsletters: list[NewsletterCadence]
+    last_checked_at: datetime.datetime | None = None
+    next_check_at: datetime.datetime | None = None
+
+    model_config = ConfigDict(from_attributes=True)
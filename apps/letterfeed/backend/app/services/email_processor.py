@@ -1,43 +1,55 @@
 import email
 import imaplib
+import multiprocessing
 import quopri
+import re
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Collection
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from email.header import decode_header, make_header
 from email.message import Message
+from itertools import batched
+from typing import Iterator, NamedTuple
 
 import nh3
 from bs4 import BeautifulSoup
 from readability import Document
 from sqlalchemy.orm import Session
 
-from app.core.logging import get_logger
 from app.core.config import settings as app_settings
-from app.crud.entries import create_entry, get_entry_by_message_id
-from app.crud.newsletters import create_newsletter, get_newsletters
+from app.core.database import SessionLocal
+from app.core.imap_client import authenticate
+from app.core.logging import get_logger
+from app.core.sender_routing import NewsletterRoute, SenderMap, sender_routing
+from app.crud.entries import create_entries, get_existing_message_ids
+from app.crud.imap_folders import get_folder_state, update_folder_state
+from app.crud.ingestion_tasks import (
+    TaskFailure,
+    complete_tasks,
+    delete_stale_tasks,
+    enqueue_tasks,
+    fail_tasks,
+    get_due_tasks,
+    get_queued_message_ids,
+)
+from app.crud.newsletters import create_newsletter
+from app.crud.oauth2 import get_oauth2_credential
 from app.crud.settings import get_settings
+from app.models.ingestion import IngestionTask
 from app.models.newsletters import Newsletter
 from app.schemas.entries import EntryCreate
 from app.schemas.newsletters import NewsletterCreate
 from app.schemas.settings import Settings
-from app.crud.oauth2 import (
-    get_oauth2_credential,
-    get_decrypted_credential,
-    update_oauth2_tokens,
-)
-from app.services.oauth2 import (
-    is_token_expired,
-    refresh_access_token,
-)
+from app.services.imap_auth import get_imap_credentials
 
 logger = get_logger(__name__)
 
 
 def _is_configured(db: Session, settings: Settings | None) -> bool:
     """Check if IMAP settings are configured."""
-    if (
-        not settings
-        or not settings.imap_server
-        or not settings.imap_username
-    ):
+    if not settings or not settings.imap_server or not settings.imap_username:
         logger.warning("IMAP settings are not configured. Skipping email processing.")
         return False
     # If password isn't provided, allow Gmail via OAuth2 when configured
@@ -57,41 +69,11 @@ def _connect_to_imap(
     """Connect to the IMAP server and select the mailbox."""
     try:
         logger.info(f"Connecting to IMAP server: {settings.imap_server}")
-        mail = imaplib.IMAP4_SSL(settings.imap_server)
-        # Prefer OAuth2 for Gmail if available
-        if settings.imap_server.strip().lower() == "imap.gmail.com":
-            cred_model = get_oauth2_credential(db, settings.imap_username)
-            if cred_model:
-                tokens = get_decrypted_credential(db, settings.imap_username)
-                if tokens is None:
-                    raise RuntimeError("Failed to decrypt Gmail OAuth2 tokens")
-                access_token, refresh_token = tokens
-                if is_token_expired(cred_model.token_expiry):
-                    if not app_settings.google_client_secrets_json:
-                        raise RuntimeError(
-                            "Google OAuth2 client secrets not configured for token refresh"
-                        )
-                    import json as _json
-
-                    client_secrets = _json.loads(app_settings.google_client_secrets_json)
-                    new_access, new_expiry = refresh_access_token(
-                        client_secrets, refresh_token
-                    )
-                    updated = update_oauth2_tokens(
-                        db, settings.imap_username, new_access, new_expiry
-                    )
-                    access_token = new_access
-                # XOAUTH2 auth string
-                auth_string = f"user={settings.imap_username}\x01auth=Bearer {access_token}\x01\x01"
-                import base64 as _b64
-
-                mail.authenticate(
-                    "XOAUTH2", lambda x: _b64.b64encode(auth_string.encode())
-                )
-            else:
-                mail.login(settings.imap_username, settings.imap_password)
-        else:
-            mail.login(settings.imap_username, settings.imap_password)
+        credentials = get_imap_credentials(db, settings)
+        mail = imaplib.IMAP4_SSL(
+            settings.imap_server, timeout=app_settings.imap_timeout
+        )
+        authenticate(mail, credentials)
         status, messages = mail.select(search_folder)
         if status != "OK":
             logger.error(
@@ -106,13 +88,87 @@ def _connect_to_imap(
         return None
 
 
-def _fetch_unread_email_ids(mail: imaplib.IMAP4_SSL) -> list[str]:
-    """Fetch IDs of unread emails."""
-    status, messages = mail.search(None, "(UNSEEN)")
+_UIDVALIDITY_PATTERN = re.compile(rb"UIDVALIDITY (\d+)")
+
+
+def _get_uidvalidity(mail: imaplib.IMAP4_SSL, search_folder: str) -> int | None:
+    """Return the UIDVALIDITY of the selected folder, or None if the server omits it.
+
+    It is taken from the response to SELECT. A long-lived session whose SELECT
+    response was consumed by an earlier check asks for it with STATUS.
+    """
+    _, data = mail.response("UIDVALIDITY")
+    if data and data[-1] is not None and data[-1].isdigit():
+        return int(data[-1])
+
+    status, data = mail.status(search_folder, "(UIDVALIDITY)")
+    match = _UIDVALIDITY_PATTERN.search(data[0] or b"") if status == "OK" else None
+    if not match:
+        logger.warning(f"Failed to get UIDVALIDITY of folder '{search_folder}'")
+        return None
+    return int(match.group(1))
+
+
+def _fetch_unread_email_ids(mail: imaplib.IMAP4_SSL, after_uid: int = 0) -> list[bytes]:
+    """Fetch UIDs of unread emails, optionally only those above ``after_uid``."""
+    criteria = f"(UID {after_uid + 1}:* UNSEEN)" if after_uid else "(UNSEEN)"
+    status, messages = mail.uid("SEARCH", None, criteria)
     if status != "OK":
         logger.error(f"Failed to search for unseen emails, status: {status}")
         return []
-    return messages[0].split()
+    # "n:*" always matches the highest UID, even if it is below n.
+    return [uid for uid in messages[0].split() if int(uid) > after_uid]
+
+
+def _to_message_set(uids: list[bytes]) -> str:
+    """Compress a list of UIDs into an IMAP message set, e.g. ``1:3,7``."""
+    numbers = sorted({int(uid) for uid in uids})
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:]:
+        if number == prev + 1:
+            prev = number
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = number
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+_UID_PATTERN = re.compile(rb"UID (\d+)")
+_HEADER_QUERY = "(BODY.PEEK[HEADER.FIELDS (FROM MESSAGE-ID SUBJECT DATE)])"
+
+
+def _fetch_messages(
+    mail: imaplib.IMAP4_SSL, uids: list[bytes], query: str = "(BODY.PEEK[])"
+) -> dict[bytes, bytes]:
+    """Fetch a set of messages in a single UID FETCH round-trip.
+
+    Returns the fetched data keyed by UID.
+    """
+    status, data = mail.uid("FETCH", _to_message_set(uids), query)
+    if status != "OK":
+        logger.warning(f"Failed to fetch emails with uids={uids}, status: {status}")
+        return {}
+
+    messages = {}
+    literal = None
+    for item in data:
+        # Each message is a (envelope, literal) tuple, followed by the rest of
+        # the response, e.g. b")" or b" UID 7)" if the server sends the UID last
+        if isinstance(item, tuple):
+            match = _UID_PATTERN.search(item[0])
+            if match:
+                messages[match.group(1)] = item[1]
+                literal = None
+            else:
+                literal = item[1]
+        elif literal is not None and item:
+            match = _UID_PATTERN.search(item)
+            if match:
+                messages[match.group(1)] = literal
+            literal = None
+    return messages
 
 
 def _get_email_body(msg: Message) -> str:
@@ -192,6 +248,46 @@ def _extract_and_clean_html(raw_html_content: str) -> dict[str, str]:
     return {"title": title, "body": cleaned_body}
 
 
+def _extract_email_content(raw_email: bytes) -> dict[str, str]:
+    """Extract the cleaned content of a raw email.
+
+    Runs in the extraction process pool, so it must only depend on its input.
+    """
+    msg = email.message_from_bytes(raw_email)
+    return _extract_and_clean_html(_get_email_body(msg))
+
+
+_extraction_executor: ProcessPoolExecutor | None = None
+_extraction_executor_lock = threading.Lock()
+
+
+def _get_extraction_executor() -> ProcessPoolExecutor | None:
+    """Return the extraction process pool, or None if extraction runs inline."""
+    global _extraction_executor
+    if app_settings.extraction_workers <= 0:
+        return None
+    with _extraction_executor_lock:
+        if _extraction_executor is None:
+            logger.info(
+                f"Starting {app_settings.extraction_workers} extraction workers"
+            )
+            # Forking a process with running scheduler threads is unsafe.
+            _extraction_executor = ProcessPoolExecutor(
+                max_workers=app_settings.extraction_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _extraction_executor
+
+
+def shutdown_extraction_executor() -> None:
+    """Stop the extraction process pool, if it was started."""
+    global _extraction_executor
+    with _extraction_executor_lock:
+        if _extraction_executor is not None:
+            _extraction_executor.shutdown(cancel_futures=True)
+            _extraction_executor = None
+
+
 def _auto_add_newsletter(
     db: Session,
     sender: str,
@@ -207,23 +303,34 @@ def _auto_add_newsletter(
         name=newsletter_name,
         sender_emails=[sender],
     )
-    return create_newsletter(db, new_newsletter_schema)
+    # The header prefilter accepts every sender while new senders are added,
+    # so there are no skipped emails of this sender to rescan for.
+    return create_newsletter(db, new_newsletter_schema, rescan=False)
 
 
-def _process_single_email(
-    num: str,
-    mail: imaplib.IMAP4_SSL,
+class _ExtractionError(Exception):
+    """The content of an email could not be extracted."""
+
+
+def _prepare_entry(
+    raw_email: bytes,
     db: Session,
-    sender_map: dict[str, Newsletter],
+    sender_map: SenderMap,
     settings: Settings,
-) -> None:
-    """Process a single email message."""
-    status, data = mail.fetch(num, "(BODY.PEEK[])")
-    if status != "OK":
-        logger.warning(f"Failed to fetch email with id={num}")
-        return
+    content: str | None = None,
+) -> tuple[EntryCreate, NewsletterRoute] | None:
+    """Build the entry for a single email message.
+
+    If the content of the email was extracted already, e.g. in the process
+    pool, ``content`` holds the extracted body.
+
+    Returns the entry and the newsletter it belongs to, or None if the email
+    is skipped.
 
-    msg = email.message_from_bytes(data[0][1])
+    Raises:
+        _ExtractionError: If the content of the email cannot be extracted.
+    """
+    msg = email.message_from_bytes(raw_email)
     sender = email.utils.parseaddr(msg["From"])[1]
     message_id = msg.get("Message-ID")
 
@@ -231,21 +338,19 @@ def _process_single_email(
         logger.warning(
             f"Email from {sender} with subject '{msg['Subject']}' has no Message-ID, skipping."
         )
-        return
-
-    if get_entry_by_message_id(db, message_id):
-        logger.info(f"Email with Message-ID {message_id} already processed, skipping.")
-        return
+        return None
 
     logger.debug(f"Processing email from {sender} with subject '{msg['Subject']}'")
 
     newsletter = sender_map.get(sender)
     if not newsletter and settings.auto_add_new_senders:
-        newsletter = _auto_add_newsletter(db, sender, msg, settings)
+        newsletter = NewsletterRoute.from_newsletter(
+            _auto_add_newsletter(db, sender, msg, settings)
+        )
         sender_map[sender] = newsletter
 
     if not newsletter:
-        return
+        return None
 
     subject = str(make_header(decode_header(msg["Subject"])))
     body = _get_email_body(msg)
@@ -253,99 +358,496 @@ def _process_single_email(
     received_at = email.utils.parsedate_to_datetime(date_str) if date_str else None
 
     if newsletter.extract_content:
-        cleaned_data = _extract_and_clean_html(body)
+        if content is None:
+            try:
+                content = _extract_and_clean_html(body)["body"]
+            except Exception as e:
+                raise _ExtractionError(str(e)) from e
         # The subject from the email itself is often better than what readability extracts
         # so we only override the body.
-        body = cleaned_data["body"]
+        body = content
 
     entry_schema = EntryCreate(
         subject=subject, body=body, message_id=message_id, received_at=received_at
     )
-    new_entry = create_entry(db, entry_schema, newsletter.id)
+    return entry_schema, newsletter
 
-    if not new_entry:
-        logger.error(
-            f"Failed to create entry for newsletter '{newsletter.name}' from sender {sender}, email will not be marked as read or moved."
-        )
-        return
 
-    logger.info(
-        f"Created new entry for newsletter '{newsletter.name}' from sender {sender}"
-    )
+def _apply_flags(
+    mail: imaplib.IMAP4_SSL,
+    processed: dict[bytes, NewsletterRoute],
+    settings: Settings,
+) -> None:
+    """Mark processed emails as read and move them, one command per folder."""
+    if not processed:
+        return
 
     if settings.mark_as_read:
-        logger.debug(f"Marking email with id={num} as read")
-        mail.store(num, "+FLAGS", "\\Seen")
+        message_set = _to_message_set(list(processed))
+        logger.debug(f"Marking emails with uids={message_set} as read")
+        mail.uid("STORE", message_set, "+FLAGS", "\\Seen")
 
-    move_folder = newsletter.move_to_folder or settings.move_to_folder
-    if move_folder:
-        logger.debug(f"Moving email with id={num} to {move_folder}")
-        mail.copy(num, move_folder)
-        mail.store(num, "+FLAGS", "\\Deleted")
+    by_folder: dict[str, list[bytes]] = defaultdict(list)
+    for uid, newsletter in processed.items():
+        move_folder = newsletter.move_to_folder or settings.move_to_folder
+        if move_folder:
+            by_folder[move_folder].append(uid)
 
+    for move_folder, uids in by_folder.items():
+        message_set = _to_message_set(uids)
+        logger.debug(f"Moving emails with uids={message_set} to {move_folder}")
+        mail.uid("COPY", message_set, move_folder)
+        mail.uid("STORE", message_set, "+FLAGS", "\\Deleted")
 
-def process_emails(db: Session) -> None:
-    """Process unread emails, add them as entries, and manage newsletters."""
-    logger.info("Starting email processing...")
-    settings = get_settings(db, with_password=True)
-    if not _is_configured(db, settings):
-        return
 
-    all_newsletters = get_newsletters(db)
-    logger.info(f"Processing emails for {len(all_newsletters)} newsletters.")
+def _prefilter_emails(
+    headers: dict[bytes, bytes],
+    db: Session,
+    sender_map: SenderMap,
+    settings: Settings,
+) -> dict[int, tuple[str, str]]:
+    """Select the emails worth downloading based on their headers alone.
+
+    Emails without a Message-ID, from unknown senders (unless new senders are
+    added automatically), that were already processed or are queued already
+    are skipped. Returns the sender and Message-ID of each selected email,
+    keyed by UID.
+    """
+    candidates: dict[int, tuple[str, str]] = {}
+    for uid, raw_headers in headers.items():
+        msg = email.message_from_bytes(raw_headers)
+        sender = email.utils.parseaddr(msg["From"])[1]
+        message_id = msg.get("Message-ID")
+        if not message_id:
+            logger.warning(
+                f"Email from {sender} with subject '{msg['Subject']}' has no Message-ID, skipping."
+            )
+            continue
+        if sender not in sender_map and not settings.auto_add_new_senders:
+            continue
+        candidates[int(uid)] = (sender, message_id)
+
+    message_ids = [message_id for _, message_id in candidates.values()]
+    existing = get_existing_message_ids(db, message_ids)
+    if existing:
+        logger.info(f"Skipping {len(existing)} already processed emails.")
+    queued = get_queued_message_ids(db, settings.imap_username, message_ids)
+    return {
+        uid: (sender, message_id)
+        for uid, (sender, message_id) in candidates.items()
+        if message_id not in existing and message_id not in queued
+    }
 
-    # Group newsletters by search folder
-    folder_groups: dict[str, list[Newsletter]] = {}
-    for nl in all_newsletters:
-        folder = nl.search_folder or settings.search_folder
-        if folder not in folder_groups:
-            folder_groups[folder] = []
-        folder_groups[folder].append(nl)
 
-    # If auto-adding is enabled, ensure the default search folder is always checked.
-    if settings.auto_add_new_senders and settings.search_folder not in folder_groups:
-        folder_groups[settings.search_folder] = []
+def _task_batches(
+    mail: imaplib.IMAP4_SSL,
+    db: Session,
+    sender_map: SenderMap,
+    settings: Settings,
+    search_folder: str,
+    uidvalidity: int | None,
+    last_uid: int,
+) -> Iterator[list[IngestionTask]]:
+    """Yield the queued emails of a folder that are due, then the new ones.
+
+    New emails are queued batch by batch based on their headers. Once they are
+    queued, the folder's last processed UID moves past them, failures in the
+    later stages are retried from the queue. It stops at the first email whose
+    headers could not be fetched, so that email is searched again next time.
+    """
+    queue_validity = uidvalidity or 0
+    delete_stale_tasks(db, settings.imap_username, search_folder, queue_validity)
+    due = get_due_tasks(db, settings.imap_username, search_folder, queue_validity)
+    if due:
+        logger.info(f"Retrying {len(due)} queued emails.")
+    for batch in batched(due, app_settings.imap_fetch_batch_size):
+        yield list(batch)
+
+    email_ids = _fetch_unread_email_ids(mail, last_uid)
+    logger.info(f"Found {len(email_ids)} unseen emails above uid={last_uid}.")
+    advancing = uidvalidity is not None
+    for batch in batched(email_ids, app_settings.imap_fetch_batch_size):
+        headers = _fetch_messages(mail, list(batch), _HEADER_QUERY)
+        wanted = _prefilter_emails(headers, db, sender_map, settings)
+        tasks = enqueue_tasks(
+            db, settings.imap_username, search_folder, queue_validity, wanted
+        )
+        if advancing:
+            for uid in sorted(batch, key=int):
+                if uid not in headers:
+                    logger.warning(
+                        f"Failed to fetch headers of email with uid={uid.decode()}, "
+                        "it is searched again on the next check."
+                    )
+                    advancing = False
+                    break
+                last_uid = int(uid)
+            update_folder_state(
+                db, settings.imap_username, search_folder, uidvalidity, last_uid
+            )
+        yield tasks
 
-    for search_folder, newsletters_in_folder in folder_groups.items():
-        logger.info(
-            f"Processing folder '{search_folder}' for {len(newsletters_in_folder)} newsletters."
+
+class _FetchedBatch(NamedTuple):
+    """A batch of queued emails downloaded from the server, awaiting storage."""
+
+    tasks: list[IngestionTask]
+    messages: dict[int, bytes]
+    extractions: dict[int, Future[dict[str, str]]]
+
+
+def _fetch_stage(
+    mail: imaplib.IMAP4_SSL,
+    tasks: list[IngestionTask],
+    db: Session,
+    sender_map: SenderMap,
+    executor: ProcessPoolExecutor | None,
+) -> _FetchedBatch:
+    """Download the emails of a batch of tasks, unless a retry kept them.
+
+    If an extraction process pool is available, the content extraction of the
+    emails is started right away.
+    """
+    messages = {task.uid: task.raw_email for task in tasks if task.raw_email}
+    missing = [task for task in tasks if task.uid not in messages]
+    if missing:
+        fetched = _fetch_messages(mail, [str(task.uid).encode() for task in missing])
+        failures = []
+        for task in missing:
+            raw_email = fetched.get(str(task.uid).encode())
+            if raw_email is None:
+                failures.append(TaskFailure(task, "fetch", "Email not found"))
+            else:
+                messages[task.uid] = raw_email
+        fail_tasks(db, failures)
+
+    extractions = {}
+    if executor is not None:
+        for task in tasks:
+            newsletter = sender_map.get(task.sender)
+            if (
+                task.uid in messages
+                and task.content is None
+                and newsletter
+                and newsletter.extract_content
+            ):
+                extractions[task.uid] = executor.submit(
+                    _extract_email_content, messages[task.uid]
+                )
+    return _FetchedBatch(tasks, messages, extractions)
+
+
+def _create_entries_isolated(
+    db: Session,
+    prepared: dict[int, tuple[EntryCreate, NewsletterRoute]],
+    batch: _FetchedBatch,
+    failures: list[TaskFailure],
+) -> set[str]:
+    """Create the entries of a batch, one by one if the batch fails.
+
+    Entries are given by task id. Those that cannot be created are added to
+    ``failures``.
+
+    Returns:
+        The message_ids of the entries that were created or linked.
+    """
+    try:
+        return create_entries(
+            db, [(entry, newsletter.id) for entry, newsletter in prepared.values()]
+        )
+    except Exception as e:
+        db.rollback()
+        logger.warning(
+            f"Failed to store a batch of {len(prepared)} entries, "
+            f"storing them one by one: {e}"
         )
-        sender_map = {
-            sender.email: nl for nl in newsletters_in_folder for sender in nl.senders
-        }
 
-        mail = _connect_to_imap(db, settings, search_folder)
-        if not mail:
-            logger.warning(
-                f"Skipping folder '{search_folder}' due to connection issue."
+    tasks = {task.id: task for task in batch.tasks}
+    created: set[str] = set()
+    for task_id, (entry, newsletter) in prepared.items():
+        try:
+            created |= create_entries(db, [(entry, newsletter.id)])
+        except Exception as e:
+            db.rollback()
+            task = tasks[task_id]
+            content = entry.body if newsletter.extract_content else None
+            failures.append(
+                TaskFailure(task, "store", str(e), batch.messages[task.uid], content)
             )
-            continue
+    return created
+
 
+def _store_stage(
+    mail: imaplib.IMAP4_SSL,
+    batch: _FetchedBatch,
+    db: Session,
+    sender_map: SenderMap,
+    settings: Settings,
+) -> None:
+    """Create the entries of a downloaded batch and update the emails' flags.
+
+    The entries are created in a single transaction. Only emails whose entry
+    was actually created, or linked to an entry with the same content, are
+    marked as read or moved. An email that fails to be extracted or stored is
+    retried later, without holding up the others.
+    """
+    tasks = {task.id: task for task in batch.tasks if task.uid in batch.messages}
+    prepared: dict[int, tuple[EntryCreate, NewsletterRoute]] = {}
+    failures: list[TaskFailure] = []
+    for task_id, task in tasks.items():
+        raw_email = batch.messages[task.uid]
+        content = task.content
+        extraction = batch.extractions.get(task.uid)
         try:
-            email_ids = _fetch_unread_email_ids(mail)
+            if content is None and extraction is not None:
+                try:
+                    content = extraction.result()["body"]
+                except Exception as e:
+                    raise _ExtractionError(str(e)) from e
+            result = _prepare_entry(raw_email, db, sender_map, settings, content)
+        except _ExtractionError as e:
+            failures.append(TaskFailure(task, "extract", str(e), raw_email))
+            continue
+        except Exception as e:
+            db.rollback()
+            failures.append(TaskFailure(task, "store", str(e), raw_email, content))
+            continue
+        if result:
+            prepared[task_id] = result
+
+    created = _create_entries_isolated(db, prepared, batch, failures)
+    failed = {failure.task.id for failure in failures}
+    processed: dict[bytes, NewsletterRoute] = {}
+    for task_id, (entry, newsletter) in prepared.items():
+        uid = tasks[task_id].uid
+        if entry.message_id in created:
             logger.info(
-                f"Found {len(email_ids)} unseen emails in folder '{search_folder}'."
+                f"Stored email for newsletter '{newsletter.name}' from uid={uid}"
             )
-            for num in email_ids:
-                _process_single_email(num, mail, db, sender_map, settings)
-
-            # Expunge logic needs to be carefully considered.
-            # If any newsletter in this folder group has a move_to_folder, we expunge.
-            # This is an approximation. A more robust solution might require per-email expunge.
-            should_expunge = any(
-                nl.move_to_folder or settings.move_to_folder
-                for nl in newsletters_in_folder
+            processed[str(uid).encode()] = newsletter
+        elif task_id not in failed:
+            logger.info(
+                f"Email with Message-ID {entry.message_id} already processed, skipping."
             )
-            if should_expunge:
-                logger.info(f"Expunging deleted emails from '{search_folder}'")
-                mail.expunge()
 
-        except Exception as e:
-            logger.error(
-                f"Error processing emails in folder '{search_folder}': {e}",
-                exc_info=True,
+    complete_tasks(db, [task for task in tasks.values() if task.id not in failed])
+    fail_tasks(db, failures)
+    _apply_flags(mail, processed, settings)
+
+
+def _process_folder_emails(
+    mail: imaplib.IMAP4_SSL,
+    db: Session,
+    sender_map: SenderMap,
+    settings: Settings,
+    search_folder: str,
+) -> None:
+    """Fetch and process the unread emails of the selected folder in batches.
+
+    Only emails above the folder's last processed UID are searched, unless
+    the folder's UIDVALIDITY changed since, which invalidates all UIDs.
+    Emails are queued before they are downloaded, extracted and stored, so
+    an email that fails in one of these stages is retried with backoff.
+    """
+    uidvalidity = _get_uidvalidity(mail, search_folder)
+    state = get_folder_state(db, settings.imap_username, search_folder)
+    last_uid = 0
+    if state and uidvalidity is not None:
+        if state.uidvalidity == uidvalidity:
+            last_uid = state.last_uid
+        else:
+            logger.info(
+                f"UIDVALIDITY of folder '{search_folder}' changed, rescanning all emails."
             )
-        finally:
+
+    executor = _get_extraction_executor()
+    # Download the next batch while the previous one is being extracted.
+    pending: _FetchedBatch | None = None
+    for tasks in _task_batches(
+        mail, db, sender_map, settings, search_folder, uidvalidity, last_uid
+    ):
+        fetched = _fetch_stage(mail, tasks, db, sender_map, executor)
+        if pending is not None:
+            _store_stage(mail, pending, db, sender_map, settings)
+        pending = fetched
+    if pending is not None:
+        _store_stage(mail, pending, db, sender_map, settings)
+
+
+def _group_newsletters_by_folder(
+    db: Session, settings: Settings
+) -> dict[str, list[NewsletterRoute]]:
+    """Group all newsletters by the folder their emails are searched in."""
+    folder_groups = sender_routing.folder_groups(db, settings.search_folder)
+
+    # If auto-adding is enabled, ensure the default search folder is always checked.
+    if settings.auto_add_new_senders and settings.search_folder not in folder_groups:
+        folder_groups[settings.search_folder] = []
+    return folder_groups
+
+
+_folder_locks: dict[str, threading.Lock] = {}
+_folder_locks_lock = threading.Lock()
+
+
+def _folder_lock(search_folder: str) -> threading.Lock:
+    """Return the lock serializing the processing of a folder."""
+    with _folder_locks_lock:
+        return _folder_locks.setdefault(search_folder, threading.Lock())
+
+
+def _process_folder(
+    mail: imaplib.IMAP4_SSL,
+    db: Session,
+    settings: Settings,
+    search_folder: str,
+    newsletters_in_folder: list[NewsletterRoute],
+) -> None:
+    """Process the unread emails of a folder over an open connection."""
+    logger.info(
+        f"Processing folder '{search_folder}' for {len(newsletters_in_folder)} newsletters."
+    )
+    sender_map = sender_routing.sender_map(db, search_folder, settings.search_folder)
+
+    # The scheduled check and an IDLE watcher may process the same folder.
+    with _folder_lock(search_folder):
+        _process_folder_emails(mail, db, sender_map, settings, search_folder)
+
+        # Expunge logic needs to be carefully considered.
+        # If any newsletter in this folder group has a move_to_folder, we expunge.
+        # This is an approximation. A more robust solution might require per-email expunge.
+        should_expunge = any(
+            nl.move_to_folder or settings.move_to_folder for nl in newsletters_in_folder
+        )
+        if should_expunge:
+            logger.info(f"Expunging deleted emails from '{search_folder}'")
+            mail.expunge()
+
+
+def get_search_folders(db: Session) -> list[str]:
+    """Return the folders that need to be checked for new emails."""
+    settings = get_settings(db, with_password=True)
+    if not _is_configured(db, settings):
+        return []
+    return list(_group_newsletters_by_folder(db, settings))
+
+
+def process_folder_emails(
+    db: Session, search_folder: str, mail: imaplib.IMAP4_SSL
+) -> None:
+    """Process the unread emails of a single folder over an open connection.
+
+    Unlike ``process_emails``, the connection is left open for the caller.
+    """
+    settings = get_settings(db, with_password=True)
+    if not _is_configured(db, settings):
+        return
+
+    folder_groups = _group_newsletters_by_folder(db, settings)
+    if search_folder not in folder_groups:
+        logger.debug(f"No newsletters are searched in folder '{search_folder}'")
+        return
+    _process_folder(mail, db, settings, search_folder, folder_groups[search_folder])
+
+
+def _check_folder(
+    db: Session,
+    settings: Settings,
+    search_folder: str,
+    newsletters_in_folder: list[NewsletterRoute],
+) -> None:
+    """Connect to a folder, process its unread emails and log out.
+
+    Errors are logged, so a failing folder does not affect the others.
+    """
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    mail = _connect_to_imap(db, settings, search_folder)
+    timings["connect"] = time.perf_counter() - start
+    if not mail:
+        logger.warning(f"Skipping folder '{search_folder}' due to connection issue.")
+        return
+
+    try:
+        phase_start = time.perf_counter()
+        _process_folder(mail, db, settings, search_folder, newsletters_in_folder)
+        timings["process"] = time.perf_counter() - phase_start
+    except Exception as e:
+        logger.error(
+            f"Error processing emails in folder '{search_folder}': {e}",
+            exc_info=True,
+        )
+    finally:
+        phase_start = time.perf_counter()
+        try:
             mail.logout()
+        except (imaplib.IMAP4.error, OSError) as e:
+            logger.warning(f"Failed to log out of folder '{search_folder}': {e}")
+        timings["logout"] = time.perf_counter() - phase_start
+        breakdown = ", ".join(f"{phase} {secs:.2f}s" for phase, secs in timings.items())
+        logger.info(
+            f"Checked folder '{search_folder}' in {time.perf_counter() - start:.2f}s "
+            f"({breakdown})"
+        )
+
+
+def _check_folder_in_new_session(settings: Settings, search_folder: str) -> None:
+    """Check a folder from a worker thread, with a session of its own."""
+    with SessionLocal() as db:
+        folder_groups = _group_newsletters_by_folder(db, settings)
+        _check_folder(db, settings, search_folder, folder_groups.get(search_folder, []))
+
+
+def process_emails(
+    db: Session,
+    folders: Collection[str] | None = None,
+    skip: Collection[str] = (),
+) -> None:
+    """Process unread emails, add them as entries, and manage newsletters.
+
+    Folders are checked concurrently over up to ``imap_folder_workers``
+    connections. If ``folders`` is given, only those of them that need to be
+    checked are. Folders in ``skip``, e.g. those watched with IDLE, are not.
+    """
+    logger.info("Starting email processing...")
+    start = time.perf_counter()
+    settings = get_settings(db, with_password=True)
+    if not _is_configured(db, settings):
+        return
+
+    folder_groups = _group_newsletters_by_folder(db, settings)
+    folder_groups = {
+        folder: routes
+        for folder, routes in folder_groups.items()
+        if (folders is None or folder in folders) and folder not in skip
+    }
+    logger.info(
+        f"Processing emails for {sum(map(len, folder_groups.values()))} newsletters "
+        f"in {len(folder_groups)} folders."
+    )
+
+    workers = min(app_settings.imap_folder_workers, len(folder_groups))
+    if workers <= 1:
+        for search_folder, newsletters_in_folder in folder_groups.items():
+            _check_folder(db, settings, search_folder, newsletters_in_folder)
+    else:
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="imap-folder"
+        ) as executor:
+            futures = {
+                search_folder: executor.submit(
+                    _check_folder_in_new_session, settings, search_folder
+                )
+                for search_folder in folder_groups
+            }
+            for search_folder, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(
+                        f"Error checking folder '{search_folder}': {e}", exc_info=True
+                    )
 
-    logger.info("Email processing finished successfully.")
+    logger.info(
+        f"Email processing finished successfully in {time.perf_counter() - start:.2f}s."
+    )
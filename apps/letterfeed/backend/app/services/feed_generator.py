@@ -1,13 +1,96 @@
-from typing import List
+import hashlib
+from datetime import datetime
+from typing import Iterable, Iterator, List
+from urllib.parse import urlencode
 
 from dateutil import tz
+from feedgen.entry import FeedEntry
 from feedgen.feed import FeedGenerator
+from lxml import etree
 from sqlalchemy.orm import Session
 
+from app.core import feed_cache
 from app.core.config import settings
-from app.crud.entries import get_all_entries, get_entries_by_newsletter
-from app.crud.newsletters import get_newsletter_by_identifier
+from app.core.database import ReadSessionLocal
+from app.core.feed_cache import MASTER_FEED_KEY, CachedFeed, FeedVersion
+from app.core.pagination import Cursor
+from app.crud.entries import (
+    get_all_entries,
+    get_entries_by_newsletter,
+    get_entries_stats,
+    get_entry_cursors,
+)
+from app.crud.newsletters import get_newsletter_by_identifier, get_newsletter_names
 from app.models.entries import Entry
+from app.models.newsletters import Newsletter
+
+# Number of entries fetched at a time when streaming a feed
+_STREAM_BATCH_SIZE = 20
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Return a timezone-aware datetime, assuming UTC for naive values."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=tz.tzutc())
+    return value
+
+
+def _make_version(
+    feed_key: str, page: int, count: int, latest: datetime | None, *extra: str
+) -> FeedVersion:
+    """Build the version of a feed page from its entry stats and metadata."""
+    page_size = settings.feed_page_size
+    last_page = max(1, -(-count // page_size))
+    fingerprint = "|".join(
+        [
+            feed_key,
+            str(page),
+            str(page_size),
+            str(count),
+            latest.isoformat() if latest else "",
+            *extra,
+        ]
+    )
+    etag = f'"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+    last_modified = _as_utc(latest) if latest else None
+    return FeedVersion(etag, last_modified, page, last_page)
+
+
+def get_feed_version(
+    db: Session, newsletter: Newsletter, page: int = 1, before: Cursor | None = None
+) -> FeedVersion:
+    """Compute the version of a newsletter feed page without loading entries."""
+    count, latest = get_entries_stats(db, newsletter.id)
+    senders = ",".join(sorted(s.email for s in newsletter.senders))
+    return _make_version(
+        newsletter.id,
+        page,
+        count,
+        latest,
+        newsletter.name,
+        newsletter.slug or "",
+        senders,
+        str(before or ""),
+    )
+
+
+def get_master_feed_version(
+    db: Session, page: int = 1, before: Cursor | None = None
+) -> FeedVersion:
+    """Compute the version of a master feed page without loading entries.
+
+    The entry titles include the newsletter names, so they are part of it.
+    """
+    count, latest = get_entries_stats(db)
+    names = ",".join(
+        f"{newsletter_id}={name}" for newsletter_id, name in get_newsletter_names(db)
+    )
+    return _make_version(MASTER_FEED_KEY, page, count, latest, names, str(before or ""))
+
+
+def get_cached_feed(feed_identifier: str, page: int = 1) -> CachedFeed | None:
+    """Look up a rendered feed page without touching the database."""
+    return feed_cache.get_feed(feed_identifier, page)
 
 
 def _create_feed_generator(
@@ -28,37 +111,106 @@ def _create_feed_generator(
     return fg
 
 
-def _add_entries_to_feed(
-    fg: FeedGenerator, entries: List[Entry], is_master_feed: bool = False
+def _page_url(feed_url: str, page: int) -> str:
+    """Return the URL of a page of a feed."""
+    return feed_url if page == 1 else f"{feed_url}?page={page}"
+
+
+def _before_url(feed_url: str, before: Cursor) -> str:
+    """Return the URL of the feed page following a cursor."""
+    return f"{feed_url}?{urlencode({'before': str(before)})}"
+
+
+def _add_keyset_links(
+    fg: FeedGenerator, feed_url: str, version: FeedVersion, next_cursor: Cursor | None
 ):
-    """Add a list of entries to a FeedGenerator instance."""
+    """Add links to a feed page requested with a ``before`` cursor."""
+    fg.link(href=feed_url, rel="first")
+    if next_cursor is not None:
+        fg.link(href=_before_url(feed_url, next_cursor), rel="next")
+    if version.last_modified:
+        fg.updated(version.last_modified)
+
+
+def _fetch_keyset_page(fetch, before: Cursor) -> tuple[List[Entry], Cursor | None]:
+    """Fetch the entries after a cursor and the cursor of the next page, if any."""
+    page_size = settings.feed_page_size
+    entries = fetch(limit=page_size + 1, before=before)
+    if len(entries) <= page_size:
+        return entries, None
+    entries = entries[:page_size]
+    return entries, Cursor(entries[-1].received_at, entries[-1].id)
+
+
+def _add_paging_links(fg: FeedGenerator, feed_url: str, version: FeedVersion):
+    """Add RFC 5005 paged feed links to a FeedGenerator instance."""
+    fg.link(href=_page_url(feed_url, 1), rel="first")
+    fg.link(href=_page_url(feed_url, version.last_page), rel="last")
+    if version.page > 1:
+        fg.link(href=_page_url(feed_url, version.page - 1), rel="previous")
+    if version.page < version.last_page:
+        fg.link(href=_page_url(feed_url, version.page + 1), rel="next")
+    if version.last_modified:
+        fg.updated(version.last_modified)
+
+
+def _render_entry(entry: Entry, is_master_feed: bool = False) -> bytes:
+    """Render the ``<entry>`` element of an entry, reusing a memoized rendering."""
+    title = (
+        f"[{entry.newsletter.name}] {entry.subject}"
+        if is_master_feed
+        else entry.subject
+    )
+    fragment = feed_cache.get_fragment(entry.id, title)
+    if fragment is not None:
+        return fragment
+
+    fe = FeedEntry()
+    fe.id(f"urn:letterfeed:entry:{entry.id}")
+    fe.title(title)
+    fe.content(entry.body, type="html")
+
+    received_at = _as_utc(entry.received_at)
+    fe.published(received_at)
+    fe.updated(received_at)
+
+    fragment = etree.tostring(
+        fe.atom_entry(), pretty_print=True, encoding="UTF-8", xml_declaration=False
+    )
+    feed_cache.set_fragment(entry.id, title, fragment)
+    return fragment
+
+
+def _iter_feed(
+    fg: FeedGenerator, entries: Iterable[Entry], is_master_feed: bool = False
+) -> Iterator[bytes]:
+    """Serialize a feed piece by piece, one ``<entry>`` element at a time."""
+    document = fg.atom_str(pretty=True)
+    end = document.rindex(b"</feed>")
+    yield document[:end]
     for entry in entries:
-        fe = fg.add_entry()
-        fe.id(f"urn:letterfeed:entry:{entry.id}")
-        fe.title(
-            f"[{entry.newsletter.name}] {entry.subject}"
-            if is_master_feed
-            else entry.subject
-        )
-        fe.content(entry.body, type="html")
+        yield _render_entry(entry, is_master_feed)
+    yield document[end:]
 
-        if entry.received_at.tzinfo is None:
-            timezone_aware_received_at = entry.received_at.replace(tzinfo=tz.tzutc())
-            fe.published(timezone_aware_received_at)
-            fe.updated(timezone_aware_received_at)
-        else:
-            fe.published(entry.received_at)
-            fe.updated(entry.received_at)
 
+def _serialize_feed(
+    fg: FeedGenerator, entries: List[Entry], is_master_feed: bool = False
+) -> bytes:
+    """Serialize a feed, splicing the rendered entries into the feed document."""
+    return b"".join(_iter_feed(fg, entries, is_master_feed))
 
-def generate_feed(db: Session, feed_identifier: str):
-    """Generate an Atom feed for a given newsletter."""
-    newsletter = get_newsletter_by_identifier(db, feed_identifier)
-    if not newsletter:
-        return None
 
-    entries = get_entries_by_newsletter(db, newsletter.id)
+def _self_url(feed_url: str, version: FeedVersion, before: Cursor | None) -> str:
+    """Return the URL of the requested feed page."""
+    return (
+        _before_url(feed_url, before) if before else _page_url(feed_url, version.page)
+    )
 
+
+def _newsletter_feed_generator(
+    newsletter: Newsletter, version: FeedVersion, before: Cursor | None
+) -> tuple[FeedGenerator, str]:
+    """Create the FeedGenerator of a newsletter feed page and return its feed URL."""
     feed_url = f"{settings.app_base_url}/feeds/{newsletter.slug or newsletter.id}"
     sender_emails = ", ".join([s.email for s in newsletter.senders])
     description = f"A feed of newsletters from {sender_emails}"
@@ -66,28 +218,183 @@ def generate_feed(db: Session, feed_identifier: str):
     fg = _create_feed_generator(
         feed_id=f"urn:letterfeed:newsletter:{newsletter.id}",
         title=newsletter.name,
-        feed_url=feed_url,
+        feed_url=_self_url(feed_url, version, before),
         description=description,
     )
+    return fg, feed_url
 
-    _add_entries_to_feed(fg, entries)
-
-    return fg.atom_str(pretty=True)
-
-
-def generate_master_feed(db: Session):
-    """Generate a master Atom feed for all newsletters."""
-    entries = get_all_entries(db)
 
+def _master_feed_generator(
+    version: FeedVersion, before: Cursor | None
+) -> tuple[FeedGenerator, str]:
+    """Create the FeedGenerator of a master feed page and return its feed URL."""
     feed_url = f"{settings.app_base_url}/feeds/all"
-
     fg = _create_feed_generator(
         feed_id="urn:letterfeed:master",
         title="LetterFeed: All Newsletters",
-        feed_url=feed_url,
+        feed_url=_self_url(feed_url, version, before),
         description="A master feed of all your newsletters.",
     )
+    return fg, feed_url
+
+
+def render_feed(
+    db: Session,
+    newsletter: Newsletter,
+    version: FeedVersion,
+    before: Cursor | None = None,
+) -> bytes:
+    """Render one page of a newsletter feed, reusing a cached rendering.
+
+    Pages requested with a ``before`` cursor are rendered without caching.
+    """
+    if before is None:
+        cached = feed_cache.get_feed(newsletter.id, version.page, version.etag)
+        if cached is not None:
+            return cached.xml
+
+    fg, feed_url = _newsletter_feed_generator(newsletter, version, before)
+
+    if before is not None:
+        entries, next_cursor = _fetch_keyset_page(
+            lambda **kwargs: get_entries_by_newsletter(db, newsletter.id, **kwargs),
+            before,
+        )
+        _add_keyset_links(fg, feed_url, version, next_cursor)
+        return _serialize_feed(fg, entries)
+
+    page_size = settings.feed_page_size
+    entries = get_entries_by_newsletter(
+        db, newsletter.id, skip=(version.page - 1) * page_size, limit=page_size
+    )
+    _add_paging_links(fg, feed_url, version)
+
+    xml = _serialize_feed(fg, entries)
+    feed_cache.set_feed(newsletter.id, version, xml, aliases=(newsletter.slug,))
+    return xml
+
+
+def render_master_feed(
+    db: Session, version: FeedVersion, before: Cursor | None = None
+) -> bytes:
+    """Render one page of the master feed, reusing a cached rendering.
+
+    Pages requested with a ``before`` cursor are rendered without caching.
+    """
+    if before is None:
+        cached = feed_cache.get_feed(MASTER_FEED_KEY, version.page, version.etag)
+        if cached is not None:
+            return cached.xml
+
+    fg, feed_url = _master_feed_generator(version, before)
+
+    if before is not None:
+        entries, next_cursor = _fetch_keyset_page(
+            lambda **kwargs: get_all_entries(db, **kwargs), before
+        )
+        _add_keyset_links(fg, feed_url, version, next_cursor)
+        return _serialize_feed(fg, entries, is_master_feed=True)
+
+    page_size = settings.feed_page_size
+    entries = get_all_entries(db, skip=(version.page - 1) * page_size, limit=page_size)
+    _add_paging_links(fg, feed_url, version)
+
+    xml = _serialize_feed(fg, entries, is_master_feed=True)
+    feed_cache.set_feed(MASTER_FEED_KEY, version, xml)
+    return xml
+
+
+def _stream_page(
+    db: Session,
+    fg: FeedGenerator,
+    feed_url: str,
+    version: FeedVersion,
+    before: Cursor | None,
+    newsletter_id: str | None = None,
+) -> Iterable[Entry]:
+    """Add the paging links of a feed page and return an iterator of its entries.
+
+    Only the keys of the page are looked up ahead of streaming, to link the
+    next page of a ``before`` cursor.
+    """
+    page_size = settings.feed_page_size
+    if before is not None:
+        cursors = get_entry_cursors(
+            db, newsletter_id, skip=page_size - 1, limit=2, before=before
+        )
+        next_cursor = cursors[0] if len(cursors) == 2 else None
+        _add_keyset_links(fg, feed_url, version, next_cursor)
+        skip = 0
+    else:
+        _add_paging_links(fg, feed_url, version)
+        skip = (version.page - 1) * page_size
+
+    if newsletter_id is None:
+        return get_all_entries(
+            db,
+            skip=skip,
+            limit=page_size,
+            before=before,
+            batch_size=_STREAM_BATCH_SIZE,
+        )
+    return get_entries_by_newsletter(
+        db,
+        newsletter_id,
+        skip=skip,
+        limit=page_size,
+        before=before,
+        batch_size=_STREAM_BATCH_SIZE,
+    )
+
+
+def stream_feed(
+    newsletter_id: str, version: FeedVersion, before: Cursor | None = None
+) -> Iterator[bytes]:
+    """Stream one page of a newsletter feed without holding it in memory.
+
+    Uses its own read-only session, as the response outlives the request's
+    session. Streamed pages are not cached.
+    """
+    with ReadSessionLocal() as db:
+        newsletter = get_newsletter_by_identifier(db, newsletter_id)
+        if newsletter is None:
+            return
+        fg, feed_url = _newsletter_feed_generator(newsletter, version, before)
+        entries = _stream_page(db, fg, feed_url, version, before, newsletter.id)
+        yield from _iter_feed(fg, entries)
+
+
+def stream_master_feed(
+    version: FeedVersion, before: Cursor | None = None
+) -> Iterator[bytes]:
+    """Stream one page of the master feed without holding it in memory.
+
+    Uses its own read-only session, as the response outlives the request's
+    session. Streamed pages are not cached.
+    """
+    with ReadSessionLocal() as db:
+        fg, feed_url = _master_feed_generator(version, before)
+        entries = _stream_page(db, fg, feed_url, version, before)
+        yield from _iter_feed(fg, entries, is_master_feed=True)
+
+
+def generate_feed(db: Session, feed_identifier: str, page: int = 1):
+    """Generate one page of an Atom feed for a given newsletter."""
+    cached = get_cached_feed(feed_identifier, page)
+    if cached is not None:
+        return cached.xml
+
+    newsletter = get_newsletter_by_identifier(db, feed_identifier)
+    if not newsletter:
+        return None
+
+    return render_feed(db, newsletter, get_feed_version(db, newsletter, page))
+
 
-    _add_entries_to_feed(fg, entries, is_master_feed=True)
+def generate_master_feed(db: Session, page: int = 1):
+    """Generate one page of a master Atom feed for all newsletters."""
+    cached = get_cached_feed(MASTER_FEED_KEY, page)
+    if cached is not None:
+        return cached.xml
 
-    return fg.atom_str(pretty=True)
+    return render_master_feed(db, get_master_feed_version(db, page))
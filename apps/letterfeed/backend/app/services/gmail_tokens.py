@@ -0,0 +1,179 @@
+"""In-memory cache of Gmail OAuth2 access tokens with single-flight refresh.
+
+Tokens are decrypted once per account and kept in memory until they expire.
+Once a token enters the last ``LETTERFEED_GMAIL_TOKEN_REFRESH_MARGIN`` seconds
+of its lifetime, a new one is fetched in the background while the current one
+is still handed out. Concurrent refreshes of an account share one call to
+Google, so checking many folders at once costs at most one refresh.
+"""
+
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import UTC, datetime
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.core import cache_sync
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.encryption import decrypt_token
+from app.core.logging import get_logger
+from app.crud.oauth2 import get_oauth2_credential, update_oauth2_tokens
+from app.services.oauth2 import refresh_access_token
+
+logger = get_logger(__name__)
+
+# Tokens with less validity left are refreshed before they are handed out
+_MIN_TOKEN_VALIDITY = 60
+CACHE_KIND = "gmail_tokens"
+
+
+class GmailTokenError(RuntimeError):
+    """A Gmail access token could not be decrypted or refreshed."""
+
+
+def _as_utc(expiry: datetime | None) -> datetime | None:
+    """Return a timezone-aware expiry, assuming UTC for naive values.
+
+    Google and the database both hand out naive expiries in UTC.
+    """
+    if expiry is None or expiry.tzinfo is not None:
+        return expiry
+    return expiry.replace(tzinfo=UTC)
+
+
+class _CachedToken(NamedTuple):
+    access_token: str
+    refresh_token: str
+    # Timezone-aware
+    expiry: datetime | None
+
+    def seconds_left(self) -> float:
+        """Return the seconds until the token expires."""
+        if self.expiry is None:
+            return float("inf")
+        return (self.expiry - datetime.now(UTC)).total_seconds()
+
+
+class GmailTokenManager:
+    """Hands out valid access tokens of connected Gmail accounts."""
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._tokens: dict[str, _CachedToken] = {}
+        self._refreshes: dict[str, Future[_CachedToken]] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="gmail-token"
+        )
+
+    def get_access_token(self, db: Session, email: str) -> str | None:
+        """Return a valid access token, or None if the account is not connected.
+
+        Raises:
+            GmailTokenError: If the tokens cannot be decrypted or refreshed.
+        """
+        cache_sync.poll()
+        with self._lock:
+            token = self._tokens.get(email)
+        if token is None:
+            token = self._load(db, email)
+            if token is None:
+                return None
+
+        seconds_left = token.seconds_left()
+        if seconds_left <= _MIN_TOKEN_VALIDITY:
+            token = self._refresh(email, token).result()
+        elif seconds_left <= settings.gmail_token_refresh_margin:
+            self._refresh(email, token)
+        return token.access_token
+
+    def invalidate(self, email: str) -> None:
+        """Forget the cached token of an account in all processes.
+
+        Called e.g. after the account was reconnected or disconnected.
+        """
+        self.invalidate_local(email)
+        cache_sync.publish(CACHE_KIND, email)
+
+    def invalidate_local(self, email: str | None) -> None:
+        """Forget the cached token of an account, or all tokens, in this process."""
+        with self._lock:
+            if email is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(email, None)
+
+    def _load(self, db: Session, email: str) -> _CachedToken | None:
+        """Decrypt the stored tokens of an account into the cache."""
+        with self._load_lock:
+            with self._lock:
+                token = self._tokens.get(email)
+            if token is not None:
+                return token
+
+            credential = get_oauth2_credential(db, email)
+            if not credential:
+                return None
+            try:
+                token = _CachedToken(
+                    decrypt_token(credential.encrypted_access_token),
+                    decrypt_token(credential.encrypted_refresh_token),
+                    _as_utc(credential.token_expiry),
+                )
+            except Exception as e:
+                raise GmailTokenError("Failed to decrypt Gmail OAuth2 tokens") from e
+            with self._lock:
+                self._tokens[email] = token
+            return token
+
+    def _refresh(self, email: str, token: _CachedToken) -> Future[_CachedToken]:
+        """Start refreshing a token, unless a refresh is already under way."""
+        with self._lock:
+            future = self._refreshes.get(email)
+            if future is None:
+                logger.info(f"Refreshing Gmail access token of {email}")
+                future = self._executor.submit(self._run_refresh, email, token)
+                self._refreshes[email] = future
+            return future
+
+    def _run_refresh(self, email: str, token: _CachedToken) -> _CachedToken:
+        """Fetch a new access token from Google and store it."""
+        try:
+            if not settings.google_client_secrets_json:
+                raise GmailTokenError("Google OAuth2 client secrets not configured.")
+            client_secrets = json.loads(settings.google_client_secrets_json)
+            try:
+                access_token, expiry = refresh_access_token(
+                    client_secrets, token.refresh_token
+                )
+            except Exception as e:
+                raise GmailTokenError(
+                    f"Failed to refresh Gmail access token: {e}"
+                ) from e
+
+            with SessionLocal() as db:
+                update_oauth2_tokens(db, email, access_token, expiry)
+            refreshed = token._replace(
+                access_token=access_token, expiry=_as_utc(expiry)
+            )
+            with self._lock:
+                self._tokens[email] = refreshed
+            return refreshed
+        except Exception as e:
+            logger.warning(f"Refreshing Gmail access token of {email} failed: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._refreshes.pop(email, None)
+
+    def clear(self) -> None:
+        """Forget all cached tokens."""
+        self.invalidate_local(None)
+
+
+gmail_tokens = GmailTokenManager()
+cache_sync.register(CACHE_KIND, gmail_tokens.invalidate_local)
@@ -0,0 +1,36 @@
+"""Resolve the credentials used to log in to the configured IMAP server."""
+
+from sqlalchemy.orm import Session
+
+from app.core.imap_client import ImapCredentials
+from app.schemas.settings import Settings
+from app.services.gmail_tokens import GmailTokenError, gmail_tokens
+
+GMAIL_IMAP_SERVER = "imap.gmail.com"
+
+
+class ImapAuthError(RuntimeError):
+    """The stored credentials cannot be used to log in."""
+
+
+def get_imap_credentials(db: Session, settings: Settings) -> ImapCredentials:
+    """Build the credentials for the IMAP server in the settings.
+
+    Gmail accounts connected with OAuth2 log in with XOAUTH2, all others with
+    the password.
+
+    Raises:
+        ImapAuthError: If the OAuth2 tokens cannot be decrypted or refreshed.
+    """
+    oauth2_token = None
+    if settings.imap_server.strip().lower() == GMAIL_IMAP_SERVER:
+        try:
+            oauth2_token = gmail_tokens.get_access_token(db, settings.imap_username)
+        except GmailTokenError as e:
+            raise ImapAuthError(str(e)) from e
+    return ImapCredentials(
+        server=settings.imap_server,
+        username=settings.imap_username,
+        password=settings.imap_password,
+        oauth2_token=oauth2_token,
+    )
@@ -0,0 +1,313 @@
+"""Long-lived IMAP sessions that react to new emails with IDLE.
+
+Instead of waiting for the next scheduled check, one watcher thread per search
+folder keeps an authenticated session open and waits for the server to push
+new emails (RFC 2177 IDLE). Servers without IDLE support are polled with NOOP.
+Dropped connections are re-established with exponential backoff.
+"""
+
+import imaplib
+import re
+import select
+import ssl
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings as app_settings
+from app.core.database import SessionLocal
+from app.core.logging import get_logger
+from app.crud.settings import get_settings
+from app.schemas.settings import Settings
+from app.services.email_processor import (
+    _connect_to_imap,
+    get_search_folders,
+    process_folder_emails,
+)
+
+logger = get_logger(__name__)
+
+_EXISTS_PATTERN = re.compile(rb"\* \d+ EXISTS")
+_IDLE_TAG = b"LFIDLE"
+# How often a waiting watcher checks whether it has been stopped, in seconds
+_STOP_CHECK_INTERVAL = 1.0
+_MIN_BACKOFF = 1.0
+
+
+def _is_alive(mail: imaplib.IMAP4_SSL) -> bool:
+    """Check whether an IMAP session is still usable."""
+    try:
+        status, _ = mail.noop()
+    except (imaplib.IMAP4.error, OSError):
+        return False
+    return status == "OK"
+
+
+def _logout(mail: imaplib.IMAP4_SSL) -> None:
+    """Log out of an IMAP session, ignoring errors of broken connections."""
+    try:
+        mail.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
+
+
+class ImapSessionPool:
+    """Keeps one authenticated IMAP session per search folder."""
+
+    def __init__(self):
+        """Initialize an empty pool."""
+        self._lock = threading.Lock()
+        self._sessions: dict[str, imaplib.IMAP4_SSL] = {}
+
+    def get(
+        self, db: Session, settings: Settings, search_folder: str
+    ) -> imaplib.IMAP4_SSL | None:
+        """Return a live session for a folder, reconnecting if necessary."""
+        with self._lock:
+            mail = self._sessions.get(search_folder)
+        if mail is not None and _is_alive(mail):
+            return mail
+
+        if mail is not None:
+            self.discard(search_folder, mail)
+        mail = _connect_to_imap(db, settings, search_folder)
+        if mail is not None:
+            with self._lock:
+                self._sessions[search_folder] = mail
+        return mail
+
+    def discard(
+        self, search_folder: str, mail: imaplib.IMAP4_SSL | None = None
+    ) -> None:
+        """Close and forget the session of a folder.
+
+        If ``mail`` is given, the pooled session is only discarded if it is
+        that session, so a stale caller cannot close a newer session.
+        """
+        with self._lock:
+            pooled = self._sessions.get(search_folder)
+            if pooled is None or (mail is not None and pooled is not mail):
+                return
+            del self._sessions[search_folder]
+        _logout(pooled)
+
+    def close_all(self) -> None:
+        """Close all sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for mail in sessions:
+            _logout(mail)
+
+
+def _read_line(mail: imaplib.IMAP4_SSL) -> bytes:
+    """Read a response line, failing if the server closed the connection."""
+    line = mail.readline()
+    if not line:
+        raise imaplib.IMAP4.abort("IMAP connection closed by server")
+    return line
+
+
+def _has_buffered_response(mail: imaplib.IMAP4_SSL) -> bool:
+    """Check whether response data was received that select would not report.
+
+    imaplib reads through a buffered file on top of the TLS connection, so
+    data it read ahead, or that the SSL object already decrypted, does not
+    make the socket readable.
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.settimeout(0.0)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+
+def _idle(mail: imaplib.IMAP4_SSL, timeout: float, stop: threading.Event) -> bool:
+    """Wait in IDLE until new emails arrive, the timeout expires or stop is set.
+
+    Returns True if the server reported new emails.
+    """
+    mail.send(_IDLE_TAG + b" IDLE\r\n")
+    line = _read_line(mail)
+    if not line.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected by server: {line!r}")
+
+    changed = False
+    deadline = time.monotonic() + timeout
+    try:
+        while not changed and not stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            readable = _has_buffered_response(mail)
+            if not readable:
+                readable, _, _ = select.select(
+                    [mail.sock], [], [], min(remaining, _STOP_CHECK_INTERVAL)
+                )
+            if readable:
+                changed = bool(_EXISTS_PATTERN.match(_read_line(mail)))
+    finally:
+        mail.send(b"DONE\r\n")
+        while not _read_line(mail).startswith(_IDLE_TAG):
+            pass
+    return changed
+
+
+def _poll(mail: imaplib.IMAP4_SSL, interval: float, stop: threading.Event) -> bool:
+    """Wait for an interval, then check for new emails with NOOP.
+
+    Returns True if the server reported new emails.
+    """
+    if stop.wait(interval):
+        return False
+    # Drop any EXISTS response left over from SELECT or an earlier check.
+    mail.response("EXISTS")
+    status, _ = mail.noop()
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"NOOP failed with status: {status}")
+    _, data = mail.response("EXISTS")
+    return data != [None]
+
+
+def wait_for_new_emails(mail: imaplib.IMAP4_SSL, stop: threading.Event) -> bool:
+    """Block until the selected folder may have new emails, or stop is set."""
+    if "IDLE" in mail.capabilities:
+        return _idle(mail, app_settings.imap_idle_timeout, stop)
+    return _poll(mail, app_settings.imap_noop_interval, stop)
+
+
+class FolderWatcher(threading.Thread):
+    """Processes the new emails of a folder as soon as the server reports them."""
+
+    def __init__(self, search_folder: str, pool: ImapSessionPool):
+        """Initialize a watcher for a folder, using sessions from the pool."""
+        super().__init__(name=f"imap-idle-{search_folder}", daemon=True)
+        self.search_folder = search_folder
+        self.pool = pool
+        self._stop_event = threading.Event()
+        self._mail: imaplib.IMAP4_SSL | None = None
+        self._connected = threading.Event()
+
+    @property
+    def connected(self) -> bool:
+        """Whether the watcher is waiting for new emails on an open session."""
+        return self._connected.is_set()
+
+    def stop(self) -> None:
+        """Ask the watcher to stop after its current wait."""
+        self._stop_event.set()
+
+    def _connect(self) -> imaplib.IMAP4_SSL:
+        """Get a session for the watched folder from the pool."""
+        with SessionLocal() as db:
+            settings = get_settings(db, with_password=True)
+            mail = self.pool.get(db, settings, self.search_folder)
+        if mail is None:
+            raise ConnectionError(f"Could not connect to folder '{self.search_folder}'")
+        return mail
+
+    def _process(self, mail: imaplib.IMAP4_SSL) -> None:
+        """Process the unread emails of the watched folder."""
+        with SessionLocal() as db:
+            process_folder_emails(db, self.search_folder, mail)
+
+    def run(self) -> None:
+        """Watch the folder until stopped, reconnecting with backoff."""
+        logger.info(f"Watching folder '{self.search_folder}' for new emails")
+        backoff = _MIN_BACKOFF
+        while not self._stop_event.is_set():
+            try:
+                mail = self._mail = self._connect()
+                # Catch up on emails that arrived while not watching.
+                self._process(mail)
+                self._connected.set()
+                backoff = _MIN_BACKOFF
+                while not self._stop_event.is_set():
+                    if wait_for_new_emails(mail, self._stop_event):
+                        logger.info(f"New emails in folder '{self.search_folder}'")
+                        self._process(mail)
+                    elif not self._stop_event.is_set():
+                        # Scheduled checks skip this folder, so retry failed
+                        # emails whenever a wait ends without news.
+                        self._process(mail)
+            except Exception as e:
+                self._connected.clear()
+                logger.warning(
+                    f"Watcher for folder '{self.search_folder}' failed: {e}, "
+                    f"reconnecting in {backoff:.0f}s"
+                )
+                if self._mail is not None:
+                    self.pool.discard(self.search_folder, self._mail)
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, app_settings.imap_reconnect_max_backoff)
+        self._connected.clear()
+        if self._mail is not None:
+            self.pool.discard(self.search_folder, self._mail)
+        logger.info(f"Stopped watching folder '{self.search_folder}'")
+
+
+class ImapIdleManager:
+    """Runs one FolderWatcher per folder that needs to be checked."""
+
+    def __init__(self):
+        """Initialize a manager without any watchers."""
+        self.pool = ImapSessionPool()
+        self._lock = threading.Lock()
+        self._watchers: dict[str, FolderWatcher] = {}
+        self._account: tuple[str, str] | None = None
+
+    @property
+    def folders(self) -> list[str]:
+        """Return the folders currently being watched."""
+        with self._lock:
+            return list(self._watchers)
+
+    @property
+    def connected_folders(self) -> set[str]:
+        """Return the folders whose watchers are waiting for new emails."""
+        with self._lock:
+            return {
+                folder
+                for folder, watcher in self._watchers.items()
+                if watcher.connected
+            }
+
+    def sync(self, db: Session) -> None:
+        """Start and stop watchers to match the current settings and newsletters."""
+        settings = get_settings(db)
+        account = (settings.imap_server, settings.imap_username) if settings else None
+        folders = set(get_search_folders(db))
+
+        with self._lock:
+            if account != self._account:
+                # Sessions of the previous account cannot be reused.
+                self._stop_watchers(list(self._watchers))
+                self._account = account
+            self._stop_watchers([f for f in self._watchers if f not in folders])
+            for folder in folders - self._watchers.keys():
+                watcher = FolderWatcher(folder, self.pool)
+                self._watchers[folder] = watcher
+                watcher.start()
+
+    def _stop_watchers(self, folders: list[str]) -> None:
+        """Stop the watchers of the given folders. Must be called with the lock held."""
+        for folder in folders:
+            # The watcher closes its own session once it notices it was stopped.
+            self._watchers.pop(folder).stop()
+
+    def stop(self) -> None:
+        """Stop all watchers and close their sessions."""
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._stop_watchers(list(self._watchers))
+            self._account = None
+        for watcher in watchers:
+            watcher.join(timeout=_STOP_CHECK_INTERVAL * 5)
+        self.pool.close_all()
+
+
+idle_manager = ImapIdleManager()
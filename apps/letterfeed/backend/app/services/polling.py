@@ -0,0 +1,200 @@
+"""Adaptive polling of IMAP folders based on when their newsletters arrive.
+
+Instead of checking every folder at ``email_check_interval``, each newsletter's
+typical gap between two emails is learned from the ``received_at`` history of
+its entries. A folder is checked about ``LETTERFEED_POLLING_CHECKS_PER_GAP``
+times per gap of its most frequent newsletter, within
+``LETTERFEED_POLLING_MIN_INTERVAL`` and ``LETTERFEED_POLLING_MAX_INTERVAL``
+minutes, and with some jitter so folders do not synchronize. Newsletters
+without enough history, and new senders in the default folder when they are
+added automatically, keep the folder at ``email_check_interval`` at most.
+Newsletters that stopped sending let their folder slow down to the maximum.
+"""
+
+import random
+import statistics
+from collections.abc import Collection
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings as app_settings
+from app.core.logging import get_logger
+from app.core.sender_routing import NewsletterRoute, sender_routing
+from app.crud.imap_folders import get_folder_schedules, record_folder_check
+from app.crud.settings import get_settings
+from app.models.entries import Entry
+from app.schemas.settings import Settings
+from app.services.email_processor import get_search_folders, process_emails
+
+logger = get_logger(__name__)
+
+# Number of recent entries of a newsletter its cadence is learned from
+_HISTORY_SIZE = 20
+# A newsletter needs at least this many gaps between entries to be learned from
+_MIN_GAPS = 2
+# A newsletter silent for this many of its typical gaps is considered dormant
+_DORMANT_GAPS = 4
+
+
+class NewsletterCadence(NamedTuple):
+    """How often a newsletter arrives and how often it needs to be checked for."""
+
+    newsletter_id: str
+    name: str
+    typical_gap: timedelta | None
+    latest_received_at: datetime | None
+    interval: timedelta
+
+
+class FolderPlan(NamedTuple):
+    """How often a folder is checked and when it is checked next."""
+
+    folder: str
+    interval: timedelta
+    newsletters: list[NewsletterCadence]
+    last_checked_at: datetime | None
+    next_check_at: datetime | None
+
+
+def _load_history(db: Session) -> dict[str, list[datetime]]:
+    """Load the recent arrival times of all newsletters, newest first."""
+    position = (
+        func.row_number()
+        .over(partition_by=Entry.newsletter_id, order_by=Entry.received_at.desc())
+        .label("position")
+    )
+    recent = select(Entry.newsletter_id, Entry.received_at, position).subquery()
+    rows = db.execute(
+        select(recent.c.newsletter_id, recent.c.received_at)
+        .where(recent.c.position <= _HISTORY_SIZE)
+        .order_by(recent.c.newsletter_id, recent.c.received_at.desc())
+    )
+    history: dict[str, list[datetime]] = {}
+    for newsletter_id, received_at in rows:
+        if received_at is not None:
+            # Stored without offset, compare as wall-clock times
+            history.setdefault(newsletter_id, []).append(
+                received_at.replace(tzinfo=None)
+            )
+    return history
+
+
+def _clamp(interval: timedelta) -> timedelta:
+    """Keep a check interval within the configured bounds."""
+    lower = timedelta(minutes=app_settings.polling_min_interval)
+    upper = timedelta(minutes=app_settings.polling_max_interval)
+    return max(lower, min(interval, upper))
+
+
+def estimate_cadence(
+    route: NewsletterRoute,
+    received: list[datetime],
+    default: timedelta,
+    now: datetime,
+) -> NewsletterCadence:
+    """Learn how often a newsletter needs to be checked for from its arrivals.
+
+    Args:
+        route: The newsletter.
+        received: Its recent arrival times, newest first.
+        default: The interval used while too little history is known.
+        now: The current time.
+    """
+    latest = received[0] if received else None
+    gaps = [
+        (newer - older).total_seconds()
+        for newer, older in zip(received, received[1:])
+        if newer > older
+    ]
+    if len(gaps) < _MIN_GAPS:
+        return NewsletterCadence(route.id, route.name, None, latest, default)
+
+    typical_gap = timedelta(seconds=statistics.median(gaps))
+    if latest is not None and now - latest > typical_gap * _DORMANT_GAPS:
+        interval = timedelta(minutes=app_settings.polling_max_interval)
+    else:
+        interval = _clamp(typical_gap / app_settings.polling_checks_per_gap)
+    return NewsletterCadence(route.id, route.name, typical_gap, latest, interval)
+
+
+def plan_folders(
+    db: Session, settings: Settings, now: datetime | None = None
+) -> list[FolderPlan]:
+    """Work out how often each folder that needs to be checked is checked."""
+    folders = get_search_folders(db)
+    if not folders:
+        return []
+    now = now or datetime.now()
+    default = _clamp(timedelta(minutes=settings.email_check_interval))
+    history = _load_history(db)
+    groups = sender_routing.folder_groups(db, settings.search_folder)
+    schedules = get_folder_schedules(db, settings.imap_username)
+
+    plans = []
+    for folder in folders:
+        newsletters = [
+            estimate_cadence(route, history.get(route.id, []), default, now)
+            for route in groups.get(folder, [])
+        ]
+        intervals = [cadence.interval for cadence in newsletters]
+        if folder == settings.search_folder and settings.auto_add_new_senders:
+            # Emails of new senders may arrive at any time.
+            intervals.append(default)
+        schedule = schedules.get(folder)
+        plans.append(
+            FolderPlan(
+                folder,
+                min(intervals, default=default),
+                newsletters,
+                schedule.last_checked_at if schedule else None,
+                schedule.next_check_at if schedule else None,
+            )
+        )
+    return plans
+
+
+def _next_check_at(checked_at: datetime, interval: timedelta) -> datetime:
+    """Schedule the next check of a folder, with jitter."""
+    jitter = app_settings.polling_jitter
+    return checked_at + interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def process_due_folders(db: Session, skip: Collection[str] = ()) -> list[str]:
+    """Check the folders whose next check is due and schedule their next one.
+
+    Folders in ``skip``, e.g. those watched with IDLE, are not checked.
+
+    Returns:
+        The folders that were checked.
+    """
+    settings = get_settings(db, with_password=True)
+    now = datetime.now()
+    due = [
+        plan
+        for plan in plan_folders(db, settings, now)
+        if (plan.next_check_at is None or plan.next_check_at <= now)
+        and plan.folder not in skip
+    ]
+    if not due:
+        logger.debug("No folder is due for a check")
+        return []
+
+    folders = [plan.folder for plan in due]
+    process_emails(db, folders)
+    for plan in due:
+        record_folder_check(
+            db,
+            settings.imap_username,
+            plan.folder,
+            now,
+            int(plan.interval.total_seconds()),
+            _next_check_at(now, plan.interval),
+        )
+        logger.info(
+            f"Checking folder '{plan.folder}' every "
+            f"{plan.interval.total_seconds() / 60:.0f} minutes"
+        )
+    return folders
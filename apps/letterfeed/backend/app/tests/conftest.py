@@ -7,8 +7,11 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import sessionmaker
 
+from app.core import feed_cache, settings_cache
 from app.core.database import Base, engine, get_db
+from app.core.sender_routing import sender_routing
 from app.main import app
+from app.services.gmail_tokens import gmail_tokens
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -24,6 +27,10 @@ def setup_and_teardown_db():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    feed_cache.clear()
+    gmail_tokens.clear()
+    settings_cache.invalidate_local()
+    sender_routing.invalidate_local()
 
 
 @pytest.fixture(name="db_session")
@@ -54,13 +61,15 @@ def cleanup_test_db(request):
     """Clean up the test database after the test session.
 
     This fixture is automatically used once per test session. It registers a
-    finalizer to remove the test database file after all tests have run.
+    finalizer to remove the test database file, along with its WAL and
+    shared-memory files, after all tests have run.
     """
 
     def remove_test_db():
+        engine.dispose()
         # The path is relative to the backend directory where pytest is run
-        db_file = "test.db"
-        if os.path.exists(db_file):
-            os.remove(db_file)
+        for db_file in ("test.db", "test.db-wal", "test.db-shm"):
+            if os.path.exists(db_file):
+                os.remove(db_file)
 
     request.addfinalizer(remove_test_db)
@@ -0,0 +1,143 @@
+"""A minimal in-process IMAP server for testing the asyncio IMAP client."""
+
+import asyncio
+import base64
+import re
+
+from app.core.imap_client import ImapCredentials
+
+_COMMAND_PATTERN = re.compile(rb"^(\S+) (\S+)(?: (.*))?$")
+_ARGUMENT_PATTERN = re.compile(rb'"((?:[^"\\]|\\.)*)"|(\S+)')
+
+
+def _arguments(text: bytes) -> list[str]:
+    """Split the arguments of a command, unquoting quoted strings."""
+    return [
+        re.sub(rb"\\(.)", rb"\1", quoted).decode() if atom is None else atom.decode()
+        for quoted, atom in (
+            (match.group(1), match.group(2))
+            for match in _ARGUMENT_PATTERN.finditer(text)
+        )
+    ]
+
+
+class StubImapServer:
+    """Serves a fixed set of folders to one user, over plain TCP.
+
+    Records the commands it received in ``commands`` and the number of
+    connections in ``connections``. Commands listed in ``stall`` are never
+    answered, to simulate a hung server.
+    """
+
+    def __init__(
+        self,
+        username: str = "user",
+        password: str = "pass",
+        access_token: str = "token",
+        folders: dict[str, int] | None = None,
+        stall: set[str] | None = None,
+    ):
+        """Initialize a server that has not started yet."""
+        self.username = username
+        self.password = password
+        self.access_token = access_token
+        self.folders = folders if folders is not None else {"INBOX": 2}
+        self.stall = stall or set()
+        self.commands: list[str] = []
+        self.connections = 0
+        self._server: asyncio.Server | None = None
+
+    @property
+    def port(self) -> int:
+        """The port the server listens on."""
+        return self._server.sockets[0].getsockname()[1]
+
+    def credentials(self, **overrides) -> ImapCredentials:
+        """Build client credentials for this server."""
+        values = {
+            "server": "127.0.0.1",
+            "username": self.username,
+            "password": self.password,
+            "port": self.port,
+            "use_ssl": False,
+        }
+        return ImapCredentials(**values | overrides)
+
+    async def __aenter__(self) -> "StubImapServer":
+        """Start listening on a free local port."""
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Stop the server and close all connections."""
+        self._server.close()
+        self._server.close_clients()
+        await self._server.wait_closed()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve one client connection."""
+        self.connections += 1
+        writer.write(b"* OK IMAP4rev1 stub ready\r\n")
+        try:
+            while line := await reader.readline():
+                match = _COMMAND_PATTERN.match(line.rstrip(b"\r\n"))
+                tag, command = match.group(1), match.group(2).decode().upper()
+                self.commands.append(command)
+                if command in self.stall:
+                    continue
+                response = await self._respond(
+                    command, _arguments(match.group(3) or b""), reader, writer
+                )
+                writer.write(tag + b" " + response + b"\r\n")
+                await writer.drain()
+                if command == "LOGOUT":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(
+        self,
+        command: str,
+        args: list[str],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> bytes:
+        """Run a command and return its tagged completion."""
+        if command == "CAPABILITY":
+            writer.write(b"* CAPABILITY IMAP4rev1 AUTH=XOAUTH2 IDLE\r\n")
+        elif command == "LOGIN":
+            if args != [self.username, self.password]:
+                return b"NO [AUTHENTICATIONFAILED] Invalid credentials"
+        elif command == "AUTHENTICATE":
+            writer.write(b"+ \r\n")
+            response = base64.b64decode(await reader.readline())
+            expected = (
+                f"user={self.username}\x01auth=Bearer {self.access_token}\x01\x01"
+            )
+            if response != expected.encode():
+                return b"NO [AUTHENTICATIONFAILED] Invalid token"
+        elif command == "LIST":
+            for name in self.folders:
+                literal = name.encode()
+                # Names with spaces are sent as literals to exercise parsing.
+                if " " in name:
+                    writer.write(
+                        b'* LIST (\\HasNoChildren) "/" {%d}\r\n' % len(literal)
+                    )
+                    writer.write(literal + b"\r\n")
+                else:
+                    writer.write(b'* LIST (\\HasNoChildren) "/" "%s"\r\n' % literal)
+        elif command == "SELECT":
+            if args[0] not in self.folders:
+                return b"NO Mailbox does not exist"
+            writer.write(b"* %d EXISTS\r\n" % self.folders[args[0]])
+            return b"OK [READ-WRITE] SELECT completed"
+        elif command == "LOGOUT":
+            writer.write(b"* BYE Logging out\r\n")
+        elif command != "NOOP":
+            return b"BAD Unknown command"
+        return f"OK {command} completed".encode()
@@ -1,8 +1,11 @@
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
+from app.core.database import engine
 from app.crud.settings import create_or_update_settings
 from app.schemas.settings import SettingsCreate
 
@@ -168,3 +171,37 @@ def test_auth_with_env_vars(client: TestClient):
         response = client.get("/auth/status")
         assert response.status_code == 200
         assert response.json() == {"auth_enabled": True}
+
+
+def test_protected_route_skips_database_and_verified_tokens(
+    client: TestClient, db_session: Session
+):
+    """Test that repeated authenticated requests neither read settings nor re-verify."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com",
+            imap_username="test",
+            auth_username="admin",
+            auth_password="password",
+        ),
+    )
+    login_data = {"username": "admin", "password": "password"}
+    token = client.post("/auth/login", data=login_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with patch("app.core.auth.jwt.decode", wraps=jwt.decode) as mock_decode:
+            assert client.get("/newsletters", headers=headers).status_code == 200
+            assert client.get("/newsletters", headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert not [s for s in statements if "FROM settings" in s]
+    assert mock_decode.call_count == 1
@@ -1,46 +1,211 @@
-from datetime import datetime
+import asyncio
+import threading
+import time
+from datetime import UTC, datetime, timedelta
 from unittest.mock import ANY, MagicMock, patch
 
+import pytest
+from sqlalchemy import Text, insert, select, type_coerce, update
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
-from app.core.imap import _test_imap_connection, get_folders
-from app.crud.newsletters import create_newsletter
-from app.crud.settings import create_or_update_settings
-from app.schemas.newsletters import NewsletterCreate
+from app.commands.compress_bodies import compress_bodies
+from app.core import cache_sync
+from app.core.compression import compress_text, decompress_text
+from app.core.config import settings
+from app.core.database import _create_engine, engine
+from app.core.imap import (
+    _test_imap_connection,
+    get_folders,
+    imap_sessions,
+    run_in_imap_executor,
+)
+from app.core.imap_client import (
+    AsyncImapClient,
+    ImapCredentials,
+    ImapSessionPool,
+    ImapTimeout,
+    authenticate,
+)
+from app.core.leader import LeaderLease
+from app.crud.entries import create_entry, get_entries_by_newsletter
+from app.crud.imap_folders import (
+    get_folder_schedules,
+    get_folder_state,
+    record_folder_check,
+    update_folder_state,
+)
+from app.crud.ingestion_tasks import get_ingestion_tasks, retry_delay
+from app.crud.newsletters import (
+    create_newsletter,
+    get_newsletters,
+    update_newsletter,
+)
+from app.crud.settings import create_or_update_settings, get_settings
+from app.models.coordination import CacheInvalidation, LeaderLock
+from app.models.entries import Entry
+from app.schemas.entries import EntryCreate
+from app.schemas.newsletters import NewsletterCreate, NewsletterUpdate
 from app.schemas.settings import SettingsCreate
-from app.services.email_processor import process_emails
+from app.services.email_processor import (
+    process_emails,
+    shutdown_extraction_executor,
+)
+from app.services.polling import plan_folders, process_due_folders
+from app.tests.imap_server import StubImapServer
 
 
-@patch("app.core.imap.imaplib.IMAP4_SSL")
-def test_test_imap_connection_success(mock_imap):
+def _mock_uid_command(messages: dict[bytes, bytes]):
+    """Build a side effect for ``IMAP4.uid`` serving the given messages."""
+
+    def requested(message_set):
+        uids = set()
+        for part in message_set.split(","):
+            start, _, end = part.partition(":")
+            uids.update(
+                str(n).encode() for n in range(int(start), int(end or start) + 1)
+            )
+        return uids
+
+    def uid(command, *args):
+        if command == "SEARCH":
+            return ("OK", [b" ".join(messages)])
+        if command == "FETCH":
+            message_set, query = args
+            data = []
+            for seq, (uid, raw) in enumerate(messages.items(), start=1):
+                if uid not in requested(message_set):
+                    continue
+                if "HEADER.FIELDS" in query:
+                    raw = raw.replace(b"\r\n", b"\n").split(b"\n\n")[0] + b"\n\n"
+                envelope = b"%d (UID %s BODY[] {%d}" % (seq, uid, len(raw))
+                data.extend([(envelope, raw), b")"])
+            return ("OK", data)
+        return ("OK", [None])
+
+    return uid
+
+
+def test_test_imap_connection_success():
     """Test IMAP connection success."""
-    mock_imap.return_value.login.return_value = (None, None)
-    mock_imap.return_value.logout.return_value = (None, None)
-    success, message = _test_imap_connection("imap.test.com", "user", "pass")
+
+    async def scenario():
+        async with StubImapServer() as server:
+            result = await _test_imap_connection(server.credentials())
+            return result, server.commands
+
+    (success, message), commands = asyncio.run(scenario())
     assert success
     assert message == "Connection successful"
+    assert commands == ["CAPABILITY", "LOGIN", "LOGOUT"]
 
 
-@patch("app.core.imap.imaplib.IMAP4_SSL")
-def test_test_imap_connection_failure(mock_imap):
+def test_test_imap_connection_failure():
     """Test IMAP connection failure."""
-    mock_imap.return_value.login.side_effect = Exception("Auth failed")
-    success, message = _test_imap_connection("imap.test.com", "user", "pass")
+
+    async def scenario():
+        async with StubImapServer() as server:
+            return await _test_imap_connection(server.credentials(password="wrong"))
+
+    success, message = asyncio.run(scenario())
     assert not success
-    assert message == "Auth failed"
+    assert "Invalid credentials" in message
+
+
+def test_test_imap_connection_xoauth2():
+    """Test that a token authenticates with XOAUTH2 instead of the password."""
+
+    async def scenario():
+        async with StubImapServer(access_token="secret") as server:
+            result = await _test_imap_connection(
+                server.credentials(password=None, oauth2_token="secret")
+            )
+            return result, server.commands
+
+    (success, _), commands = asyncio.run(scenario())
+    assert success
+    assert "AUTHENTICATE" in commands and "LOGIN" not in commands
+
+
+def test_authenticate_imaplib_session():
+    """Test that imaplib sessions authenticate the same way as the async client."""
+    mail = MagicMock()
+    authenticate(mail, ImapCredentials("imap.test.com", "user", "password"))
+    mail.login.assert_called_once_with("user", "password")
+    mail.authenticate.assert_not_called()
 
+    mail = MagicMock()
+    authenticate(mail, ImapCredentials("imap.test.com", "user", oauth2_token="t"))
+    mail.login.assert_not_called()
+    mechanism, authobject = mail.authenticate.call_args.args
+    assert mechanism == "XOAUTH2"
+    assert authobject(b"") == b"user=user\x01auth=Bearer t\x01\x01"
 
-@patch("app.core.imap.imaplib.IMAP4_SSL")
-def test_get_folders(mock_imap):
+
+def test_get_folders():
     """Test fetching IMAP folders."""
-    mock_imap.return_value.login.return_value = (None, None)
-    mock_imap.return_value.logout.return_value = (None, None)
-    mock_imap.return_value.list.return_value = (
-        "OK",
-        [b'(NOCONNECT NOSELECT) "/" "INBOX"', b'(NOCONNECT NOSELECT) "/" "Processed"'],
-    )
-    folders = get_folders("imap.test.com", "user", "pass")
-    assert folders == ["INBOX", "Processed"]
+
+    async def scenario():
+        async with StubImapServer(
+            folders={"INBOX": 1, "Processed": 0, "My Newsletters": 3}
+        ) as server:
+            folders = await get_folders(server.credentials())
+            await imap_sessions.close_all()
+            return folders
+
+    assert asyncio.run(scenario()) == ["INBOX", "Processed", "My Newsletters"]
+
+
+def test_imap_session_pool_reuses_sessions():
+    """Test that pooled sessions are reused while their credentials are current."""
+
+    async def scenario():
+        pool = ImapSessionPool()
+        async with StubImapServer(folders={"INBOX": 4}) as server:
+            credentials = server.credentials()
+            async with pool.session(credentials) as client:
+                first = client
+                exists = await client.select("INBOX")
+            async with pool.session(credentials) as client:
+                assert client is first
+
+            # A session is not reused with another password or token
+            server.password = "new"
+            credentials = credentials._replace(password="new")
+            async with pool.session(credentials) as client:
+                assert client is not first
+                second = client
+            assert not first.is_connected
+
+            # Nor once it is too old
+            with patch("app.core.imap_client._MAX_SESSION_AGE", 0.0):
+                async with pool.session(credentials):
+                    pass
+            assert not second.is_connected
+            await pool.close_all()
+            return exists, server.connections
+
+    exists, connections = asyncio.run(scenario())
+    assert exists == 4
+    assert connections == 3
+
+
+def test_imap_client_times_out():
+    """Test that a command the server never answers fails with ImapTimeout."""
+
+    async def scenario():
+        async with StubImapServer(stall={"NOOP"}) as server:
+            client = AsyncImapClient(
+                "127.0.0.1", server.port, use_ssl=False, timeout=0.1
+            )
+            await client.connect()
+            await client.login("user", "pass")
+            with pytest.raises(ImapTimeout):
+                await client.noop()
+            return client
+
+    client = asyncio.run(scenario())
+    assert not client.is_connected
 
 
 @patch("app.services.email_processor.imaplib.IMAP4_SSL")
@@ -68,22 +233,22 @@ def test_process_emails(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
 
     # Mock email content
     mock_msg_bytes = b"From: newsletter@example.com\nSubject: Test Subject\nMessage-ID: <test@test.com>\n\n<p>Test Body</p>"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command({b"1": mock_msg_bytes})
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
 
     process_emails(db_session)
 
     # Assertions
     mock_mail.login.assert_called_once_with("test@test.com", "password")
     mock_mail.select.assert_called_once_with("INBOX")
-    mock_mail.search.assert_called_once_with(None, "(UNSEEN)")
-    mock_mail.fetch.assert_called_once_with(b"1", "(BODY.PEEK[])")
-    mock_mail.store.assert_any_call(b"1", "+FLAGS", "\\Seen")
-    mock_mail.copy.assert_called_once_with(b"1", "Processed")
-    mock_mail.store.assert_any_call(b"1", "+FLAGS", "\\Deleted")
+    mock_mail.uid.assert_any_call("SEARCH", None, "(UNSEEN)")
+    mock_mail.uid.assert_any_call("FETCH", "1", "(BODY.PEEK[])")
+    mock_mail.uid.assert_any_call("STORE", "1", "+FLAGS", "\\Seen")
+    mock_mail.uid.assert_any_call("COPY", "1", "Processed")
+    mock_mail.uid.assert_any_call("STORE", "1", "+FLAGS", "\\Deleted")
     mock_mail.expunge.assert_called_once()
     mock_mail.logout.assert_called_once()
 
@@ -134,6 +299,7 @@ def test_start_scheduler_with_interval(
     mock_scheduler.start.assert_called_once()
 
 
+@patch("app.core.scheduler.ingestion_lease", MagicMock(is_held=True))
 @patch("app.core.scheduler.SessionLocal")
 @patch("app.core.scheduler.process_emails")
 def test_scheduler_job(mock_process_emails, mock_session_local, db_session: Session):
@@ -142,9 +308,148 @@ def test_scheduler_job(mock_process_emails, mock_session_local, db_session: Sess
     from app.core.scheduler import job
 
     job()
+    mock_process_emails.assert_called_once_with(db_session, skip=set())
+
+
+@patch("app.core.scheduler.ingestion_lease", MagicMock(is_held=True))
+@patch("app.core.scheduler.idle_manager", MagicMock(connected_folders={"INBOX"}))
+@patch("app.core.scheduler.SessionLocal")
+@patch("app.core.scheduler.process_emails")
+def test_scheduler_job_skips_watched_folders(
+    mock_process_emails, mock_session_local, db_session: Session
+):
+    """Test that folders watched with IDLE are not polled."""
+    mock_session_local.return_value = db_session
+    from app.core.scheduler import job
+
+    job()
+    mock_process_emails.assert_called_once_with(db_session, skip={"INBOX"})
+
+
+@patch("app.core.scheduler.ingestion_lease", MagicMock(is_held=False))
+@patch("app.core.scheduler.process_emails")
+def test_scheduler_job_skipped_without_lease(mock_process_emails):
+    """Test that only the process holding the ingestion lease checks emails."""
+    from app.core.scheduler import job
+
+    job()
+    mock_process_emails.assert_not_called()
+
+
+@patch("app.core.scheduler.ingestion_lease", MagicMock(is_held=True))
+@patch("app.core.scheduler.idle_manager", MagicMock(connected_folders={"INBOX"}))
+@patch("app.core.scheduler.SessionLocal")
+@patch("app.core.scheduler.process_emails")
+def test_scheduler_job_checks_all_folders_on_request(
+    mock_process_emails, mock_session_local, db_session: Session
+):
+    """Test that a requested check includes the folders watched with IDLE."""
+    mock_session_local.return_value = db_session
+    from app.core.scheduler import job
+
+    job(all_folders=True)
     mock_process_emails.assert_called_once_with(db_session)
 
 
+@patch("app.core.scheduler.cache_sync.publish")
+@patch("app.core.scheduler.scheduler")
+def test_request_check(mock_scheduler, mock_publish):
+    """Test that checks are requested from the process holding the lease."""
+    from app.core.scheduler import (
+        CHECK_REQUEST_KIND,
+        _on_check_requested,
+        job,
+        request_check,
+    )
+
+    with patch("app.core.scheduler.ingestion_lease", MagicMock(is_held=True)):
+        request_check()
+        mock_publish.assert_not_called()
+        mock_scheduler.add_job.assert_called_once()
+        assert mock_scheduler.add_job.call_args.args == (job, "date")
+        assert mock_scheduler.add_job.call_args.kwargs["kwargs"] == {
+            "all_folders": True
+        }
+
+        # Dropping all caches does not check emails.
+        mock_scheduler.add_job.reset_mock()
+        _on_check_requested(None)
+        mock_scheduler.add_job.assert_not_called()
+        _on_check_requested("requested")
+        mock_scheduler.add_job.assert_called_once()
+
+    mock_scheduler.add_job.reset_mock()
+    with patch("app.core.scheduler.ingestion_lease", MagicMock(is_held=False)):
+        request_check()
+        mock_publish.assert_called_once_with(CHECK_REQUEST_KIND, "requested")
+        _on_check_requested("requested")
+        mock_scheduler.add_job.assert_not_called()
+
+
+def test_leader_lease(db_session: Session):
+    """Test that one process holds a lease until it expires or is released."""
+    first = LeaderLease("test", holder="first")
+    second = LeaderLease("test", holder="second")
+
+    assert first.acquire(db_session)
+    assert not second.acquire(db_session)
+    assert first.acquire(db_session)  # Renewal
+    assert first.is_held and not second.is_held
+
+    # The first process stops renewing the lease.
+    db_session.execute(update(LeaderLock).values(expires_at=time.time() - 1))
+    db_session.commit()
+    assert second.acquire(db_session)
+    assert not first.acquire(db_session)
+    assert not first.is_held
+
+    second.release(db_session)
+    assert not second.is_held
+    assert first.acquire(db_session)
+
+
+def test_cache_sync_applies_invalidations_of_other_processes():
+    """Test that invalidations published by other processes are applied."""
+    applied = []
+
+    def publish_remote(key, id=None):
+        with engine.begin() as connection:
+            connection.execute(
+                insert(CacheInvalidation).values(
+                    id=id, kind="test", key=key, origin="other", created_at=0
+                )
+            )
+
+    with (
+        patch.dict("app.core.cache_sync._handlers", clear=True),
+        patch("app.core.cache_sync._last_id", None),
+        patch("app.core.cache_sync._next_poll", 0.0),
+        patch(
+            "app.core.cache_sync.settings",
+            settings.model_copy(update={"cache_sync_interval": 0}),
+        ),
+    ):
+        cache_sync.register("test", applied.append)
+        cache_sync.poll()
+        assert applied == [None]  # Nothing is known about the caches yet
+
+        publish_remote("a")
+        cache_sync.publish("test", "own")
+        publish_remote("b")
+        cache_sync.poll()
+        assert applied == [None, "a", "b"]
+
+        # Missed invalidations drop the whole cache.
+        publish_remote("c", id=100)
+        cache_sync.poll()
+        assert applied == [None, "a", "b", None]
+
+        # Old invalidations are pruned, the newest is kept.
+        assert cache_sync.prune() == 2
+        cache_sync.poll()
+        assert applied == [None, "a", "b", None]
+
+
 @patch("app.services.email_processor.imaplib.IMAP4_SSL")
 def test_process_emails_auto_add_sender(mock_imap, db_session: Session):
     """Test processing emails with auto add sender enabled."""
@@ -160,9 +465,9 @@ def test_process_emails_auto_add_sender(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
     mock_msg_bytes = b"From: New Sender <new@example.com>\nSubject: New Email\nMessage-ID: <new@new.com>\n\nHello"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command({b"1": mock_msg_bytes})
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
 
     process_emails(db_session)
 
@@ -207,14 +512,15 @@ def test_process_emails_no_move_or_read(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
     mock_msg_bytes = b"From: newsletter@example.com\nSubject: Test Subject\nMessage-ID: <test@test.com>\n\nTest Body"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command({b"1": mock_msg_bytes})
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
 
     process_emails(db_session)
 
-    mock_mail.store.assert_not_called()
-    mock_mail.copy.assert_not_called()
+    commands = [c.args[0] for c in mock_mail.uid.call_args_list]
+    assert "STORE" not in commands
+    assert "COPY" not in commands
 
 
 @patch("app.services.email_processor.imaplib.IMAP4_SSL")
@@ -249,10 +555,10 @@ def test_process_emails_avoids_duplicates(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
     # This email has the same Message-ID as the one we just created
     mock_msg_bytes = b"From: newsletter@example.com\nSubject: Test Subject\nMessage-ID: <existing@message.com>\n\nTest Body"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command({b"1": mock_msg_bytes})
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
 
     process_emails(db_session)
 
@@ -262,3 +568,611 @@ def test_process_emails_avoids_duplicates(mock_imap, db_session: Session):
     entries = get_entries_by_newsletter(db_session, newsletter.id)
     assert len(entries) == 1
     assert entries[0].subject == "Existing Subject"
+
+
+def test_feed_cache_on_disk(tmp_path):
+    """Test that rendered feeds are persisted to and reloaded from disk."""
+    from app.core import feed_cache
+
+    disk_settings = feed_cache.settings.model_copy(
+        update={"feed_cache_dir": str(tmp_path)}
+    )
+    version = feed_cache.FeedVersion('"etag"', datetime(2025, 1, 1), 1, 1)
+    with patch("app.core.feed_cache.settings", disk_settings):
+        feed_cache.set_feed("newsletter-id", version, b"<feed/>", aliases=("slug",))
+        assert (tmp_path / "newsletter-id-1.xml").read_bytes() == b"<feed/>"
+
+        # Simulate a restart by clearing only the in-memory state
+        feed_cache._feeds.clear()
+        cached = feed_cache.get_feed("newsletter-id", 1)
+        assert cached == feed_cache.CachedFeed(version, b"<feed/>")
+
+        # Slugs are persisted along with the pages
+        feed_cache._clear_memory()
+        assert feed_cache.get_feed("slug", 1) == cached
+
+        # A page cached for another version is not reused
+        assert feed_cache.get_feed("newsletter-id", 1, '"etag"') == cached
+        assert feed_cache.get_feed("newsletter-id", 1, '"other"') is None
+        feed_cache._clear_memory()
+        assert feed_cache.get_feed("slug", 1, '"other"') is None
+
+        feed_cache.invalidate_newsletter("newsletter-id")
+        assert feed_cache.get_feed("newsletter-id", 1) is None
+        assert feed_cache.get_feed("slug", 1) is None
+        assert list(tmp_path.iterdir()) == []
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_fetches_in_batches(mock_imap, db_session: Session):
+    """Test that messages are fetched and flagged with one command per batch."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+            mark_as_read=True,
+        ),
+    )
+    create_newsletter(
+        db_session,
+        NewsletterCreate(name="Batched", sender_emails=["newsletter@example.com"]),
+    )
+
+    messages = {
+        uid: b"From: newsletter@example.com\nSubject: Batch\nMessage-ID: <batch%s@test.com>\n\nBody"
+        % uid
+        for uid in (b"1", b"2", b"3")
+    }
+    mock_mail = MagicMock()
+    mock_imap.return_value = mock_mail
+    mock_mail.select.return_value = ("OK", [b"3"])
+    mock_mail.uid.side_effect = _mock_uid_command(messages)
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
+
+    batch_settings = settings.model_copy(update={"imap_fetch_batch_size": 2})
+    with patch("app.services.email_processor.app_settings", batch_settings):
+        process_emails(db_session)
+
+    fetches = [c.args[1] for c in mock_mail.uid.call_args_list if c.args[0] == "FETCH"]
+    assert fetches == ["1:2", "1:2", "3", "3"]
+    stores = [c.args[1] for c in mock_mail.uid.call_args_list if c.args[0] == "STORE"]
+    assert stores == ["1:2", "3"]
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_downloads_only_new_newsletters(mock_imap, db_session: Session):
+    """Test that only emails passing the header prefilter are downloaded."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Known", sender_emails=["newsletter@example.com"]),
+    )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Old", body="Old", message_id="<old@test.com>"),
+        newsletter.id,
+    )
+
+    messages = {
+        b"1": b"From: newsletter@example.com\nSubject: Old\nMessage-ID: <old@test.com>\n\nBody",
+        b"2": b"From: stranger@example.com\nSubject: Spam\nMessage-ID: <spam@test.com>\n\nBody",
+        b"3": b"From: newsletter@example.com\nSubject: New\nMessage-ID: <new@test.com>\n\nBody",
+    }
+    mock_mail = MagicMock()
+    mock_imap.return_value = mock_mail
+    mock_mail.select.return_value = ("OK", [b"3"])
+    mock_mail.uid.side_effect = _mock_uid_command(messages)
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
+
+    process_emails(db_session)
+
+    mock_mail.uid.assert_any_call(
+        "FETCH", "1:3", "(BODY.PEEK[HEADER.FIELDS (FROM MESSAGE-ID SUBJECT DATE)])"
+    )
+    mock_mail.uid.assert_any_call("FETCH", "3", "(BODY.PEEK[])")
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    assert {e.subject for e in entries} == {"Old", "New"}
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_searches_above_last_uid(mock_imap, db_session: Session):
+    """Test that emails below the folder's high-water mark are not searched again."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    create_newsletter(
+        db_session,
+        NewsletterCreate(name="Known", sender_emails=["newsletter@example.com"]),
+    )
+
+    messages = {
+        b"3": b"From: newsletter@example.com\nSubject: New\nMessage-ID: <hwm@test.com>\n\nBody",
+    }
+    mock_mail = MagicMock()
+    mock_imap.return_value = mock_mail
+    mock_mail.select.return_value = ("OK", [b"1"])
+    mock_mail.uid.side_effect = _mock_uid_command(messages)
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"7"])
+
+    process_emails(db_session)
+    mock_mail.uid.assert_any_call("SEARCH", None, "(UNSEEN)")
+    state = get_folder_state(db_session, "test@test.com", "INBOX")
+    assert (state.uidvalidity, state.last_uid) == (7, 3)
+
+    mock_mail.uid.reset_mock()
+    process_emails(db_session)
+    mock_mail.uid.assert_any_call("SEARCH", None, "(UID 4:* UNSEEN)")
+    fetches = [c for c in mock_mail.uid.call_args_list if c.args[0] == "FETCH"]
+    assert fetches == []
+
+    # Emails whose headers could not be fetched are searched again.
+    messages[b"4"] = messages.pop(b"3").replace(b"hwm@", b"hwm4@")
+    messages[b"6"] = messages[b"4"].replace(b"hwm4@", b"hwm6@")
+    fetch_messages = mock_mail.uid.side_effect
+    mock_mail.uid.side_effect = lambda command, *args: (
+        ("OK", [None])
+        if command == "FETCH" and "HEADER.FIELDS" in args[1] and "4" in args[0]
+        else fetch_messages(command, *args)
+    )
+    process_emails(db_session)
+    assert get_folder_state(db_session, "test@test.com", "INBOX").last_uid == 3
+    mock_mail.uid.side_effect = fetch_messages
+
+    # A new UIDVALIDITY invalidates the high-water mark.
+    mock_mail.uid.reset_mock()
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"8"])
+    process_emails(db_session)
+    mock_mail.uid.assert_any_call("SEARCH", None, "(UNSEEN)")
+    assert get_folder_state(db_session, "test@test.com", "INBOX").uidvalidity == 8
+
+    # Newsletters added while processing do not reset any folder.
+    update_folder_state(db_session, "test@test.com", "Archive", 3, 5)
+    create_newsletter(
+        db_session,
+        NewsletterCreate(name="Auto", sender_emails=["auto@example.com"]),
+        rescan=False,
+    )
+    assert get_folder_state(db_session, "test@test.com", "INBOX") is not None
+
+    # Adding a newsletter forces a full scan of its folder only, which is
+    # due right away but keeps its polling schedule.
+    checked_at = datetime(2025, 1, 1)
+    for folder in ("INBOX", "Archive"):
+        record_folder_check(
+            db_session, "test@test.com", folder, checked_at, 60, checked_at
+        )
+    create_newsletter(
+        db_session,
+        NewsletterCreate(name="Other", sender_emails=["other@example.com"]),
+    )
+    assert get_folder_state(db_session, "test@test.com", "INBOX") is None
+    assert get_folder_state(db_session, "test@test.com", "Archive").last_uid == 5
+    schedules = get_folder_schedules(db_session, "test@test.com")
+    assert checked_at < schedules["INBOX"].next_check_at <= datetime.now()
+    assert schedules["INBOX"].last_checked_at == checked_at
+    assert schedules["Archive"].next_check_at == checked_at
+
+    # Editing a newsletter rescans its folder only if it gets new senders or
+    # is moved to another folder.
+    other = next(n for n in get_newsletters(db_session) if n.name == "Other")
+    update_folder_state(db_session, "test@test.com", "INBOX", 8, 9)
+    update = NewsletterUpdate(name="Renamed", sender_emails=["other@example.com"])
+    update_newsletter(db_session, other.id, update)
+    assert get_folder_state(db_session, "test@test.com", "INBOX") is not None
+    update.search_folder = "Archive"
+    update_newsletter(db_session, other.id, update)
+    assert get_folder_state(db_session, "test@test.com", "INBOX") is not None
+    assert get_folder_state(db_session, "test@test.com", "Archive") is None
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_extracts_in_process_pool(mock_imap, db_session: Session):
+    """Test that content extraction can run in worker processes."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="Extracted",
+            sender_emails=["newsletter@example.com"],
+            extract_content=True,
+        ),
+    )
+
+    html = "<html><body><p>Article</p><script>alert(1)</script></body></html>"
+    messages = {
+        uid: (
+            b"From: newsletter@example.com\nSubject: Issue %s\n"
+            b"Message-ID: <pool%s@test.com>\nContent-Type: text/html\n\n%s"
+        )
+        % (uid, uid, html.encode())
+        for uid in (b"1", b"2")
+    }
+    mock_mail = MagicMock()
+    mock_imap.return_value = mock_mail
+    mock_mail.select.return_value = ("OK", [b"2"])
+    mock_mail.uid.side_effect = _mock_uid_command(messages)
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
+
+    pool_settings = settings.model_copy(
+        update={"extraction_workers": 1, "imap_fetch_batch_size": 1}
+    )
+    with patch("app.services.email_processor.app_settings", pool_settings):
+        try:
+            process_emails(db_session)
+        finally:
+            shutdown_extraction_executor()
+
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    assert len(entries) == 2
+    for entry in entries:
+        assert "Article" in entry.body
+        assert "script" not in entry.body
+
+
+def test_sqlite_pragmas_applied():
+    """Test that new SQLite connections use the tuned profile."""
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_read_only_engine_rejects_writes():
+    """Test that the read-only engine can read but not write."""
+    read_engine = _create_engine(read_only=True)
+    try:
+        with read_engine.connect() as connection:
+            assert (
+                connection.exec_driver_sql("SELECT count(*) FROM entries").scalar() == 0
+            )
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql("DELETE FROM entries")
+    finally:
+        read_engine.dispose()
+
+
+def test_run_in_imap_executor_uses_dedicated_threads():
+    """Test that blocking IMAP calls run on the IMAP thread pool."""
+    thread = asyncio.run(run_in_imap_executor(threading.current_thread))
+    assert thread.name.startswith("imap")
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "zstd"])
+def test_compress_text_round_trip(algorithm):
+    """Test that compressed text is marked and restored."""
+    body = "<p>Newsletter</p>" * 100
+    compressed = compress_text(body, algorithm)
+    assert isinstance(compressed, bytes)
+    assert len(compressed) < len(body)
+    assert decompress_text(compressed) == body
+    # Short and uncompressed values are stored as text.
+    assert compress_text("<p>Hi</p>", algorithm) == "<p>Hi</p>"
+    assert decompress_text(body) == body
+
+
+def test_compress_bodies_command(db_session: Session):
+    """Test that existing bodies are compressed and still read back unchanged."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Compressed", sender_emails=["compressed@test.com"]),
+    )
+    body = "<p>Newsletter</p>" * 100
+    for i in range(3):
+        create_entry(
+            db_session,
+            EntryCreate(subject=f"{i}", body=body, message_id=f"<compressed{i}>"),
+            newsletter.id,
+        )
+    stored = select(type_coerce(Entry.body, Text))
+    assert all(isinstance(b, str) for b in db_session.scalars(stored))
+
+    zstd = settings.model_copy(update={"entry_body_compression": "zstd"})
+    with (
+        patch("app.core.compression.settings", zstd),
+        patch("app.commands.compress_bodies.settings", zstd),
+    ):
+        assert compress_bodies(db_session, batch_size=2) == 3
+        assert compress_bodies(db_session, batch_size=2) == 0
+
+    assert all(b.startswith(b"\x02") for b in db_session.scalars(stored))
+    db_session.expire_all()
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    assert [e.body for e in entries] == [body] * 3
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_checks_folders_concurrently(mock_imap, db_session: Session):
+    """Test that folders are checked on separate connections, isolating failures."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    working = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Working", sender_emails=["newsletter@example.com"]),
+    )
+    create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="Broken",
+            sender_emails=["broken@example.com"],
+            search_folder="Broken",
+        ),
+    )
+    messages = {
+        b"1": b"From: newsletter@example.com\nSubject: New\nMessage-ID: <new@test.com>\n\nBody",
+    }
+    connections = []
+
+    def connect(*args, **kwargs):
+        mail = MagicMock()
+        mail.response.return_value = ("UIDVALIDITY", [b"1"])
+        mail.uid.side_effect = _mock_uid_command(messages)
+
+        def select(folder, *args):
+            if folder == "Broken":
+                mail.uid.side_effect = OSError("connection reset")
+            return ("OK", [b"1"])
+
+        mail.select.side_effect = select
+        connections.append(mail)
+        return mail
+
+    mock_imap.side_effect = connect
+
+    process_emails(db_session)
+
+    assert len(connections) == 2
+    assert all(mail.logout.called for mail in connections)
+    db_session.expire_all()
+    entries = get_entries_by_newsletter(db_session, working.id)
+    assert [e.subject for e in entries] == ["New"]
+
+
+@patch("app.services.email_processor._check_folder_in_new_session")
+def test_process_emails_isolates_folder_errors(mock_check, db_session: Session):
+    """Test that an error outside the IMAP check of a folder spares the others."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    for folder in ("Broken", "INBOX"):
+        create_newsletter(
+            db_session,
+            NewsletterCreate(
+                name=folder,
+                sender_emails=[f"{folder.lower()}@example.com"],
+                search_folder=folder,
+            ),
+        )
+
+    def check(settings, search_folder):
+        if search_folder == "Broken":
+            raise RuntimeError("database is locked")
+
+    mock_check.side_effect = check
+
+    with patch(
+        "app.services.email_processor.app_settings",
+        settings.model_copy(update={"imap_folder_workers": 2}),
+    ):
+        process_emails(db_session)
+
+    assert sorted(call.args[1] for call in mock_check.call_args_list) == [
+        "Broken",
+        "INBOX",
+    ]
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_retries_failed_emails(mock_imap, db_session: Session):
+    """Test that a failing email is retried with backoff without blocking the others."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+            mark_as_read=True,
+        ),
+    )
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Known", sender_emails=["newsletter@example.com"]),
+    )
+    messages = {
+        b"1": b"From: newsletter@example.com\nSubject: Broken\nMessage-ID: <broken@test.com>\nDate: not a date\n\nBody",
+        b"2": b"From: newsletter@example.com\nSubject: Fine\nMessage-ID: <fine@test.com>\n\nBody",
+    }
+    mock_mail = MagicMock()
+    mock_imap.return_value = mock_mail
+    mock_mail.select.return_value = ("OK", [b"2"])
+    mock_mail.uid.side_effect = _mock_uid_command(messages)
+    mock_mail.response.return_value = ("UIDVALIDITY", [b"1"])
+
+    process_emails(db_session)
+
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    assert [e.subject for e in entries] == ["Fine"]
+    mock_mail.uid.assert_any_call("STORE", "2", "+FLAGS", "\\Seen")
+    [task] = get_ingestion_tasks(db_session)
+    assert (task.uid, task.stage, task.state, task.attempts) == (
+        1,
+        "store",
+        "retrying",
+        1,
+    )
+    assert task.raw_email == messages[b"1"]
+    assert task.next_attempt_at > datetime.now(UTC).replace(tzinfo=None)
+
+    # The task waits for its backoff.
+    mock_mail.uid.reset_mock()
+    process_emails(db_session)
+    assert not [c for c in mock_mail.uid.call_args_list if c.args[0] == "FETCH"]
+
+    # A due retry uses the kept email, and the last attempt gives up.
+    task.next_attempt_at = None
+    db_session.commit()
+    mock_mail.uid.reset_mock()
+    with patch(
+        "app.crud.ingestion_tasks.settings",
+        settings.model_copy(update={"ingestion_max_attempts": 2}),
+    ):
+        process_emails(db_session)
+    assert not [c for c in mock_mail.uid.call_args_list if c.args[0] == "FETCH"]
+    db_session.expire_all()
+    [task] = get_ingestion_tasks(db_session)
+    assert (task.state, task.attempts) == ("dead", 2)
+    assert "Invalid date" in task.last_error
+
+
+def test_retry_delay_backs_off_exponentially():
+    """Test that the delay between attempts doubles up to the maximum."""
+    with patch(
+        "app.crud.ingestion_tasks.settings",
+        settings.model_copy(
+            update={"ingestion_retry_delay": 60, "ingestion_retry_max_delay": 200}
+        ),
+    ):
+        assert [retry_delay(n).total_seconds() for n in (1, 2, 3, 4)] == [
+            60,
+            120,
+            200,
+            200,
+        ]
+
+
+def _create_newsletter_history(
+    db: Session, name: str, folder: str, received: list[datetime]
+) -> None:
+    """Create a newsletter searched in a folder, with entries received at the given times."""
+    newsletter = create_newsletter(
+        db,
+        NewsletterCreate(
+            name=name,
+            sender_emails=[f"{name.lower()}@example.com"],
+            search_folder=folder,
+        ),
+    )
+    for i, received_at in enumerate(received):
+        create_entry(
+            db,
+            EntryCreate(
+                subject=f"{name} {i}",
+                body=f"{name} issue {i}",
+                message_id=f"<{name.lower()}-{i}@test.com>",
+                received_at=received_at,
+            ),
+            newsletter.id,
+        )
+
+
+def test_plan_folders_adapts_to_cadence(db_session: Session):
+    """Test that folders are checked as often as their newsletters arrive."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+            email_check_interval=15,
+        ),
+    )
+    now = datetime(2025, 10, 20, 12, 0, 0)
+    _create_newsletter_history(
+        db_session, "Hourly", "INBOX", [now - timedelta(hours=i) for i in range(5)]
+    )
+    _create_newsletter_history(
+        db_session, "Daily", "Daily", [now - timedelta(days=i) for i in range(5)]
+    )
+    _create_newsletter_history(
+        db_session,
+        "Dormant",
+        "Dormant",
+        [now - timedelta(days=60 + 7 * i) for i in range(5)],
+    )
+    _create_newsletter_history(db_session, "New", "New", [now])
+
+    plans = {
+        plan.folder: plan
+        for plan in plan_folders(db_session, get_settings(db_session), now)
+    }
+
+    # An email an hour would need checks every 2.5 minutes, above the minimum.
+    assert plans["INBOX"].interval == timedelta(minutes=5)
+    assert plans["Daily"].interval == timedelta(hours=1)
+    assert plans["Daily"].newsletters[0].typical_gap == timedelta(days=1)
+    assert plans["Dormant"].interval == timedelta(hours=6)
+    # Without enough history, the configured interval is used.
+    assert plans["New"].interval == timedelta(minutes=15)
+    assert plans["New"].newsletters[0].typical_gap is None
+    assert all(plan.next_check_at is None for plan in plans.values())
+
+
+@patch("app.services.polling.process_emails")
+def test_process_due_folders(mock_process_emails, db_session: Session):
+    """Test that only due folders are checked and their next check is scheduled."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    now = datetime.now()
+    _create_newsletter_history(
+        db_session, "Daily", "Daily", [now - timedelta(days=i) for i in range(5)]
+    )
+    _create_newsletter_history(db_session, "New", "New", [now])
+
+    assert sorted(process_due_folders(db_session)) == ["Daily", "New"]
+    mock_process_emails.assert_called_once()
+
+    schedules = get_folder_schedules(db_session, "test@test.com")
+    assert schedules["Daily"].interval == 3600
+    assert schedules["New"].interval == 900
+    for schedule in schedules.values():
+        # The next check is shifted by up to 10% of the interval.
+        delay = schedule.next_check_at - schedule.last_checked_at
+        assert (
+            0.9 * schedule.interval <= delay.total_seconds() <= 1.1 * schedule.interval
+        )
+
+    mock_process_emails.reset_mock()
+    assert process_due_folders(db_session) == []
+    mock_process_emails.assert_not_called()
+
+    schedules["New"].next_check_at = now - timedelta(minutes=1)
+    db_session.commit()
+    assert process_due_folders(db_session) == ["New"]
+    mock_process_emails.assert_called_once_with(db_session, ["New"])
@@ -1,18 +1,32 @@
 import time
 import uuid
+from datetime import datetime
 from unittest.mock import patch
 
+from sqlalchemy import inspect, select, text
 from sqlalchemy.orm import Session
 
-from app.crud.entries import create_entry, get_all_entries, get_entries_by_newsletter
+from app.core import settings_cache
+from app.crud.entries import (
+    create_entries,
+    create_entry,
+    delete_entry,
+    get_all_entries,
+    get_entries_by_newsletter,
+    get_entry_summaries,
+    get_existing_message_ids,
+)
 from app.crud.newsletters import (
     create_newsletter,
     get_newsletter_by_identifier,
     get_newsletters,
+    update_newsletter,
 )
+from app.crud.search import search_entries
 from app.crud.settings import create_or_update_settings, get_settings
+from app.models.entries import EntryDuplicate
 from app.schemas.entries import EntryCreate
-from app.schemas.newsletters import NewsletterCreate
+from app.schemas.newsletters import NewsletterCreate, NewsletterUpdate
 from app.schemas.settings import SettingsCreate
 
 
@@ -70,6 +84,24 @@ def test_get_settings(db_session: Session):
     assert settings.imap_server == "imap.get.com"
 
 
+def test_get_settings_is_cached_until_updated(db_session: Session):
+    """Test that settings are served from memory until they are changed."""
+    create_or_update_settings(
+        db_session, SettingsCreate(imap_server="imap.one.com", imap_username="one")
+    )
+    assert get_settings(db_session).imap_server == "imap.one.com"
+
+    with patch.object(db_session, "query") as mock_query:
+        assert get_settings(db_session).imap_server == "imap.one.com"
+        assert get_settings(db_session, with_password=True).imap_username == "one"
+        mock_query.assert_not_called()
+
+    create_or_update_settings(
+        db_session, SettingsCreate(imap_server="imap.two.com", imap_username="two")
+    )
+    assert get_settings(db_session).imap_server == "imap.two.com"
+
+
 def test_get_settings_with_env_override(db_session: Session):
     """Test getting settings with environment variable override."""
     # 1. Create initial settings in the database
@@ -95,6 +127,8 @@ def test_get_settings_with_env_override(db_session: Session):
         }
         mock_env_settings.imap_password = "env_pass"
         mock_env_settings.auth_password = "env_auth_password"
+        # The merged settings are cached until the settings change
+        settings_cache.invalidate_local()
 
         # 3. Call get_settings and assert the override
         settings = get_settings(db_session, with_password=True)
@@ -228,6 +262,88 @@ def test_create_entry(db_session: Session):
     assert entry.newsletter_id == newsletter.id
 
 
+def test_create_entries_skips_duplicates(db_session: Session):
+    """Test creating a batch of entries, skipping existing message_ids."""
+    newsletter = create_newsletter(
+        db_session, NewsletterCreate(name="Batch", sender_emails=["b@test.com"])
+    )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Old", body="Old", message_id="<old>"),
+        newsletter.id,
+    )
+
+    created = create_entries(
+        db_session,
+        [
+            (EntryCreate(subject="Old", body="Old", message_id="<old>"), newsletter.id),
+            (EntryCreate(subject="New", body="New", message_id="<new>"), newsletter.id),
+            (EntryCreate(subject="Dup", body="Dup", message_id="<new>"), newsletter.id),
+        ],
+    )
+
+    assert created == {"<new>"}
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    assert sorted(e.subject for e in entries) == ["New", "Old"]
+    assert all(e.received_at is not None for e in entries)
+
+
+def test_entry_counters_on_newsletter(db_session: Session):
+    """Test that entry create/delete maintain the newsletter's counters."""
+    newsletter = create_newsletter(
+        db_session, NewsletterCreate(name="Counted", sender_emails=["c@test.com"])
+    )
+    assert newsletter.entries_count == 0
+    assert newsletter.latest_received_at is None
+
+    first = create_entry(
+        db_session,
+        EntryCreate(
+            subject="1",
+            body="1",
+            message_id="<c1>",
+            received_at=datetime(2026, 1, 2),
+        ),
+        newsletter.id,
+    )
+    create_entries(
+        db_session,
+        [
+            (
+                EntryCreate(
+                    subject="2",
+                    body="2",
+                    message_id="<c2>",
+                    received_at=datetime(2026, 1, 3),
+                ),
+                newsletter.id,
+            ),
+            (
+                EntryCreate(
+                    subject="0",
+                    body="0",
+                    message_id="<c0>",
+                    received_at=datetime(2026, 1, 1),
+                ),
+                newsletter.id,
+            ),
+            (EntryCreate(subject="1", body="1", message_id="<c1>"), newsletter.id),
+        ],
+    )
+
+    newsletter = get_newsletter_by_identifier(db_session, newsletter.id)
+    assert newsletter.entries_count == 3
+    assert newsletter.latest_received_at == datetime(2026, 1, 3)
+    assert get_newsletters(db_session)[0].entries_count == 3
+
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    delete_entry(db_session, entries[0].id)
+    delete_entry(db_session, first.id)
+    newsletter = get_newsletter_by_identifier(db_session, newsletter.id)
+    assert newsletter.entries_count == 1
+    assert newsletter.latest_received_at == datetime(2026, 1, 1)
+
+
 def test_get_entries_by_newsletter(db_session: Session):
     """Test getting entries for a newsletter."""
     unique_email = f"sender_{uuid.uuid4()}@test.com"
@@ -386,3 +502,172 @@ def test_get_all_entries(db_session: Session):
     # Check that newsletter relationship is loaded
     assert all_entries[0].newsletter.name == "Newsletter One"
     assert all_entries[1].newsletter.name == "Newsletter Two"
+
+
+def test_get_entry_summaries(db_session: Session):
+    """Test listing entries with snippets and without loading their bodies."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Summaries", sender_emails=["summaries@test.com"]),
+    )
+    create_entry(
+        db_session,
+        EntryCreate(
+            subject="Hello",
+            body="<html><head><style>p {}</style></head>"
+            "<body><p>Hello   <b>world</b></p></body></html>",
+            message_id="<summary@test.com>",
+        ),
+        newsletter.id,
+    )
+    db_session.expire_all()
+
+    (summary,) = get_entry_summaries(db_session, newsletter.id)
+    assert summary.subject == "Hello"
+    assert summary.snippet == "Hello world"
+    assert "body" in inspect(summary).unloaded
+
+
+def test_search_entries(db_session: Session):
+    """Test that entries are indexed, ranked and removed from the search index."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Weekly Rust", sender_emails=["rust@test.com"]),
+    )
+    create_entry(
+        db_session,
+        EntryCreate(
+            subject="Borrow checker tips",
+            body="<p>All about lifetimes.</p>",
+            message_id="<search1>",
+        ),
+        newsletter.id,
+    )
+    create_entries(
+        db_session,
+        [
+            (
+                EntryCreate(
+                    subject="Release notes",
+                    body="<style>.borrow {}</style><p>The borrow checker got faster.</p>",
+                    message_id="<search2>",
+                ),
+                newsletter.id,
+            )
+        ],
+    )
+
+    results = search_entries(db_session, "borrow")
+    assert [r["subject"] for r in results] == ["Borrow checker tips", "Release notes"]
+    assert results[1]["snippet"] == "The borrow checker got faster."
+    assert [r["subject"] for r in search_entries(db_session, "lifetime")] == [
+        "Borrow checker tips"
+    ]
+    assert search_entries(db_session, "weekly") and not search_entries(
+        db_session, "daily"
+    )
+
+    # VACUUM may renumber the rowids of entries, the index is keyed on ids.
+    db_session.execute(text("UPDATE entries SET rowid = rowid + 100"))
+    db_session.commit()
+    results = search_entries(db_session, "borrow")
+    assert [r["subject"] for r in results] == ["Borrow checker tips", "Release notes"]
+
+    update_newsletter(
+        db_session,
+        newsletter.id,
+        NewsletterUpdate(name="Daily Rust", sender_emails=["rust@test.com"]),
+    )
+    assert len(search_entries(db_session, "daily rust")) == 2
+
+    delete_entry(db_session, results[0]["id"])
+    assert [r["subject"] for r in search_entries(db_session, "borrow")] == [
+        "Release notes"
+    ]
+
+
+def test_create_entries_links_duplicate_content(db_session: Session):
+    """Test that resent newsletters are linked to the existing entry."""
+    newsletter = create_newsletter(
+        db_session, NewsletterCreate(name="Resent", sender_emails=["r@test.com"])
+    )
+    original = create_entry(
+        db_session,
+        EntryCreate(subject="Issue 1", body="<p>Hello  World</p>", message_id="<r1>"),
+        newsletter.id,
+    )
+
+    stored = create_entries(
+        db_session,
+        [
+            (
+                EntryCreate(
+                    subject="Issue 1", body="<div>hello world</div>", message_id="<r2>"
+                ),
+                newsletter.id,
+            ),
+            (
+                EntryCreate(subject="Issue 2", body="<p>New</p>", message_id="<r3>"),
+                newsletter.id,
+            ),
+            (
+                EntryCreate(subject="Issue 2", body="<p>New</p>", message_id="<r4>"),
+                newsletter.id,
+            ),
+        ],
+    )
+    assert stored == {"<r2>", "<r3>", "<r4>"}
+    resent = create_entry(
+        db_session,
+        EntryCreate(subject="Issue 1", body="<p>Hello World</p>", message_id="<r5>"),
+        newsletter.id,
+    )
+    assert resent.id == original.id
+
+    entries = get_entries_by_newsletter(db_session, newsletter.id)
+    assert sorted(e.subject for e in entries) == ["Issue 1", "Issue 2"]
+    assert get_newsletter_by_identifier(db_session, newsletter.id).entries_count == 2
+    assert get_existing_message_ids(
+        db_session, ["<r1>", "<r2>", "<r4>", "<r5>", "<r6>"]
+    ) == {"<r1>", "<r2>", "<r4>", "<r5>"}
+
+    delete_entry(db_session, original.id)
+    assert get_existing_message_ids(db_session, ["<r2>", "<r5>"]) == set()
+
+
+def test_create_entries_links_near_duplicates(db_session: Session):
+    """Test that near-duplicates are only linked if enabled."""
+    from app.crud.entries import settings as crud_settings
+
+    newsletter = create_newsletter(
+        db_session, NewsletterCreate(name="Near", sender_emails=["near@test.com"])
+    )
+    words = " ".join(f"word{i}" for i in range(200))
+    create_entry(
+        db_session,
+        EntryCreate(subject="Issue", body=f"<p>{words}</p>", message_id="<n1>"),
+        newsletter.id,
+    )
+    resend = (
+        EntryCreate(
+            subject="Issue", body=f"<p>{words} unsubscribe</p>", message_id="<n2>"
+        ),
+        newsletter.id,
+    )
+
+    near = crud_settings.model_copy(update={"dedup_simhash_distance": 3})
+    with patch("app.crud.entries.settings", near):
+        # An email that was already stored is not linked to itself
+        original = EntryCreate(
+            subject="Issue", body=f"<p>{words}</p>", message_id="<n1>"
+        )
+        assert create_entries(db_session, [(original, newsletter.id)]) == set()
+        assert create_entries(db_session, [resend]) == {"<n2>"}
+    assert db_session.scalars(select(EntryDuplicate.message_id)).all() == ["<n2>"]
+    assert len(get_entries_by_newsletter(db_session, newsletter.id)) == 1
+
+    create_entries(
+        db_session,
+        [(resend[0].model_copy(update={"message_id": "<n3>"}), newsletter.id)],
+    )
+    assert len(get_entries_by_newsletter(db_session, newsletter.id)) == 2
@@ -2,21 +2,30 @@ import imaplib
 from email.message import Message
 from unittest.mock import MagicMock, patch
 
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from app.crud.newsletters import create_newsletter
+from app.core.database import engine
+from app.core.sender_routing import sender_routing
+from app.crud.newsletters import create_newsletter, update_newsletter
 from app.crud.settings import create_or_update_settings
 from app.models.newsletters import Newsletter
-from app.schemas.newsletters import NewsletterCreate
+from app.schemas.newsletters import NewsletterCreate, NewsletterUpdate
 from app.schemas.settings import Settings, SettingsCreate
-from app.services.email_processor import _process_single_email, process_emails
+from app.services.email_processor import (
+    _apply_flags,
+    _fetch_messages,
+    _prepare_entry,
+    _to_message_set,
+    process_emails,
+)
 
 
 def _setup_test_email_processing(
     db_session: Session,
     newsletter_create_data: NewsletterCreate,
     settings_create_data: SettingsCreate,
-) -> tuple[MagicMock, Newsletter, Settings]:
+) -> tuple[MagicMock, bytes, Newsletter, Settings]:
     """Help to set up mocks and data for email processing tests."""
     settings = create_or_update_settings(db_session, settings_create_data)
     newsletter = create_newsletter(db_session, newsletter_create_data)
@@ -27,12 +36,11 @@ def _setup_test_email_processing(
     msg["Subject"] = "Test Email"
     msg["Message-ID"] = "<test-message-id>"
     msg.set_payload("<html><body><p>Original Body</p></body></html>", "utf-8")
-    mock_mail.fetch.return_value = ("OK", [(b"1 (RFC822)", msg.as_bytes())])
 
-    return mock_mail, newsletter, settings
+    return mock_mail, msg.as_bytes(), newsletter, settings
 
 
-def test_process_single_email_with_newsletter_move_folder(db_session: Session):
+def test_prepare_entry_with_newsletter_move_folder(db_session: Session):
     """Test that the per-newsletter move_to_folder is used, overriding the global setting."""
     # 1. ARRANGE
     settings_data = SettingsCreate(
@@ -46,20 +54,22 @@ def test_process_single_email_with_newsletter_move_folder(db_session: Session):
         sender_emails=["test@example.com"],
         move_to_folder="NewsletterArchive",
     )
-    mock_mail, newsletter, settings = _setup_test_email_processing(
+    mock_mail, raw_email, newsletter, settings = _setup_test_email_processing(
         db_session, newsletter_data, settings_data
     )
     sender_map = {newsletter.senders[0].email: newsletter}
 
     # 2. ACT
-    _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    _, processed_for = _prepare_entry(raw_email, db_session, sender_map, settings)
+    _apply_flags(mock_mail, {b"1": processed_for}, settings)
 
     # 3. ASSERT
-    mock_mail.copy.assert_called_once_with("1", "NewsletterArchive")
-    mock_mail.store.assert_any_call("1", "+FLAGS", "\\Deleted")
+    assert processed_for.id == newsletter.id
+    mock_mail.uid.assert_any_call("COPY", "1", "NewsletterArchive")
+    mock_mail.uid.assert_any_call("STORE", "1", "+FLAGS", "\\Deleted")
 
 
-def test_process_single_email_with_global_move_folder(db_session: Session):
+def test_prepare_entry_with_global_move_folder(db_session: Session):
     """Test that the global move_to_folder is used when the per-newsletter one is not set."""
     # 1. ARRANGE
     settings_data = SettingsCreate(
@@ -71,17 +81,19 @@ def test_process_single_email_with_global_move_folder(db_session: Session):
     newsletter_data = NewsletterCreate(
         name="Test Newsletter", sender_emails=["test@example.com"]
     )
-    mock_mail, newsletter, settings = _setup_test_email_processing(
+    mock_mail, raw_email, newsletter, settings = _setup_test_email_processing(
         db_session, newsletter_data, settings_data
     )
     sender_map = {newsletter.senders[0].email: newsletter}
 
     # 2. ACT
-    _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    _, processed_for = _prepare_entry(raw_email, db_session, sender_map, settings)
+    _apply_flags(mock_mail, {b"1": processed_for}, settings)
 
     # 3. ASSERT
-    mock_mail.copy.assert_called_once_with("1", "GlobalArchive")
-    mock_mail.store.assert_any_call("1", "+FLAGS", "\\Deleted")
+    assert processed_for.id == newsletter.id
+    mock_mail.uid.assert_any_call("COPY", "1", "GlobalArchive")
+    mock_mail.uid.assert_any_call("STORE", "1", "+FLAGS", "\\Deleted")
 
 
 @patch("app.services.email_processor._connect_to_imap")
@@ -116,7 +128,7 @@ def test_process_emails_uses_newsletter_search_folder(
     # Check that _connect_to_imap was called with the newsletter's specific folder
     mock_connect_to_imap.assert_called_once()
     call_args = mock_connect_to_imap.call_args[0]
-    assert call_args[1] == "NewsletterInbox"
+    assert call_args[2] == "NewsletterInbox"
 
 
 @patch("app.services.email_processor._connect_to_imap")
@@ -149,11 +161,11 @@ def test_process_emails_uses_global_search_folder(
     # 3. ASSERT
     mock_connect_to_imap.assert_called_once()
     call_args = mock_connect_to_imap.call_args[0]
-    assert call_args[1] == "GlobalInbox"
+    assert call_args[2] == "GlobalInbox"
 
 
 @patch("app.services.email_processor._extract_and_clean_html")
-def test_process_single_email_with_content_extraction(
+def test_prepare_entry_with_content_extraction(
     mock_extract_clean,
     db_session: Session,
 ):
@@ -171,26 +183,23 @@ def test_process_single_email_with_content_extraction(
         sender_emails=["test@example.com"],
         extract_content=True,
     )
-    mock_mail, newsletter, settings = _setup_test_email_processing(
+    _, raw_email, newsletter, settings = _setup_test_email_processing(
         db_session, newsletter_data, settings_data
     )
     sender_map = {newsletter.senders[0].email: newsletter}
 
     # 2. ACT
-    with patch("app.services.email_processor.create_entry") as mock_create_entry:
-        _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    entry_create_arg, _ = _prepare_entry(raw_email, db_session, sender_map, settings)
 
     # 3. ASSERT
     mock_extract_clean.assert_called_once()
-    # Check that create_entry was called with the extracted body
-    mock_create_entry.assert_called_once()
-    entry_create_arg = mock_create_entry.call_args[0][1]
+    # Check that the entry has the extracted body
     assert entry_create_arg.body == "Extracted Body"
     # Subject should still come from the email, not the extracted title
     assert entry_create_arg.subject == "Test Email"
 
 
-def test_process_single_email_with_encoded_from_header(db_session: Session):
+def test_prepare_entry_with_encoded_from_header(db_session: Session):
     """Test that an encoded From header is correctly decoded for the newsletter name."""
     # 1. ARRANGE
     settings_data = SettingsCreate(
@@ -201,7 +210,6 @@ def test_process_single_email_with_encoded_from_header(db_session: Session):
     )
     settings = create_or_update_settings(db_session, settings_data)
 
-    mock_mail = MagicMock(spec=imaplib.IMAP4_SSL)
     msg = Message()
     # "Кирилл" in Cyrillic, base64 encoded for UTF-8
     from_header = "=?utf-8?B?0JrQuNGA0LjQu9C7?= <test@example.com>"
@@ -209,12 +217,11 @@ def test_process_single_email_with_encoded_from_header(db_session: Session):
     msg["Subject"] = "Test Email"
     msg["Message-ID"] = "<test-message-id-encoded-from>"
     msg.set_payload("<html><body><p>Body</p></body></html>", "utf-8")
-    mock_mail.fetch.return_value = ("OK", [(b"1 (RFC822)", msg.as_bytes())])
 
     sender_map = {}  # empty, to trigger auto-add
 
     # 2. ACT
-    _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    _prepare_entry(msg.as_bytes(), db_session, sender_map, settings)
 
     # 3. ASSERT
     from app.crud.newsletters import get_newsletters
@@ -223,3 +230,120 @@ def test_process_single_email_with_encoded_from_header(db_session: Session):
     assert len(newsletters) == 1
     assert newsletters[0].name == "Кирилл"
     assert newsletters[0].senders[0].email == "test@example.com"
+
+
+def test_to_message_set():
+    """Test that UIDs are compressed into IMAP message sets."""
+    assert _to_message_set([b"1"]) == "1"
+    assert _to_message_set([b"3", b"1", b"2", b"7", b"9", b"10"]) == "1:3,7,9:10"
+
+
+def test_apply_flags_groups_commands_per_folder(db_session: Session):
+    """Test that flags are updated with one command per folder."""
+    settings_data = SettingsCreate(
+        imap_server="test.com",
+        imap_username="test",
+        imap_password="password",
+        mark_as_read=True,
+        move_to_folder="GlobalArchive",
+    )
+    settings = create_or_update_settings(db_session, settings_data)
+    archived = create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="Archived", sender_emails=["a@example.com"], move_to_folder="Own"
+        ),
+    )
+    default = create_newsletter(
+        db_session, NewsletterCreate(name="Default", sender_emails=["b@example.com"])
+    )
+    mock_mail = MagicMock(spec=imaplib.IMAP4_SSL)
+
+    _apply_flags(
+        mock_mail,
+        {b"1": archived, b"2": default, b"3": archived, b"4": default},
+        settings,
+    )
+
+    assert mock_mail.uid.call_count == 5
+    mock_mail.uid.assert_any_call("STORE", "1:4", "+FLAGS", "\\Seen")
+    mock_mail.uid.assert_any_call("COPY", "1,3", "Own")
+    mock_mail.uid.assert_any_call("STORE", "1,3", "+FLAGS", "\\Deleted")
+    mock_mail.uid.assert_any_call("COPY", "2,4", "GlobalArchive")
+    mock_mail.uid.assert_any_call("STORE", "2,4", "+FLAGS", "\\Deleted")
+
+
+def test_sender_routing_index(db_session: Session):
+    """Test routing senders by address and domain, and reloading after changes."""
+    inbox = create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="Inbox", sender_emails=["exact@example.com", "*@example.com"]
+        ),
+    )
+    news = create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="News",
+            search_folder="News",
+            sender_emails=["*@news.example.com"],
+        ),
+    )
+    for i in range(120):
+        create_newsletter(
+            db_session,
+            NewsletterCreate(name=f"Bulk {i}", sender_emails=[f"bulk{i}@bulk.com"]),
+        )
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        # Polls for invalidations of other processes depend on timing.
+        if "cache_invalidations" not in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        groups = sender_routing.folder_groups(db_session, "INBOX")
+        inbox_map = sender_routing.sender_map(db_session, "INBOX", "INBOX")
+        news_map = sender_routing.sender_map(db_session, "News", "INBOX")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    assert len(groups["INBOX"]) == 121
+    assert [route.id for route in groups["News"]] == [news.id]
+    assert inbox_map.get("bulk119@bulk.com").name == "Bulk 119"
+    assert inbox_map.get("exact@example.com").id == inbox.id
+    assert inbox_map.get("other@mail.example.com").id == inbox.id
+    assert "someone@example.org" not in inbox_map
+    assert news_map.get("daily@NEWS.example.com").id == news.id
+    assert "exact@example.com" not in news_map
+
+    update_newsletter(
+        db_session,
+        news.id,
+        NewsletterUpdate(name="News", sender_emails=["*@example.org"]),
+    )
+    news_map = sender_routing.sender_map(db_session, "News", "INBOX")
+    assert news_map.get("someone@example.org").id == news.id
+    assert "daily@news.example.com" not in news_map
+
+
+def test_fetch_messages_finds_uid_after_literal():
+    """Test that UIDs sent after the message literal are matched to it."""
+    mock_mail = MagicMock(spec=imaplib.IMAP4_SSL)
+    mock_mail.uid.return_value = (
+        "OK",
+        [
+            (b"1 (UID 4 BODY[] {5}", b"first"),
+            b")",
+            (b"2 (BODY[] {6}", b"second"),
+            b" UID 5)",
+        ],
+    )
+
+    assert _fetch_messages(mock_mail, [b"4", b"5"]) == {
+        b"4": b"first",
+        b"5": b"second",
+    }
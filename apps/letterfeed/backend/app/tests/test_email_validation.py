@@ -45,3 +45,18 @@ def test_update_newsletter_with_invalid_email(client: TestClient):
     }
     response = client.put(f"/newsletters/{newsletter_id}", json=update_data)
     assert response.status_code == 422
+
+
+def test_create_newsletter_with_domain_wildcard(client: TestClient):
+    """Test that a sender can match all addresses at a domain."""
+    newsletter_data = {
+        "name": "Wildcard Test",
+        "sender_emails": ["*@News.Example.com"],
+    }
+    response = client.post("/newsletters", json=newsletter_data)
+    assert response.status_code == 200
+    assert response.json()["senders"][0]["email"] == "*@news.example.com"
+
+    newsletter_data["sender_emails"] = ["*@not a domain"]
+    response = client.post("/newsletters", json=newsletter_data)
+    assert response.status_code == 422
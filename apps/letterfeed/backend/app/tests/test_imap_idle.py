@@ -0,0 +1,123 @@
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.orm import Session
+
+from app.crud.settings import create_or_update_settings
+from app.schemas.settings import SettingsCreate
+from app.services.imap_idle import ImapIdleManager, ImapSessionPool, _idle, _poll
+
+
+def test_idle_returns_on_new_email():
+    """Test that IDLE ends as soon as the server reports a new email."""
+    mail = MagicMock()
+    mail.file.peek.return_value = b""
+    mail.readline.side_effect = [
+        b"+ idling\r\n",
+        b"* 4 EXISTS\r\n",
+        b"LFIDLE OK IDLE terminated\r\n",
+    ]
+
+    with patch("app.services.imap_idle.select.select") as mock_select:
+        mock_select.return_value = ([mail.sock], [], [])
+        assert _idle(mail, 60, threading.Event())
+
+    mail.send.assert_any_call(b"LFIDLE IDLE\r\n")
+    mail.send.assert_called_with(b"DONE\r\n")
+
+
+def test_idle_times_out():
+    """Test that IDLE is terminated when the timeout expires."""
+    mail = MagicMock()
+    mail.file.peek.return_value = b""
+    mail.readline.side_effect = [b"+ idling\r\n", b"LFIDLE OK IDLE terminated\r\n"]
+
+    with patch("app.services.imap_idle.select.select") as mock_select:
+        mock_select.return_value = ([], [], [])
+        assert not _idle(mail, 0.01, threading.Event())
+
+    mail.send.assert_called_with(b"DONE\r\n")
+
+
+def test_idle_notices_buffered_responses():
+    """Test that a notification read ahead with the IDLE continuation is seen."""
+    client, server = socket.socketpair()
+    server.sendall(b"+ idling\r\n* 4 EXISTS\r\nLFIDLE OK IDLE terminated\r\n")
+    mail = MagicMock(sock=client, file=client.makefile("rb"))
+    mail.readline.side_effect = mail.file.readline
+    try:
+        assert _idle(mail, 2, threading.Event())
+    finally:
+        mail.file.close()
+        client.close()
+        server.close()
+
+
+def test_poll_detects_new_email():
+    """Test that the NOOP fallback reports new emails."""
+    mail = MagicMock()
+    mail.noop.return_value = ("OK", [b""])
+    mail.response.side_effect = [("EXISTS", [b"3"]), ("EXISTS", [b"4"])]
+
+    assert _poll(mail, 0, threading.Event())
+
+    mail.response.side_effect = [("EXISTS", [None]), ("EXISTS", [None])]
+    assert not _poll(mail, 0, threading.Event())
+
+
+@patch("app.services.imap_idle._connect_to_imap")
+def test_session_pool_reuses_live_sessions(mock_connect):
+    """Test that the pool keeps sessions and replaces dead ones."""
+    first, second = MagicMock(), MagicMock()
+    first.noop.return_value = ("OK", [b""])
+    mock_connect.side_effect = [first, second]
+    pool = ImapSessionPool()
+
+    assert pool.get(MagicMock(), MagicMock(), "INBOX") is first
+    assert pool.get(MagicMock(), MagicMock(), "INBOX") is first
+    assert mock_connect.call_count == 1
+
+    first.noop.side_effect = OSError("connection reset")
+    assert pool.get(MagicMock(), MagicMock(), "INBOX") is second
+    first.logout.assert_called_once()
+
+    # A stale session does not close the current one.
+    pool.discard("INBOX", first)
+    second.logout.assert_not_called()
+    pool.close_all()
+    second.logout.assert_called_once()
+
+
+@patch("app.services.imap_idle.FolderWatcher")
+@patch("app.services.imap_idle.get_search_folders")
+def test_idle_manager_sync(mock_folders, mock_watcher, db_session: Session):
+    """Test that watchers follow the folders that need to be checked."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+        ),
+    )
+    watchers = {}
+    mock_watcher.side_effect = lambda folder, pool: watchers.setdefault(
+        folder, MagicMock()
+    )
+    manager = ImapIdleManager()
+
+    mock_folders.return_value = ["INBOX", "Newsletters"]
+    manager.sync(db_session)
+    assert sorted(manager.folders) == ["INBOX", "Newsletters"]
+    watchers["INBOX"].start.assert_called_once()
+
+    mock_folders.return_value = ["INBOX"]
+    manager.sync(db_session)
+    assert manager.folders == ["INBOX"]
+    watchers["Newsletters"].stop.assert_called_once()
+    watchers["INBOX"].stop.assert_not_called()
+
+    manager.stop()
+    assert manager.folders == []
+    watchers["INBOX"].stop.assert_called_once()
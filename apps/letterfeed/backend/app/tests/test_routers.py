@@ -1,3 +1,4 @@
+import threading
 import uuid
 from unittest.mock import patch
 
@@ -5,6 +6,7 @@ from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from app.crud.settings import create_or_update_settings
+from app.models.ingestion import IngestionTask
 from app.schemas.settings import SettingsCreate
 
 
@@ -52,11 +54,10 @@ def test_get_imap_settings(client: TestClient):
     assert response.json()["imap_username"] == "test@example.com"
 
 
-@patch("app.core.imap.imaplib.IMAP4_SSL")
-def test_test_imap_connection(mock_imap, client: TestClient, db_session: Session):
+@patch("app.routers.imap._test_imap_connection")
+def test_test_imap_connection(mock_test, client: TestClient, db_session: Session):
     """Test the IMAP connection."""
-    mock_imap.return_value.login.return_value = (None, None)
-    mock_imap.return_value.logout.return_value = (None, None)
+    mock_test.return_value = (True, "Connection successful")
 
     settings_data = SettingsCreate(
         imap_server="imap.example.com",
@@ -71,17 +72,16 @@ def test_test_imap_connection(mock_imap, client: TestClient, db_session: Session
     response = client.post("/imap/test")
     assert response.status_code == 200
     assert response.json() == {"message": "Connection successful"}
+    (credentials,) = mock_test.call_args.args
+    assert credentials.server == "imap.example.com"
+    assert credentials.password == "password"
+    assert credentials.oauth2_token is None
 
 
-@patch("app.core.imap.imaplib.IMAP4_SSL")
-def test_get_imap_folders(mock_imap, client: TestClient, db_session: Session):
+@patch("app.routers.imap.get_folders")
+def test_get_imap_folders(mock_folders, client: TestClient, db_session: Session):
     """Test getting IMAP folders."""
-    mock_imap.return_value.login.return_value = (None, None)
-    mock_imap.return_value.logout.return_value = (None, None)
-    mock_imap.return_value.list.return_value = (
-        "OK",
-        [b'(NOCONNECT NOSELECT) "/" "INBOX"', b'(NOCONNECT NOSELECT) "/" "Processed"'],
-    )
+    mock_folders.return_value = ["INBOX", "Processed"]
 
     settings_data = SettingsCreate(
         imap_server="imap.example.com",
@@ -98,13 +98,69 @@ def test_get_imap_folders(mock_imap, client: TestClient, db_session: Session):
     assert response.json() == ["INBOX", "Processed"]
 
 
-@patch("app.routers.imap.process_emails")
-def test_trigger_email_processing(mock_process_emails, client: TestClient):
+@patch("app.routers.imap.request_check")
+def test_trigger_email_processing(mock_request_check, client: TestClient):
     """Test triggering email processing manually."""
     response = client.post("/imap/process")
     assert response.status_code == 200
     assert response.json() == {"message": "Email processing triggered successfully."}
-    mock_process_emails.assert_called_once()
+    mock_request_check.assert_called_once()
+
+
+def test_retry_failed_ingestion_task(client: TestClient, db_session: Session):
+    """Test listing failed ingestion tasks and retrying one."""
+    task = IngestionTask(
+        imap_username="test@test.com",
+        folder="INBOX",
+        uidvalidity=1,
+        uid=7,
+        message_id="<dead@test.com>",
+        sender="newsletter@example.com",
+        stage="extract",
+        state="dead",
+        attempts=5,
+        last_error="boom",
+    )
+    db_session.add(task)
+    db_session.commit()
+
+    response = client.get("/imap/tasks")
+    assert response.status_code == 200
+    assert [(t["uid"], t["state"], t["last_error"]) for t in response.json()] == [
+        (7, "dead", "boom")
+    ]
+
+    response = client.post(f"/imap/tasks/{task.id}/retry")
+    assert response.status_code == 200
+    assert (response.json()["state"], response.json()["attempts"]) == ("pending", 0)
+    assert client.get("/imap/tasks").json() == []
+    assert client.post("/imap/tasks/999/retry").status_code == 404
+
+
+def test_read_schedule(client: TestClient, db_session: Session):
+    """Test reading how often each folder is checked."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="imap.test.com",
+            imap_username="test@test.com",
+            imap_password="password",
+            email_check_interval=30,
+            auto_add_new_senders=True,
+        ),
+    )
+
+    response = client.get("/imap/schedule")
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "folder": "INBOX",
+            "interval": "PT30M",
+            "newsletters": [],
+            "last_checked_at": None,
+            "next_check_at": None,
+        }
+    ]
 
 
 def test_create_newsletter(client: TestClient):
@@ -200,3 +256,315 @@ def test_get_newsletter_feed_nonexistent_newsletter(client: TestClient):
     response = client.get("/feeds/nonexistent")
     assert response.status_code == 404
     assert response.json() == {"detail": "Newsletter not found"}
+
+
+def test_get_newsletter_feed_conditional_get(client: TestClient):
+    """Test that an unchanged feed is answered with 304 Not Modified."""
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Conditional", "sender_emails": ["cond@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "One", "body": "<p>1</p>", "message_id": "<cond1@test.com>"},
+    )
+
+    response = client.get(f"/feeds/{newsletter_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    response = client.get(f"/feeds/{newsletter_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    response = client.get(
+        f"/feeds/{newsletter_id}", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    # A new entry changes the validators
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "Two", "body": "<p>2</p>", "message_id": "<cond2@test.com>"},
+    )
+    response = client.get(f"/feeds/{newsletter_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_feed_rendering_leaves_the_event_loop(client: TestClient):
+    """Test that feeds are rendered on a worker thread, not on the event loop."""
+    threads = {}
+
+    def render(db, version, cursor):
+        threads["render"] = threading.current_thread()
+        return b"<feed/>"
+
+    def is_not_modified(request, version):
+        threads["loop"] = threading.current_thread()
+        return False
+
+    with (
+        patch("app.routers.feeds.render_master_feed", side_effect=render),
+        patch("app.routers.feeds._is_not_modified", side_effect=is_not_modified),
+    ):
+        response = client.get("/feeds/all")
+    assert response.content == b"<feed/>"
+    assert threads["render"] is not threads["loop"]
+
+
+def test_get_master_feed_conditional_get(client: TestClient):
+    """Test conditional GET on the master feed."""
+    response = client.get("/feeds/all")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = client.get("/feeds/all", headers={"If-None-Match": f'W/{etag}, "x"'})
+    assert response.status_code == 304
+
+    # Renaming a newsletter changes the entry titles of the master feed
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Before", "sender_emails": ["rename@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "One", "body": "<p>1</p>", "message_id": "<ren1@test.com>"},
+    )
+    etag = client.get("/feeds/all").headers["etag"]
+    client.put(
+        f"/newsletters/{newsletter_id}",
+        json={"name": "After", "sender_emails": ["rename@example.com"]},
+    )
+    response = client.get("/feeds/all", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert b"[After] One" in response.content
+
+
+def test_get_newsletter_feed_pagination(client: TestClient):
+    """Test that feeds are paged with RFC 5005 links."""
+    import xml.etree.ElementTree as ET
+
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Paged", "sender_emails": ["paged@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    for i in range(3):
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={
+                "subject": f"Entry {i}",
+                "body": f"<p>{i}</p>",
+                "message_id": f"<paged{i}@test.com>",
+            },
+        )
+
+    from app.services.feed_generator import settings as feed_settings
+
+    ns = {"atom": "http://www.w3.org/2005/Atom"}
+    small_pages = feed_settings.model_copy(update={"feed_page_size": 2})
+    with patch("app.services.feed_generator.settings", small_pages):
+        response = client.get(f"/feeds/{newsletter_id}")
+        assert response.status_code == 200
+        root = ET.fromstring(response.text)
+        assert len(root.findall("atom:entry", ns)) == 2
+        links = {
+            link.get("rel"): link.get("href") for link in root.findall("atom:link", ns)
+        }
+        assert links["next"].endswith(f"/feeds/{newsletter_id}?page=2")
+        assert links["last"].endswith(f"/feeds/{newsletter_id}?page=2")
+        assert "previous" not in links
+
+        response = client.get(f"/feeds/{newsletter_id}?page=2")
+        assert response.status_code == 200
+        root = ET.fromstring(response.text)
+        assert len(root.findall("atom:entry", ns)) == 1
+        links = {
+            link.get("rel"): link.get("href") for link in root.findall("atom:link", ns)
+        }
+        assert links["previous"].endswith(f"/feeds/{newsletter_id}")
+        assert "next" not in links
+
+        response = client.get(f"/feeds/{newsletter_id}?page=3")
+        assert response.status_code == 404
+
+
+def test_get_feeds_keyset_pagination(client: TestClient):
+    """Test paging through feeds with a before cursor."""
+    import xml.etree.ElementTree as ET
+    from urllib.parse import urlsplit
+
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Keyset", "sender_emails": ["keyset@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    for i in range(5):
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={
+                "subject": f"Entry {i}",
+                "body": f"<p>{i}</p>",
+                "message_id": f"<keyset{i}@test.com>",
+                "received_at": f"2026-01-0{i + 1}T00:00:00",
+            },
+        )
+
+    from app.services.feed_generator import settings as feed_settings
+
+    ns = {"atom": "http://www.w3.org/2005/Atom"}
+    small_pages = feed_settings.model_copy(update={"feed_page_size": 2})
+    for feed_path in (f"/feeds/{newsletter_id}", "/feeds/all"):
+        url = f"{feed_path}?before=2026-01-05T00:00:00,zzzz"
+        titles = []
+        with patch("app.services.feed_generator.settings", small_pages):
+            while url:
+                response = client.get(url)
+                assert response.status_code == 200
+                root = ET.fromstring(response.text)
+                titles += [
+                    e.find("atom:title", ns).text.removeprefix("[Keyset] ")
+                    for e in root.findall("atom:entry", ns)
+                ]
+                links = {
+                    link.get("rel"): link.get("href")
+                    for link in root.findall("atom:link", ns)
+                }
+                next_url = links.get("next")
+                url = (
+                    urlsplit(next_url)._replace(scheme="", netloc="").geturl()
+                    if next_url
+                    else None
+                )
+        assert titles == ["Entry 4", "Entry 3", "Entry 2", "Entry 1", "Entry 0"]
+
+    response = client.get(f"/feeds/{newsletter_id}?before=nonsense")
+    assert response.status_code == 400
+
+
+def test_get_feeds_streaming(client: TestClient):
+    """Test that streamed feeds match rendered feeds and can be gzipped."""
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Streamed", "sender_emails": ["streamed@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    for i in range(3):
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={
+                "subject": f"Entry {i}",
+                "body": f"<p>{i}</p>",
+                "message_id": f"<streamed{i}@test.com>",
+                "received_at": f"2026-01-0{i + 1}T00:00:00",
+            },
+        )
+
+    from app.core import feed_cache
+    from app.routers.feeds import settings as router_settings
+    from app.services.feed_generator import settings as feed_settings
+
+    urls = [
+        f"/feeds/{newsletter_id}",
+        "/feeds/all?page=2",
+        "/feeds/all?before=2026-01-03T00:00:00,zzzz",
+    ]
+    small_pages = feed_settings.model_copy(update={"feed_page_size": 2})
+    with patch("app.services.feed_generator.settings", small_pages):
+        rendered = [client.get(url).content for url in urls]
+        feed_cache.clear()
+
+        streaming = router_settings.model_copy(
+            update={"feed_streaming": True, "feed_gzip": True}
+        )
+        with patch("app.routers.feeds.settings", streaming):
+            for url, expected in zip(urls, rendered):
+                response = client.get(url, headers={"Accept-Encoding": "gzip"})
+                assert response.status_code == 200
+                assert response.headers["content-encoding"] == "gzip"
+                assert response.content == expected
+
+            response = client.get(urls[0], headers={"Accept-Encoding": "identity"})
+            assert "content-encoding" not in response.headers
+            assert response.content == rendered[0]
+
+
+def test_list_newsletter_entries(client: TestClient):
+    """Test listing the entries of a newsletter without their bodies."""
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Listed", "sender_emails": ["listed@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    for i in range(3):
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={
+                "subject": f"Entry {i}",
+                "body": f"<p>Body {i}</p>",
+                "message_id": f"<listed{i}@test.com>",
+                "received_at": f"2026-01-0{i + 1}T00:00:00",
+            },
+        )
+
+    response = client.get(f"/newsletters/{newsletter_id}/entries?limit=2")
+    assert response.status_code == 200
+    entries = response.json()
+    assert [e["subject"] for e in entries] == ["Entry 2", "Entry 1"]
+    assert entries[0]["snippet"] == "Body 2"
+    assert "body" not in entries[0]
+
+    last = entries[-1]
+    response = client.get(
+        f"/newsletters/{newsletter_id}/entries",
+        params={"before": f"{last['received_at']},{last['id']}"},
+    )
+    assert [e["subject"] for e in response.json()] == ["Entry 0"]
+
+    response = client.get(f"/newsletters/{newsletter_id}/entries?before=nonsense")
+    assert response.status_code == 400
+    response = client.get("/newsletters/nonexistent/entries")
+    assert response.status_code == 404
+
+
+def test_search_entries(client: TestClient):
+    """Test paging through search results."""
+    create_response = client.post(
+        "/newsletters",
+        json={"name": "Searched", "sender_emails": ["searched@example.com"]},
+    )
+    newsletter_id = create_response.json()["id"]
+    for i in range(5):
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={
+                "subject": f"Issue {i}",
+                "body": f"<p>{'kubernetes ' * (i + 1)}</p>",
+                "message_id": f"<searched{i}@test.com>",
+            },
+        )
+
+    subjects = []
+    params = {"q": "Kubernetes", "limit": 2}
+    while True:
+        response = client.get("/entries/search", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        subjects += [r["subject"] for r in page["results"]]
+        if page["next_cursor"] is None:
+            break
+        params["after"] = page["next_cursor"]
+    assert subjects == [f"Issue {i}" for i in reversed(range(5))]
+
+    response = client.get("/entries/search", params={"q": "kube"})
+    assert len(response.json()["results"]) == 5
+    response = client.get("/entries/search", params={"q": "?!"})
+    assert response.status_code == 400
+    response = client.get("/entries/search", params={"q": "x", "after": "nonsense"})
+    assert response.status_code == 400
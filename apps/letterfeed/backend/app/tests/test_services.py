@@ -1,13 +1,26 @@
+import threading
+import time
 import uuid
 import xml.etree.ElementTree as ET
+from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
 
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.encryption import decrypt_token
 from app.crud.entries import create_entry
 from app.crud.newsletters import create_newsletter
+from app.crud.oauth2 import create_or_update_oauth2_credential, get_decrypted_credential
 from app.schemas.entries import EntryCreate
 from app.schemas.newsletters import NewsletterCreate
 from app.services.feed_generator import generate_feed, generate_master_feed
+from app.services.gmail_tokens import GmailTokenManager
+from app.tests.conftest import TestingSessionLocal
+
+_GMAIL_SETTINGS = settings.model_copy(
+    update={"google_client_secrets_json": '{"client_id": "id"}'}
+)
 
 
 def test_generate_master_feed(db_session: Session):
@@ -114,3 +127,180 @@ def test_generate_feed_nonexistent_newsletter(db_session: Session):
     """Test feed generation for a non-existent newsletter."""
     feed_xml = generate_feed(db_session, "nonexistent-id")
     assert feed_xml is None
+
+
+def test_generate_feed_reuses_cached_rendering(db_session: Session):
+    """Test that an unchanged feed is not rendered twice."""
+    from unittest.mock import patch
+
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Cached Newsletter", sender_emails=["cache@example.com"]),
+    )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Entry", body="<p>Body</p>", message_id="<cache1@test>"),
+        newsletter.id,
+    )
+
+    first = generate_feed(db_session, newsletter.id)
+    with patch(
+        "app.services.feed_generator.get_entries_by_newsletter"
+    ) as mock_get_entries:
+        second = generate_feed(db_session, newsletter.id)
+        mock_get_entries.assert_not_called()
+    assert first == second
+
+    create_entry(
+        db_session,
+        EntryCreate(subject="New", body="<p>New</p>", message_id="<cache2@test>"),
+        newsletter.id,
+    )
+    third = generate_feed(db_session, newsletter.id)
+    assert third != first
+    assert b"New" in third
+
+
+def test_generate_feed_renders_only_new_entries(db_session: Session):
+    """Test that memoized entry fragments are reused after a new email arrives."""
+    from unittest.mock import patch
+
+    from app.services import feed_generator
+
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Fragments", sender_emails=["fragments@example.com"]),
+    )
+    for i in range(3):
+        create_entry(
+            db_session,
+            EntryCreate(subject=f"Entry {i}", body="<p>Body</p>", message_id=f"<f{i}>"),
+            newsletter.id,
+        )
+    generate_feed(db_session, newsletter.id)
+
+    create_entry(
+        db_session,
+        EntryCreate(subject="Entry 3", body="<p>Body</p>", message_id="<f3>"),
+        newsletter.id,
+    )
+    with patch.object(
+        feed_generator, "FeedEntry", wraps=feed_generator.FeedEntry
+    ) as mock_feed_entry:
+        feed_xml = generate_feed(db_session, newsletter.id)
+    assert mock_feed_entry.call_count == 1
+
+    root = ET.fromstring(feed_xml)
+    ns = {"atom": "http://www.w3.org/2005/Atom"}
+    titles = [e.find("atom:title", ns).text for e in root.findall("atom:entry", ns)]
+    assert titles == ["Entry 3", "Entry 2", "Entry 1", "Entry 0"]
+
+
+def test_update_newsletter_invalidates_cached_feeds(db_session: Session):
+    """Test that renaming a newsletter drops its cached feed and the master feed."""
+    from app.crud.newsletters import update_newsletter
+    from app.schemas.newsletters import NewsletterUpdate
+
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Old Name", sender_emails=["rename@example.com"]),
+    )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Entry", body="<p>Body</p>", message_id="<rename1>"),
+        newsletter.id,
+    )
+    assert b"<title>Old Name</title>" in generate_feed(db_session, newsletter.id)
+    assert b"[Old Name] Entry" in generate_master_feed(db_session)
+
+    update_newsletter(
+        db_session,
+        newsletter.id,
+        NewsletterUpdate(name="New Name", sender_emails=["rename@example.com"]),
+    )
+
+    assert b"<title>New Name</title>" in generate_feed(db_session, newsletter.id)
+    assert b"[New Name] Entry" in generate_master_feed(db_session)
+
+
+@patch("app.services.gmail_tokens.decrypt_token", wraps=decrypt_token)
+def test_gmail_token_manager_caches_tokens(mock_decrypt, db_session: Session):
+    """Test that stored tokens are decrypted once and then served from memory."""
+    create_or_update_oauth2_credential(
+        db_session,
+        "user@gmail.com",
+        "access",
+        "refresh",
+        datetime.now(UTC) + timedelta(hours=1),
+    )
+    manager = GmailTokenManager()
+
+    assert manager.get_access_token(db_session, "user@gmail.com") == "access"
+    assert manager.get_access_token(db_session, "user@gmail.com") == "access"
+    assert manager.get_access_token(db_session, "other@gmail.com") is None
+    # The access and the refresh token
+    assert mock_decrypt.call_count == 2
+
+
+@patch("app.services.gmail_tokens.settings", _GMAIL_SETTINGS)
+@patch("app.services.gmail_tokens.refresh_access_token")
+def test_gmail_token_manager_refreshes_once(mock_refresh, db_session: Session):
+    """Test that concurrent requests for an expired token share one refresh."""
+    create_or_update_oauth2_credential(
+        db_session, "user@gmail.com", "expired", "refresh", datetime.now(UTC)
+    )
+
+    def refresh(client_secrets, refresh_token):
+        time.sleep(0.1)
+        return "fresh", datetime.now(UTC) + timedelta(hours=1)
+
+    mock_refresh.side_effect = refresh
+    manager = GmailTokenManager()
+    tokens = []
+
+    def get_token():
+        with TestingSessionLocal() as db:
+            tokens.append(manager.get_access_token(db, "user@gmail.com"))
+
+    threads = [threading.Thread(target=get_token) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tokens == ["fresh"] * 5
+    mock_refresh.assert_called_once_with({"client_id": "id"}, "refresh")
+    db_session.expire_all()
+    assert get_decrypted_credential(db_session, "user@gmail.com") == (
+        "fresh",
+        "refresh",
+    )
+
+
+@patch("app.services.gmail_tokens.settings", _GMAIL_SETTINGS)
+@patch("app.services.gmail_tokens.refresh_access_token")
+def test_gmail_token_manager_refreshes_in_background(mock_refresh, db_session):
+    """Test that a token close to expiry is used while a new one is fetched."""
+    create_or_update_oauth2_credential(
+        db_session,
+        "user@gmail.com",
+        "expiring",
+        "refresh",
+        datetime.now(UTC) + timedelta(minutes=2),
+    )
+    refreshed = threading.Event()
+
+    def refresh(client_secrets, refresh_token):
+        refreshed.wait(5)
+        return "fresh", datetime.now(UTC) + timedelta(hours=1)
+
+    mock_refresh.side_effect = refresh
+    manager = GmailTokenManager()
+
+    assert manager.get_access_token(db_session, "user@gmail.com") == "expiring"
+    assert manager.get_access_token(db_session, "user@gmail.com") == "expiring"
+    refreshed.set()
+    manager._executor.shutdown(wait=True)
+
+    assert manager.get_access_token(db_session, "user@gmail.com") == "fresh"
+    mock_refresh.assert_called_once()